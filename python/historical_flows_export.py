@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+
+#
+# Export historical flows to Parquet, Arrow IPC or (gzip) CSV files
+#
+
+import os
+import sys
+import getopt
+import time
+
+from ntopng.ntopng import Ntopng
+from ntopng.historical import Historical
+
+
+# Defaults
+username      = "admin"
+password      = "admin"
+ntopng_url    = "http://localhost:3000"
+iface_id      = 0
+auth_token    = None
+enable_debug  = False
+epoch_end     = int(time.time())
+epoch_begin   = epoch_end - 3600
+select_clause = "*"
+where_clause  = ""
+output_file   = "flows.parquet"
+file_format   = None
+batch_size    = 10000
+
+##########
+
+def usage():
+    print("historical_flows_export.py [-u <username>] [-p <password>] [-t <auth token>] [-n <ntopng_url>]")
+    print("         [-i <interface ID>] [-b <epoch begin>] [-e <epoch end>] [-s <select clause>] [-w <where clause>]")
+    print("         [-o <output file>] [-f <parquet|arrow|csv>] [-B <batch size>] [--debug] [--help]")
+    print("")
+    print("The output format is taken from the output file extension (.parquet, .arrow, .csv, .csv.gz) unless -f is used")
+    print("")
+    print("Example: ./historical_flows_export.py -t ce0e284c774fac5a3e981152d325cfae -i 4 -o flows.parquet")
+    print("         ./historical_flows_export.py -u ntop -p mypassword -i 4 -w \"L7_PROTO=7\" -o flows.csv.gz")
+    sys.exit(0)
+
+##########
+
+try:
+    opts, args = getopt.getopt(sys.argv[1:],
+                               "hdu:p:n:i:t:b:e:s:w:o:f:B:",
+                               ["help",
+                                "debug",
+                                "username=",
+                                "password=",
+                                "ntopng_url=",
+                                "iface_id=",
+                                "auth_token=",
+                                "epoch_begin=",
+                                "epoch_end=",
+                                "select=",
+                                "where=",
+                                "output=",
+                                "format=",
+                                "batch_size="]
+                               )
+except getopt.GetoptError as err:
+    print(err)
+    usage()
+    sys.exit(2)
+
+for o, v in opts:
+    if(o in ("-h", "--help")):
+        usage()
+    elif(o in ("-d", "--debug")):
+        enable_debug = True
+    elif(o in ("-u", "--username")):
+        username = v
+    elif(o in ("-p", "--password")):
+        password = v
+    elif(o in ("-n", "--ntopng_url")):
+        ntopng_url = v
+    elif(o in ("-i", "--iface_id")):
+        iface_id = v
+    elif(o in ("-t", "--auth_token")):
+        auth_token = v
+    elif(o in ("-b", "--epoch_begin")):
+        epoch_begin = int(v)
+    elif(o in ("-e", "--epoch_end")):
+        epoch_end = int(v)
+    elif(o in ("-s", "--select")):
+        select_clause = v
+    elif(o in ("-w", "--where")):
+        where_clause = v
+    elif(o in ("-o", "--output")):
+        output_file = v
+    elif(o in ("-f", "--format")):
+        file_format = v
+    elif(o in ("-B", "--batch_size")):
+        batch_size = int(v)
+
+# -----------------------------------------------------------
+
+def print_progress(rows):
+    print("\rExported flows: " + str(rows), end = "", flush = True)
+
+# -----------------------------------------------------------
+
+try:
+    my_ntopng = Ntopng(username, password, auth_token, ntopng_url)
+
+    if(enable_debug):
+        my_ntopng.enable_debug()
+except ValueError as e:
+    print(e)
+    os._exit(-1)
+
+try:
+    my_historical = Historical(my_ntopng)
+
+    stats = my_historical.export_flows(output_file, iface_id, epoch_begin, epoch_end, select_clause, where_clause,
+                                       file_format = file_format, batch_size = batch_size, progress = print_progress)
+
+    print("")
+    print("Exported " + str(stats["rows"]) + " flows to " + output_file + " (" + stats["format"] + ", "
+          + str(stats["bytes"]) + " bytes) in " + ("%.2f" % stats["elapsed"]) + " sec")
+except (ValueError, ImportError) as e:
+    print(e)
+    os._exit(-1)
+
+os._exit(0)
@@ -0,0 +1,367 @@
+"""
+AlertFollower
+====================================
+The AlertFollower class follows the alerts stored by ntopng (e.g. to forward them to
+a SIEM) reading every alert once. For each alert family a watermark (the newest alert
+read) is kept and each poll reads the alerts from the watermark tstamp minus an overlap
+window; the alerts of the window already read are skipped by rowid (a bounded set of
+the rowids read in the window is kept). Each poll reads time ranges whose alerts fit in
+a page, so no alert is skipped when ntopng does not sort the pages.
+
+Alerts are not ordered by rowid (on ClickHouse it is a random UUID) and can be stored
+after alerts with a newer tstamp, so a plain (tstamp, rowid) cursor would skip them.
+The guarantee is: every alert is read once provided it is stored less than overlap
+seconds after the newest alert read (of its family) when it is stored. Alerts stored
+later are missed; alerts may be read twice if more than max_seen alerts fall within
+the overlap window, or after a restart without a state file.
+
+The polling interval adapts to the observed alert rate: polls are repeated immediately
+while there is a backlog and slowed down when no alerts are found. Watermarks can be
+saved to a file (with the rowids of the overlap window), so that a restarted follower
+resumes where it stopped.
+"""
+
+import os
+import json
+import time
+import calendar
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from .pagination import build_keyset_clause, format_sql_value
+from .time_slicer import merge_sorted, sort_rows
+
+WATERMARK_ORDER_BY = "tstamp, rowid"
+
+def get_epoch(value):
+    # tstamp is returned as epoch (SQLite) or as 'YYYY-MM-DD hh:mm:ss' (ClickHouse)
+    try:
+        return(int(float(value)))
+    except (TypeError, ValueError):
+        pass
+
+    try:
+        return(calendar.timegm(time.strptime(str(value)[:19], "%Y-%m-%d %H:%M:%S")))
+    except ValueError:
+        return(None)
+
+def get_tstamp_value(epoch, sample):
+    # The tstamp literal in the same format of the column values (sample)
+    try:
+        float(sample)
+        return(int(epoch))
+    except (TypeError, ValueError):
+        return(time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(epoch)))
+
+def and_clauses(clause, other):
+    return(other if (not clause) else ("(" + clause + ") AND " + other))
+
+class AlertFollower:
+    """
+    AlertFollower reads new alerts of one or more families using per-family watermarks and overlap windows
+
+    :param historical: The Historical handle
+    :param ifid: The interface ID
+    """
+    def __init__(self, historical, ifid, families = None, select_clause = "*", where_clause = None, state_file = None,
+                 start = None, page_size = 1000, min_interval = 1, max_interval = 60, lookback = 3600, overlap = 60, max_seen = 100000):
+        """
+        Construct a new AlertFollower object
+
+        :param historical: The Historical handle
+        :type historical: Historical
+        :param ifid: The interface ID
+        :type ifid: int
+        :param families: The alert families to follow (default: all)
+        :type families: array
+        :param select_clause: Select clause (SQL syntax), must include tstamp and rowid
+        :type select_clause: string
+        :param where_clause: Where clause (SQL syntax) selecting the alerts to follow (None to follow all the alerts)
+        :type where_clause: string
+        :param state_file: The file where watermarks are saved (None to keep them in memory only)
+        :type state_file: string
+        :param start: Read alerts starting from this epoch when no watermark is available (default: now)
+        :type start: int
+        :param page_size: Max number of alerts read per family and poll
+        :type page_size: int
+        :param min_interval: The min polling interval (seconds)
+        :type min_interval: float
+        :param max_interval: The max polling interval (seconds)
+        :type max_interval: float
+        :param lookback: Margin (seconds) subtracted to the window start to build epoch_begin (the where clause is exact)
+        :type lookback: int
+        :param overlap: The window (seconds) before the watermark read again at each poll, to catch the alerts stored late
+        :type overlap: int
+        :param max_seen: Max number of rowids kept per family to skip the alerts of the window already read
+        :type max_seen: int
+        """
+        from .historical import ALERT_FAMILIES
+
+        self.historical    = historical
+        self.ifid          = ifid
+        self.families      = list(families or ALERT_FAMILIES)
+        self.select_clause = select_clause
+        self.where_clause  = where_clause
+        self.state_file    = state_file
+        self.start         = int(start if (start is not None) else time.time())
+        self.page_size     = page_size
+        self.min_interval  = min_interval
+        self.max_interval  = max_interval
+        self.lookback      = lookback
+        self.overlap       = int(overlap)
+        self.max_seen      = max_seen
+        self.interval      = min_interval
+        self.watermarks    = {}
+        self.seen          = {} # family -> rowid -> tstamp (epoch), of the alerts read in the overlap window
+        self.stats         = { "polls": 0, "alerts": 0, "empty_polls": 0, "saturated_polls": 0 }
+
+        self.load_state()
+
+    def load_state(self):
+        if(self.state_file and os.path.exists(self.state_file)):
+            with open(self.state_file, "r") as f:
+                state = json.load(f)
+
+            self.watermarks = state.get("watermarks") or {}
+            self.seen       = { family: OrderedDict([ (rowid, epoch) for rowid, epoch in seen ])
+                                for family, seen in (state.get("seen") or {}).items() }
+
+            if(state.get("start") is not None):
+                self.start = int(state["start"])
+
+    def save_state(self):
+        """
+        Save the watermarks to the state file (if configured)
+        """
+        if(not self.state_file):
+            return
+
+        tmp_path = self.state_file + ".tmp"
+
+        with open(tmp_path, "w") as f:
+            json.dump({ "ifid": self.ifid, "start": self.start, "watermarks": self.watermarks,
+                        "seen": { family: list(seen.items()) for family, seen in self.seen.items() } }, f)
+
+        os.replace(tmp_path, self.state_file)
+
+    def get_watermarks(self):
+        """
+        Return the watermark (tstamp and rowid of the newest alert read) of each family
+
+        :return: The watermarks
+        :rtype: object
+        """
+        return(dict(self.watermarks))
+
+    def read_range(self, family, clause, begin, epoch_end, maxhits):
+        return(self.historical.get_alerts(family, self.ifid, begin, epoch_end, self.select_clause, clause,
+                                          maxhits, None, WATERMARK_ORDER_BY) or [])
+
+    def fetch_family(self, family, epoch_end):
+        watermark = self.watermarks.get(family)
+        seen      = self.seen.get(family) or {}
+        clause    = self.where_clause
+        begin     = self.start
+        low       = self.start
+        sample    = watermark["tstamp"] if (watermark is not None) else None
+
+        if(watermark is not None):
+            epoch = get_epoch(watermark["tstamp"])
+
+            if(epoch is not None):
+                # Read the overlap window again, the alerts already read are skipped below
+                low    = max(epoch - self.overlap, 0)
+                clause = and_clauses(clause, "tstamp >= " + format_sql_value(get_tstamp_value(low, sample)))
+                begin  = max(low - self.lookback, 0)
+            else:
+                clause = and_clauses(clause, build_keyset_clause(WATERMARK_ORDER_BY, watermark))
+                rows   = sort_rows(self.read_range(family, clause, begin, epoch_end, self.page_size), WATERMARK_ORDER_BY)
+
+                return([ dict(row, alert_family = family) for row in rows if (row["rowid"] not in seen) ], len(rows) >= self.page_size)
+
+        # ntopng versions not accepting the order_by parameter return a full page in no
+        # particular order, so pages do not follow the watermark order. Alerts are read by
+        # time ranges [lo, hi) instead, halving a range until its alerts fit in a page, so
+        # that every range read is complete. Reading stops after page_size new alerts (the
+        # window may hold more than a page of alerts already read).
+        alerts = []
+        lo     = low
+        hi     = epoch_end
+
+        while(True):
+            range_clause = clause
+
+            if(lo > low):
+                range_clause = and_clauses(range_clause, "tstamp >= " + format_sql_value(get_tstamp_value(lo, sample)))
+            if(hi < epoch_end):
+                range_clause = and_clauses(range_clause, "tstamp < " + format_sql_value(get_tstamp_value(hi, sample)))
+
+            maxhits = self.page_size
+            rows    = self.read_range(family, range_clause, begin, epoch_end, maxhits)
+
+            if(len(rows) >= maxhits):
+                if(sample is None):
+                    sample = rows[0]["tstamp"]
+
+                if((hi - lo) > 1):
+                    hi = lo + (hi - lo) // 2
+                    continue
+
+                # More than a page of alerts within a second: read them all
+                while(len(rows) >= maxhits):
+                    maxhits *= 2
+                    rows = self.read_range(family, range_clause, begin, epoch_end, maxhits)
+
+            alerts.extend([ dict(row, alert_family = family) for row in rows if (row["rowid"] not in seen) ])
+
+            if((hi >= epoch_end) or (len(alerts) >= self.page_size)):
+                break
+
+            lo, hi = hi, min(hi + 2 * (hi - lo), epoch_end)
+
+        return(sort_rows(alerts, WATERMARK_ORDER_BY), hi < epoch_end)
+
+    def fetch(self):
+        """
+        Read the alerts following the watermarks (up to page_size per family) without
+        advancing the watermarks
+
+        :return: The alerts in time order, and whether more alerts are pending
+        :rtype: tuple
+        """
+        epoch_end = int(time.time())
+        results   = []
+
+        with ThreadPoolExecutor(max_workers = len(self.families)) as executor:
+            futures = [ executor.submit(self.fetch_family, family, epoch_end) for family in self.families ]
+
+            for future in futures:
+                results.append(future.result())
+
+        saturated = any([ more for _, more in results ])
+        results   = [ alerts for alerts, _ in results ]
+
+        return(merge_sorted(results, WATERMARK_ORDER_BY), saturated)
+
+    def advance(self, alert):
+        """
+        Mark the alert as read, moving the watermark of the alert family to it if newer
+
+        :param alert: The alert (as returned by fetch())
+        :type alert: object
+        """
+        family    = alert["alert_family"]
+        epoch     = get_epoch(alert["tstamp"])
+        watermark = self.watermarks.get(family)
+        seen      = self.seen.setdefault(family, OrderedDict())
+
+        seen[alert["rowid"]] = epoch
+
+        if(len(seen) > self.max_seen):
+            seen.popitem(last = False)
+
+        if((watermark is None) or ((epoch or 0) >= (get_epoch(watermark["tstamp"]) or 0))):
+            self.watermarks[family] = { "tstamp": alert["tstamp"], "rowid": alert["rowid"] }
+
+    def trim_seen(self):
+        # Forget the alerts that are no longer part of the overlap window
+        for family, seen in self.seen.items():
+            watermark = self.watermarks.get(family)
+            epoch     = get_epoch(watermark["tstamp"]) if (watermark is not None) else None
+
+            if(epoch is not None):
+                low = epoch - self.overlap
+                self.seen[family] = OrderedDict([ (rowid, e) for rowid, e in seen.items() if ((e is None) or (e >= low)) ])
+
+    def update_interval(self, num_alerts, saturated):
+        # Poll again immediately while there is a backlog, halve the interval when
+        # alerts are found and double it when there are none
+        if(saturated):
+            self.interval = 0
+        elif(num_alerts > 0):
+            self.interval = max(self.min_interval, self.interval / 2)
+        else:
+            self.interval = min(self.max_interval, max(self.interval, self.min_interval) * 2)
+
+        return(self.interval)
+
+    def poll(self):
+        """
+        Read the new alerts and advance the watermarks
+
+        :return: The new alerts in time order
+        :rtype: array
+        """
+        alerts, saturated = self.fetch()
+
+        for alert in alerts:
+            self.advance(alert)
+
+        self.account(alerts, saturated)
+        self.trim_seen()
+        self.save_state()
+
+        return(alerts)
+
+    def account(self, alerts, saturated):
+        self.stats["polls"] += 1
+        self.stats["alerts"] += len(alerts)
+
+        if(len(alerts) == 0):
+            self.stats["empty_polls"] += 1
+        if(saturated):
+            self.stats["saturated_polls"] += 1
+
+        self.update_interval(len(alerts), saturated)
+
+    def follow(self, stop = None, max_polls = None):
+        """
+        Yield the new alerts as they are stored, polling with an adaptive interval.
+        Watermarks are advanced as alerts are yielded and saved after each poll and
+        when the generator is closed (after a crash the alerts of the last poll may be
+        yielded again).
+
+        :param stop: Stop following when the event is set (e.g. threading.Event)
+        :type stop: object
+        :param max_polls: Stop after the specified number of polls (None to follow forever)
+        :type max_polls: int
+        :return: The alerts (tagged with alert_family)
+        :rtype: generator
+        """
+        polls = 0
+
+        try:
+            while((max_polls is None) or (polls < max_polls)):
+                if((stop is not None) and stop.is_set()):
+                    return
+
+                alerts, saturated = self.fetch()
+                polls += 1
+
+                for alert in alerts:
+                    self.advance(alert)
+                    yield(alert)
+
+                self.account(alerts, saturated)
+                self.trim_seen()
+                self.save_state()
+
+                if((self.interval > 0) and ((max_polls is None) or (polls < max_polls))):
+                    if(stop is not None):
+                        stop.wait(self.interval)
+                    else:
+                        time.sleep(self.interval)
+        finally:
+            self.save_state()
+
+    def get_stats(self):
+        """
+        Return statistics (polls, alerts read, empty and saturated polls, current interval)
+
+        :return: The follower statistics
+        :rtype: object
+        """
+        stats = dict(self.stats)
+        stats["interval"] = self.interval
+
+        return(stats)
@@ -0,0 +1,660 @@
+"""
+AsyncNtopng
+====================================
+The AsyncNtopng class provides an asyncio interface to an ntopng instance. REST calls
+are issued with non-blocking I/O on the event loop (aiohttp), without a thread per
+call, so a single event loop can keep hundreds of calls in flight against several
+ntopng instances. The number of in-flight calls per instance and event loop is bounded
+by max_concurrency (the size of the connection pool).
+
+Its companion classes (AsyncInterface, AsyncHost, AsyncFlow and AsyncHistorical)
+expose the methods of Interface, Host, Flow and Historical as coroutines:
+
+- the request parameters are built by the synchronous classes, so both APIs accept
+  the same arguments and filters
+- streamed responses (e.g. get_flows_stream) are returned as async iterators,
+  decoded incrementally while the body is received
+- the page walks (e.g. iter_active_flows_pages, iter_flows_pages) are async generators
+
+The helpers that run their own worker pools or storage (bulk timeseries, replicas,
+exports, ...) are not exposed: they can be run in the loop executor with
+AsyncNtopng.run(). The response cache, the historical cache and the query profiler
+are not used by the asyncio client, whereas the REST metrics of the Ntopng handle
+are updated.
+
+aiohttp is an optional dependency of this package (pip3 install aiohttp).
+"""
+
+import json
+import time
+import asyncio
+import functools
+import threading
+from collections import deque
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from .interface import Interface
+from .host import Host
+from .flow import Flow
+from .historical import Historical, ALERT_FAMILIES
+from .flow_table import FlowTableBuilder
+from .records import ActiveFlowRecord, ActiveHostRecord, get_historical_flow_records
+from .pagination import async_iter_keyset_pages, check_select_clause
+from .time_slicer import merge_sorted, sort_rows
+from .timeseries import TimeseriesResult
+from .stream import JSONStreamParser, NEED_DATA
+
+def require_aiohttp():
+    if(aiohttp is None):
+        raise ImportError("aiohttp is required for the asyncio client (pip3 install aiohttp)")
+
+def get_query_params(params):
+    # Encode the GET parameters as requests does (None values are skipped, lists are repeated)
+    query = []
+
+    for name, value in (params or {}).items():
+        for v in (value if isinstance(value, (list, tuple)) else [ value ]):
+            if(v is not None):
+                query.append((name, str(v)))
+
+    return(query)
+
+class PendingRequest:
+    """
+    PendingRequest describes a REST request built by the synchronous API (see RequestBuilder)
+    """
+    def __init__(self, method, url, params, path = None, chunk_size = 65536):
+        self.method     = method
+        self.url        = url
+        self.params     = params
+        self.path       = path # the path of the list to stream (None: buffered response)
+        self.chunk_size = chunk_size
+
+class RequestBuilder:
+    """
+    RequestBuilder stands for an Ntopng handle: the synchronous API objects bound to it
+    return the request they would issue (a PendingRequest) instead of issuing it
+
+    :param ntopng_obj: The ntopng handle
+    """
+    def __init__(self, ntopng_obj):
+        self.ntopng_obj = ntopng_obj
+        self.url        = ntopng_obj.url
+        self.auth_token = ntopng_obj.auth_token
+        self.username   = getattr(ntopng_obj, "username", None)
+
+    def request(self, url, params):
+        return(PendingRequest("GET", url, params))
+
+    def post_request(self, url, params):
+        return(PendingRequest("POST", url, params))
+
+    def request_stream(self, url, params, path = ("rsp",), chunk_size = 65536):
+        return(PendingRequest("GET", url, params, path, chunk_size))
+
+    def post_request_stream(self, url, params, path = ("rsp",), chunk_size = 65536):
+        return(PendingRequest("POST", url, params, path, chunk_size))
+
+class AsyncNtopng:
+    """
+    AsyncNtopng issues the REST calls of an Ntopng handle with non-blocking I/O (requires aiohttp)
+
+    :param ntopng_obj: The ntopng handle
+    """
+    def __init__(self, ntopng_obj, max_concurrency = 64, timeout = None):
+        """
+        Construct a new AsyncNtopng object. Use it as async context manager (or call close())
+        so that its connections are closed before the event loop ends.
+
+        :param ntopng_obj: The ntopng handle (URL, credentials and metrics)
+        :type ntopng_obj: Ntopng
+        :param max_concurrency: The max number of in-flight REST calls towards this ntopng instance (per event loop)
+        :type max_concurrency: int
+        :param timeout: The max duration (seconds) of a REST call (None for no limit)
+        :type timeout: float
+        """
+        require_aiohttp()
+
+        self.ntopng_obj      = ntopng_obj
+        self.max_concurrency = max_concurrency
+        self.timeout         = timeout
+        self.builder         = RequestBuilder(ntopng_obj)
+        self.metrics         = ntopng_obj.metrics
+        self.headers         = dict(ntopng_obj.headers)
+        self.post_headers    = dict(ntopng_obj.post_headers)
+        self.sessions        = {} # event loop -> aiohttp session (a session is bound to the loop using it)
+        self.lock            = threading.Lock()
+
+        if(ntopng_obj.auth_token is not None):
+            self.auth = None
+        else:
+            self.auth = aiohttp.BasicAuth(ntopng_obj.username or "", ntopng_obj.password or "")
+
+    async def __aenter__(self):
+        return(self)
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    # internal method returning the session (and connection pool) of an event loop
+    def get_session(self, loop):
+        with self.lock:
+            session = self.sessions.get(loop)
+
+            if(session is None):
+                # Forget the loops closed in the meantime (e.g. by asyncio.run)
+                for closed in [ l for l in self.sessions if l.is_closed() ]:
+                    del self.sessions[closed]
+
+                session = aiohttp.ClientSession(connector = aiohttp.TCPConnector(limit = self.max_concurrency),
+                                                timeout = aiohttp.ClientTimeout(total = self.timeout),
+                                                auth = self.auth)
+                self.sessions[loop] = session
+
+            return(session)
+
+    async def close(self):
+        """
+        Close the connections opened from the running event loop
+        """
+        with self.lock:
+            session = self.sessions.pop(asyncio.get_running_loop(), None)
+
+        if(session is not None):
+            await session.close()
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Run a blocking call (e.g. a helper of the synchronous API not available as coroutine)
+        in the event loop executor
+
+        :param func: The function to call
+        :type func: function
+        :return: The function result
+        :rtype: object
+        """
+        loop = asyncio.get_running_loop()
+
+        return(await loop.run_in_executor(None, functools.partial(func, *args, **kwargs)))
+
+    # internal method sending a request (the response body is not read)
+    async def send(self, method, api_url, params):
+        session = self.get_session(asyncio.get_running_loop())
+        start   = time.perf_counter()
+
+        try:
+            if(method == "POST"):
+                body = json.dumps(params).encode("utf-8")
+                response = await session.post(api_url, data = body, headers = self.post_headers)
+                request_bytes = len(body)
+            else:
+                response = await session.get(api_url, params = get_query_params(params), headers = self.headers)
+                request_bytes = len(response.url.raw_query_string)
+        except Exception as e:
+            self.metrics.observe_error(method, api_url, type(e).__name__)
+            raise
+
+        return(response, request_bytes, start)
+
+    # internal method issuing a request and decoding its response
+    async def issue(self, method, url, params):
+        api_url = self.ntopng_obj.url + url
+        response, request_bytes, start = await self.send(method, api_url, params)
+
+        try:
+            body = await response.read()
+        except Exception as e:
+            self.metrics.observe_error(method, api_url, type(e).__name__)
+            raise
+        finally:
+            response.release()
+
+        self.metrics.observe_request(method, api_url, time.perf_counter() - start, request_bytes, len(body), response.status)
+
+        if(response.status != 200):
+            raise Exception("Invalid response code " + str(response.status))
+
+        start = time.perf_counter()
+
+        try:
+            rsp = json.loads(body)
+        except ValueError:
+            self.metrics.observe_error(method, api_url, "decode")
+            raise
+
+        self.metrics.observe_decode(method, api_url, time.perf_counter() - start)
+
+        return(rsp["rsp"])
+
+    # internal method yielding the elements of the response list found at path as they are received
+    async def iter_items(self, method, url, params, path, chunk_size):
+        api_url = self.ntopng_obj.url + url
+        response, request_bytes, start = await self.send(method, api_url, params)
+
+        # The body bytes are recorded as they are consumed
+        self.metrics.observe_request(method, api_url, time.perf_counter() - start, request_bytes, 0, response.status)
+
+        response_bytes = 0
+        decode_time    = 0
+
+        try:
+            if(response.status != 200):
+                raise Exception("Invalid response code " + str(response.status))
+
+            parser = JSONStreamParser()
+            events = parser.events(path)
+
+            while(True):
+                start = time.perf_counter()
+                event = next(events, parser)
+                decode_time += time.perf_counter() - start
+
+                if(event is parser):
+                    return
+                elif(event is NEED_DATA):
+                    chunk = await response.content.read(chunk_size)
+                    response_bytes += len(chunk)
+                    start = time.perf_counter()
+
+                    if(chunk):
+                        parser.feed(chunk)
+                    else:
+                        parser.feed_eof()
+
+                    decode_time += time.perf_counter() - start
+                else:
+                    yield(event)
+        finally:
+            response.release()
+            self.metrics.observe_response_bytes(method, api_url, response_bytes)
+            self.metrics.observe_decode(method, api_url, decode_time)
+
+    async def issue_request(self, pending):
+        """
+        Issue a request built by the synchronous API (see RequestBuilder)
+
+        :param pending: The request
+        :type pending: PendingRequest
+        :return: The response (an async iterator over the list elements for streamed requests)
+        :rtype: object
+        """
+        if(pending.path is not None):
+            return(self.iter_items(pending.method, pending.url, pending.params, pending.path, pending.chunk_size))
+
+        return(await self.issue(pending.method, pending.url, pending.params))
+
+    async def request(self, url, params):
+        return(await self.issue("GET", url, params))
+
+    async def post_request(self, url, params):
+        return(await self.issue("POST", url, params))
+
+    async def get_alert_types(self):
+        """
+        Return all alert types
+
+        :return: The list of alert types
+        :rtype: array
+        """
+        return(await self.request(self.ntopng_obj.rest_v2_url + "/get/alert/type/consts.lua", None))
+
+    async def get_alert_severities(self):
+        """
+        Return all severities
+
+        :return: The list of severities
+        :rtype: array
+        """
+        return(await self.request(self.ntopng_obj.rest_v2_url + "/get/alert/severity/consts.lua", None))
+
+    async def get_interfaces(self):
+        """
+        Return all available interfaces
+
+        :return: The list of interfaces
+        :rtype: array
+        """
+        return(await self.request(self.ntopng_obj.rest_v2_url + "/get/ntopng/interfaces.lua", None))
+
+class AsyncWrapper:
+    """
+    AsyncWrapper exposes the methods of a synchronous API object issuing a single request
+    (listed in request_methods) as coroutines
+
+    :param async_ntopng: The AsyncNtopng handle
+    :param sync_obj: The synchronous API object, bound to the RequestBuilder of async_ntopng
+    """
+    request_methods = ()
+
+    def __init__(self, async_ntopng, sync_obj):
+        self.async_ntopng = async_ntopng
+        self.sync_obj     = sync_obj
+
+    def __getattr__(self, name):
+        if(name not in self.request_methods):
+            raise AttributeError("'" + type(self).__name__ + "' object has no attribute '" + name + "' (blocking helpers can be run with AsyncNtopng.run())")
+
+        attr = getattr(self.sync_obj, name)
+
+        @functools.wraps(attr)
+        async def method(*args, **kwargs):
+            return(await self.async_ntopng.issue_request(attr(*args, **kwargs)))
+
+        return(method)
+
+class AsyncInterface(AsyncWrapper):
+    """
+    AsyncInterface provides the Interface methods as coroutines
+
+    :param async_ntopng: The AsyncNtopng handle
+    """
+    request_methods = ( "get_data", "get_broadcast_domains", "get_address", "get_l7_stats", "get_dscp_stats" )
+
+    def __init__(self, async_ntopng):
+        AsyncWrapper.__init__(self, async_ntopng, Interface(async_ntopng.builder))
+
+class AsyncHost(AsyncWrapper):
+    """
+    AsyncHost provides the Host methods as coroutines
+
+    :param async_ntopng: The AsyncNtopng handle
+    """
+    request_methods = ( "get_active_hosts", "get_active_hosts_paginated", "get_host_interfaces", "get_host_data",
+                        "get_host_l7_stats", "get_host_dscp_stats", "get_top_local_talkers", "get_top_remote_talkers" )
+
+    def __init__(self, async_ntopng):
+        AsyncWrapper.__init__(self, async_ntopng, Host(async_ntopng.builder))
+
+    async def get_active_hosts_records(self, ifid, currentPage, perPage, sortColumn = None, sortOrder = None, **filters):
+        """
+        Retrieve the (paginated) list of active hosts as ActiveHostRecord objects (see Host.get_active_hosts_records)
+
+        :return: The active hosts
+        :rtype: array
+        """
+        return(ActiveHostRecord.from_rsp(await self.get_active_hosts_paginated(ifid, currentPage, perPage, sortColumn, sortOrder, **filters)))
+
+class AsyncFlow(AsyncWrapper):
+    """
+    AsyncFlow provides the Flow methods as coroutines
+
+    :param async_ntopng: The AsyncNtopng handle
+    """
+    request_methods = ( "get_active_flows_paginated", "get_active_host_flows_paginated", "get_active_flows_paginated_stream",
+                        "get_active_l4_proto_flow_counters", "get_active_l7_proto_flow_counters" )
+
+    def __init__(self, async_ntopng):
+        AsyncWrapper.__init__(self, async_ntopng, Flow(async_ntopng.builder))
+
+    async def iter_active_flows_pages(self, ifid, host = None, vlan = None, per_page = 1000, prefetch = 4, adaptive = True, target_page_time = 0.5, max_per_page = 16000,
+                                      sortColumn = None, sortOrder = None, verbose = False, **filters):
+        """
+        Walk all the pages of active flows for the specified interface (and host, if any),
+        requesting up to prefetch pages concurrently (see Flow.iter_active_flows_pages for
+        sorting and filters)
+
+        :param ifid: The interface ID
+        :type ifid: int
+        :param host: The host (None for all the interface flows)
+        :type host: string
+        :param vlan: The host VLAN ID (if any)
+        :type vlan: string
+        :param per_page: The initial (and minimum) number of results per page
+        :type per_page: int
+        :param prefetch: The max number of pages requested concurrently
+        :type prefetch: int
+        :param adaptive: Adapt the page size to the observed response time
+        :type adaptive: boolean
+        :param target_page_time: The target response time (seconds) of a page
+        :type target_page_time: float
+        :param max_per_page: The max number of results per page
+        :type max_per_page: int
+        :param sortColumn: The sort column
+        :type sortColumn: string
+        :param sortOrder: The sort order: asc or desc
+        :type sortOrder: string
+        :param verbose: Include packets and TCP statistics
+        :type verbose: boolean
+        :return: Pages (lists) of active flows
+        :rtype: async generator
+        """
+        if(host is not None):
+            filters = dict(filters, host = host, vlan = vlan)
+
+        params = self.sync_obj.get_active_flows_params(ifid, sortColumn, sortOrder, verbose, filters)
+
+        url = self.sync_obj.rest_v2_url + "/get/flow/active.lua"
+
+        async def fetch(offset, size):
+            start = time.perf_counter()
+            rsp = await self.async_ntopng.request(url, dict(params, currentPage = (offset // size) + 1, perPage = size))
+
+            return(rsp, time.perf_counter() - start)
+
+        size      = per_page
+        rate      = None
+        total     = None
+        pending   = deque([ (0, per_page, asyncio.ensure_future(fetch(0, per_page))) ])
+        next_offset = per_page
+
+        try:
+            while(pending):
+                offset, req_size, future = pending.popleft()
+                rsp, elapsed = await future
+                data = rsp.get("data") or []
+
+                if(rsp.get("totalRows") is not None):
+                    total = rsp["totalRows"]
+
+                if(len(data) < req_size):
+                    # Last page
+                    yield(data)
+                    return
+
+                if(adaptive and (elapsed > 0)):
+                    rate = (req_size / elapsed) if (rate is None) else (0.5 * rate + 0.5 * (req_size / elapsed))
+                    size = per_page
+
+                    while(((size * 2) <= max_per_page) and ((size * 2) <= (rate * target_page_time))):
+                        size *= 2
+
+                # Pages are always multiple of per_page: a page of size s starts at a multiple of s
+                while((len(pending) < max(prefetch, 1)) and ((total is None) or (next_offset < total))):
+                    s = size
+
+                    while((next_offset % s) != 0):
+                        s //= 2
+
+                    pending.append((next_offset, s, asyncio.ensure_future(fetch(next_offset, s))))
+                    next_offset += s
+
+                yield(data)
+        finally:
+            for offset, req_size, future in pending:
+                future.cancel()
+
+    async def iter_active_flows(self, ifid, host = None, vlan = None, per_page = 1000, prefetch = 4, adaptive = True, sortColumn = None, sortOrder = None, verbose = False, **filters):
+        """
+        Iterate over all the active flows for the specified interface (and host, if any),
+        requesting pages concurrently (see iter_active_flows_pages for sorting and filters)
+
+        :param ifid: The interface ID
+        :type ifid: int
+        :param host: The host (None for all the interface flows)
+        :type host: string
+        :param vlan: The host VLAN ID (if any)
+        :type vlan: string
+        :param per_page: The initial (and minimum) number of results per page
+        :type per_page: int
+        :param prefetch: The max number of pages requested concurrently
+        :type prefetch: int
+        :param adaptive: Adapt the page size to the observed response time
+        :type adaptive: boolean
+        :return: Active flows
+        :rtype: async generator
+        """
+        async for page in self.iter_active_flows_pages(ifid, host, vlan, per_page, prefetch, adaptive, sortColumn = sortColumn, sortOrder = sortOrder, verbose = verbose, **filters):
+            for flow in page:
+                yield(flow)
+
+    async def get_active_flows_delta(self, ifid, differ, host = None, vlan = None, per_page = 1000, verbose = False, **filters):
+        """
+        Compare the active flows with the previous snapshot seen by the differ (see Flow.get_active_flows_delta)
+
+        :return: The delta events (added, removed, changed flows)
+        :rtype: array
+        """
+        flows = []
+
+        async for page in self.iter_active_flows_pages(ifid, host, vlan, per_page, verbose = verbose, **filters):
+            flows.extend(page)
+
+        return(differ.update(flows))
+
+    async def get_active_flows_table(self, ifid, host = None, vlan = None, per_page = 1000, columns = None, verbose = False, **filters):
+        """
+        Retrieve all the active flows as a columnar FlowTable (see Flow.get_active_flows_table)
+
+        :return: The active flows
+        :rtype: FlowTable
+        """
+        builder = FlowTableBuilder(columns)
+
+        async for page in self.iter_active_flows_pages(ifid, host, vlan, per_page, verbose = verbose, **filters):
+            builder.add(page)
+
+        return(builder.build())
+
+    async def get_active_flows_records(self, ifid, host = None, vlan = None, per_page = 1000, verbose = False, **filters):
+        """
+        Retrieve all the active flows as ActiveFlowRecord objects (see Flow.get_active_flows_records)
+
+        :return: The active flows
+        :rtype: array
+        """
+        records = []
+
+        async for page in self.iter_active_flows_pages(ifid, host, vlan, per_page, verbose = verbose, **filters):
+            records.extend(ActiveFlowRecord.from_rsp(page))
+
+        return(records)
+
+class AsyncHistorical(AsyncWrapper):
+    """
+    AsyncHistorical provides the Historical methods as coroutines
+
+    :param async_ntopng: The AsyncNtopng handle
+    """
+    request_methods = ( "get_alert_type_counters", "get_alert_severity_counters", "get_alerts",
+                        "get_flow_alerts", "get_active_monitoring_alerts", "get_host_alerts", "get_interface_alerts", "get_mac_alerts",
+                        "get_network_alerts", "get_snmp_alerts", "get_system_alerts", "get_user_alerts",
+                        "get_timeseries", "get_timeseries_metadata", "get_host_timeseries", "get_interface_timeseries",
+                        "get_flows", "get_flows_stream", "get_topk_flows" )
+
+    def __init__(self, async_ntopng):
+        AsyncWrapper.__init__(self, async_ntopng, Historical(async_ntopng.builder))
+
+    async def iter_alerts_pages(self, alert_family, ifid, epoch_begin, epoch_end, select_clause, where_clause, page_size = 1000, order_by = "tstamp, rowid", after = None):
+        """
+        Return all the matching alerts page by page, using keyset pagination (see Historical.iter_alerts_pages)
+
+        :return: Pages (lists) of alerts
+        :rtype: async generator
+        """
+        check_select_clause(select_clause, order_by)
+
+        async def fetch(clause, maxhits, order):
+            return(await self.get_alerts(alert_family, ifid, epoch_begin, epoch_end, select_clause, clause, maxhits, None, order))
+
+        async for page in async_iter_keyset_pages(fetch, where_clause, order_by, page_size, after):
+            yield(page)
+
+    async def get_all_alerts(self, ifid, epoch_begin, epoch_end, select_clause, where_clause, maxhits, order_by = "tstamp DESC", families = None, skip_errors = False):
+        """
+        Return the alerts of all the families as a single list ordered by order_by, querying
+        the families concurrently; maxhits applies to each family before the merge (see
+        Historical.get_all_alerts)
+
+        :return: Query result
+        :rtype: array
+        """
+        families = list(families or ALERT_FAMILIES)
+        rsps     = await asyncio.gather(*[ self.get_alerts(family, ifid, epoch_begin, epoch_end, select_clause, where_clause, maxhits, None, order_by)
+                                           for family in families ], return_exceptions = True)
+        results  = []
+
+        for family, rows in zip(families, rsps):
+            if(isinstance(rows, BaseException)):
+                if(skip_errors and isinstance(rows, Exception)):
+                    continue
+                raise rows
+
+            results.append(sort_rows([ dict(row, alert_family = family) for row in (rows or []) ], order_by))
+
+        return(merge_sorted(results, order_by, maxhits))
+
+    async def get_timeseries_array(self, ts_schema, ts_query, epoch_begin, epoch_end):
+        """
+        Return timeseries as NumPy arrays (see Historical.get_timeseries_array)
+
+        :return: Timeseries data
+        :rtype: TimeseriesResult
+        """
+        return(TimeseriesResult.from_rsp(await self.get_timeseries(ts_schema, ts_query, epoch_begin, epoch_end), ts_schema, ts_query))
+
+    async def get_host_timeseries_array(self, ifid, host_ip, ts_schema, epoch_begin, epoch_end):
+        """
+        Return host timeseries as NumPy arrays (see Historical.get_host_timeseries_array)
+
+        :return: Timeseries data
+        :rtype: TimeseriesResult
+        """
+        return(await self.get_timeseries_array(ts_schema, "ifid:"+str(ifid)+",host:"+host_ip, epoch_begin, epoch_end))
+
+    async def get_interface_timeseries_array(self, ifid, ts_schema, epoch_begin, epoch_end):
+        """
+        Return interface timeseries as NumPy arrays (see Historical.get_interface_timeseries_array)
+
+        :return: Timeseries data
+        :rtype: TimeseriesResult
+        """
+        return(await self.get_timeseries_array(ts_schema, "ifid:"+str(ifid), epoch_begin, epoch_end))
+
+    async def get_timeseries_downsampled(self, ts_schema, ts_query, epoch_begin, epoch_end, max_points, ts_aggregation = None, metric = None):
+        """
+        Return timeseries reduced to at most max_points points (see Historical.get_timeseries_downsampled)
+
+        :return: Timeseries data
+        :rtype: TimeseriesResult
+        """
+        rsp = await self.get_timeseries(ts_schema, ts_query, epoch_begin, epoch_end, limit = max_points, ts_aggregation = ts_aggregation)
+
+        return(TimeseriesResult.from_rsp(rsp, ts_schema, ts_query).downsample(max_points, metric))
+
+    async def iter_flows_pages(self, ifid, epoch_begin, epoch_end, select_clause, where_clause, page_size = 10000, order_by = "FIRST_SEEN, FLOW_ID", after = None):
+        """
+        Return all the matching flows page by page, using keyset pagination (see Historical.iter_flows_pages)
+
+        :return: Pages (lists) of flows
+        :rtype: async generator
+        """
+        check_select_clause(select_clause, order_by)
+
+        async def fetch(clause, maxhits, order):
+            return(await self.get_flows(ifid, epoch_begin, epoch_end, select_clause, clause, maxhits, None, order))
+
+        async for page in async_iter_keyset_pages(fetch, where_clause, order_by, page_size, after):
+            yield(page)
+
+    async def get_flows_records(self, ifid, epoch_begin, epoch_end, select_clause, where_clause, maxhits, group_by, order_by):
+        """
+        Run a flows query returning HistoricalFlowRecord tuples (see Historical.get_flows_records)
+
+        :return: Query result
+        :rtype: array
+        """
+        return(get_historical_flow_records(await self.get_flows(ifid, epoch_begin, epoch_end, select_clause, where_clause, maxhits, group_by, order_by)))
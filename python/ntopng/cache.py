@@ -0,0 +1,208 @@
+"""
+Cache
+====================================
+The ResponseCache class caches the responses of constant or slow-changing REST
+endpoints (alert types, severities, interfaces, timeseries metadata) so that
+they are not fetched again on every call.
+
+Each endpoint has its own TTL; only endpoints with a TTL are cached. Once an
+entry expires it is still served for stale_ttl seconds while it is refreshed in
+background (stale-while-revalidate). Entries are evicted in LRU order when the
+cache exceeds its memory bound.
+"""
+
+import json
+import time
+import threading
+from collections import OrderedDict
+
+# Default TTL (seconds) per endpoint (matched as URL suffix)
+DEFAULT_TTLS = {
+    "/get/alert/type/consts.lua": 3600,
+    "/get/alert/severity/consts.lua": 3600,
+    "/get/timeseries/type/consts.lua": 3600,
+    "/get/ntopng/interfaces.lua": 300,
+}
+
+class CacheEntry:
+    def __init__(self, url, value, size, expires, stale_until):
+        self.url         = url
+        self.value       = value
+        self.size        = size
+        self.expires     = expires
+        self.stale_until = stale_until
+        self.refreshing  = False
+
+class ResponseCache:
+    """
+    ResponseCache is a TTL + LRU cache for REST responses
+
+    :param ttls: TTL (seconds) per endpoint
+    :param max_bytes: Memory bound of the cache
+    """
+    def __init__(self, ttls = None, default_ttl = None, stale_ttl = 60, max_bytes = 16*1024*1024, max_entries = 4096):
+        """
+        Construct a new ResponseCache object
+
+        :param ttls: TTL (seconds) per endpoint, matched as URL suffix (default: DEFAULT_TTLS)
+        :type ttls: object
+        :param default_ttl: TTL of endpoints not listed in ttls (None: do not cache them)
+        :type default_ttl: int
+        :param stale_ttl: Seconds an expired entry is still served while it is refreshed in background (0 to disable)
+        :type stale_ttl: int
+        :param max_bytes: Max (estimated) size of the cached responses
+        :type max_bytes: int
+        :param max_entries: Max number of cached responses
+        :type max_entries: int
+        """
+        self.ttls        = dict(DEFAULT_TTLS if (ttls is None) else ttls)
+        self.default_ttl = default_ttl
+        self.stale_ttl   = stale_ttl
+        self.max_bytes   = max_bytes
+        self.max_entries = max_entries
+        self.entries     = OrderedDict()
+        self.num_bytes   = 0
+        self.lock        = threading.Lock()
+        self.stats       = { "hits": 0, "stale_hits": 0, "misses": 0, "evictions": 0,
+                             "refreshes": 0, "refresh_errors": 0, "invalidations": 0 }
+
+    def set_ttl(self, endpoint, ttl):
+        """
+        Set the TTL of an endpoint
+
+        :param endpoint: The endpoint (URL suffix, e.g. /get/ntopng/interfaces.lua)
+        :type endpoint: string
+        :param ttl: The TTL in seconds (None to disable caching of the endpoint)
+        :type ttl: int
+        """
+        with self.lock:
+            self.ttls[endpoint] = ttl
+
+    def get_ttl(self, url):
+        # set_ttl() may change the TTLs concurrently
+        with self.lock:
+            for endpoint, ttl in self.ttls.items():
+                if(url.endswith(endpoint)):
+                    return(ttl)
+
+        return(self.default_ttl)
+
+    def get(self, method, url, params, loader, identity = None):
+        """
+        Return the cached response for a request, calling loader() on cache miss
+
+        :param method: The HTTP method (GET, POST)
+        :type method: string
+        :param url: The endpoint URL
+        :type url: string
+        :param params: The request parameters
+        :type params: object
+        :param loader: The function issuing the actual request
+        :type loader: function
+        :param identity: The identity of the caller (ntopng instance and user), so that a cache shared by many handles does not mix their responses
+        :type identity: string
+        :return: The response (shared with the cache: do not modify it)
+        :rtype: object
+        """
+        ttl = self.get_ttl(url)
+
+        if(not ttl):
+            return(loader())
+
+        key = method + " " + str(identity) + " " + url + " " + json.dumps(params, sort_keys = True, default = str)
+        now = time.time()
+
+        with self.lock:
+            entry = self.entries.get(key)
+
+            if(entry is not None):
+                if(now < entry.expires):
+                    self.stats["hits"] += 1
+                    self.entries.move_to_end(key)
+                    return(entry.value)
+                elif(now < entry.stale_until):
+                    self.stats["stale_hits"] += 1
+                    self.entries.move_to_end(key)
+
+                    if(not entry.refreshing):
+                        entry.refreshing = True
+                        threading.Thread(target = self.refresh, args = (key, url, ttl, loader, entry), daemon = True).start()
+
+                    return(entry.value)
+                else:
+                    self.remove(key)
+
+            self.stats["misses"] += 1
+
+        value = loader()
+        self.put(key, url, value, ttl)
+
+        return(value)
+
+    def refresh(self, key, url, ttl, loader, entry):
+        try:
+            value = loader()
+        except Exception:
+            with self.lock:
+                self.stats["refresh_errors"] += 1
+                entry.refreshing = False
+            return
+
+        with self.lock:
+            self.stats["refreshes"] += 1
+
+        self.put(key, url, value, ttl, entry)
+
+    def put(self, key, url, value, ttl, refreshed = None):
+        size = len(json.dumps(value, default = str))
+        now  = time.time()
+
+        with self.lock:
+            if((refreshed is not None) and (self.entries.get(key) is not refreshed)):
+                # The entry was invalidated (or evicted) while it was being refreshed
+                return
+
+            if(key in self.entries):
+                self.remove(key)
+
+            if(size > self.max_bytes):
+                return
+
+            self.entries[key] = CacheEntry(url, value, size, now + ttl, now + ttl + self.stale_ttl)
+            self.num_bytes += size
+
+            while((self.num_bytes > self.max_bytes) or (len(self.entries) > self.max_entries)):
+                oldest = next(iter(self.entries))
+                self.remove(oldest)
+                self.stats["evictions"] += 1
+
+    # internal method (the caller must hold the lock)
+    def remove(self, key):
+        entry = self.entries.pop(key)
+        self.num_bytes -= entry.size
+
+    def invalidate(self, endpoint = None):
+        """
+        Remove cached responses
+
+        :param endpoint: Remove only the responses of this endpoint (URL suffix); None removes all
+        :type endpoint: string
+        """
+        with self.lock:
+            for key in [ k for k, e in self.entries.items() if ((endpoint is None) or e.url.endswith(endpoint)) ]:
+                self.remove(key)
+                self.stats["invalidations"] += 1
+
+    def get_stats(self):
+        """
+        Return cache statistics (hits, stale hits, misses, evictions, refreshes, size)
+
+        :return: The cache statistics
+        :rtype: object
+        """
+        with self.lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self.entries)
+            stats["bytes"]   = self.num_bytes
+
+        return(stats)
@@ -0,0 +1,245 @@
+"""
+Export
+====================================
+Export of historical flows to files for offline analysis. The query is read page by
+page (keyset pagination) and each page is converted to typed columns and appended to
+the output file, so memory usage is bounded by the batch size whatever the number
+of exported flows.
+
+Supported formats:
+
+- parquet: Apache Parquet (requires pyarrow)
+- arrow: Apache Arrow IPC file (requires pyarrow)
+- csv: CSV, gzip compressed if the file name ends with .gz
+
+Column types (int, uint, float, string) are inferred from the first batch unless
+specified (the UInt64 columns of the flows table are always uint); values that do not
+match the type of their column are exported as null. The select clause is checked
+before the output file is created: it must include the order by columns used for
+pagination.
+"""
+
+import os
+import csv
+import gzip
+import time
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+EXPORT_FORMATS = ( "parquet", "arrow", "csv" )
+
+# UInt64 columns of the flows table (values may not fit int64)
+UINT64_COLUMNS = ( "FLOW_ID", "TOTAL_BYTES", "SRC2DST_BYTES", "DST2SRC_BYTES", "FLOW_RISK" )
+
+INT64_MAX = (1 << 63) - 1
+UINT64_MAX = (1 << 64) - 1
+
+def require_pyarrow():
+    if(pyarrow is None):
+        raise ImportError("pyarrow is required for Parquet/Arrow export (pip3 install pyarrow)")
+
+def get_format(path):
+    """
+    Return the export format matching the file name (e.g. flows.parquet, flows.arrow, flows.csv.gz)
+
+    :param path: The output file name
+    :type path: string
+    :return: The export format
+    :rtype: string
+    """
+    name = path.lower()
+
+    if(name.endswith(".gz")):
+        name = name[:-3]
+
+    if(name.endswith(".parquet")):
+        return("parquet")
+    elif(name.endswith((".arrow", ".ipc", ".feather"))):
+        return("arrow")
+
+    return("csv")
+
+def infer_type(values):
+    # Numbers may be returned as strings (e.g. UInt64): check the textual form
+    kind = None
+
+    for value in values:
+        if(value is None or value == ""):
+            continue
+        elif(isinstance(value, bool)):
+            return("string")
+
+        try:
+            value_kind = "uint" if (int(value) > INT64_MAX) else "int"
+        except (TypeError, ValueError):
+            try:
+                float(value)
+                value_kind = "float"
+            except (TypeError, ValueError):
+                return("string")
+
+        if((kind is None) or (value_kind == "float") or ((kind == "int") and (value_kind == "uint"))):
+            kind = value_kind
+
+    return(kind or "string")
+
+def convert_value(value, kind):
+    if(value is None or value == ""):
+        return(None)
+
+    try:
+        if(kind == "int"):
+            value = int(value)
+            return(value if (-INT64_MAX - 1 <= value <= INT64_MAX) else None)
+        elif(kind == "uint"):
+            value = int(value)
+            return(value if (0 <= value <= UINT64_MAX) else None)
+        elif(kind == "float"):
+            return(float(value))
+    except (TypeError, ValueError):
+        return(None)
+
+    return(str(value))
+
+class ArrowFlowWriter:
+    """
+    ArrowFlowWriter appends batches of rows to a Parquet or Arrow IPC file
+    """
+    def __init__(self, path, file_format, types = None, compression = "zstd"):
+        require_pyarrow()
+
+        self.path        = path
+        self.file_format = file_format
+        self.types       = dict(types or {})
+        self.compression = compression
+        self.schema      = None
+        self.columns     = None
+        self.writer      = None
+        self.sink        = None
+
+    def open(self, rows):
+        self.columns = list(rows[0].keys())
+
+        for column in self.columns:
+            if(column in self.types):
+                continue
+            elif(column in UINT64_COLUMNS):
+                self.types[column] = "uint"
+            else:
+                self.types[column] = infer_type([ row.get(column) for row in rows ])
+
+        arrow_types = { "int": pyarrow.int64(), "uint": pyarrow.uint64(), "float": pyarrow.float64(), "string": pyarrow.string() }
+        self.schema = pyarrow.schema([ (column, arrow_types[self.types[column]]) for column in self.columns ])
+
+        if(self.file_format == "parquet"):
+            self.writer = pyarrow.parquet.ParquetWriter(self.path, self.schema, compression = self.compression)
+        else:
+            self.sink   = pyarrow.OSFile(self.path, "wb")
+            options     = pyarrow.ipc.IpcWriteOptions(compression = self.compression)
+            self.writer = pyarrow.ipc.new_file(self.sink, self.schema, options = options)
+
+    def write(self, rows):
+        if(self.writer is None):
+            self.open(rows)
+
+        arrays = [ pyarrow.array([ convert_value(row.get(column), self.types[column]) for row in rows ], type = self.schema.field(column).type)
+                   for column in self.columns ]
+
+        self.writer.write_table(pyarrow.Table.from_arrays(arrays, schema = self.schema))
+
+    def close(self):
+        if(self.writer is not None):
+            self.writer.close()
+
+        if(self.sink is not None):
+            self.sink.close()
+
+class CSVFlowWriter:
+    """
+    CSVFlowWriter appends batches of rows to a (gzip compressed) CSV file
+    """
+    def __init__(self, path, compress = None):
+        if(compress is None):
+            compress = path.lower().endswith(".gz")
+
+        self.file   = gzip.open(path, "wt", newline = "") if compress else open(path, "w", newline = "")
+        self.writer = None
+
+    def write(self, rows):
+        if(self.writer is None):
+            self.writer = csv.DictWriter(self.file, fieldnames = list(rows[0].keys()), extrasaction = "ignore")
+            self.writer.writeheader()
+
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+def export_flows(historical, path, ifid, epoch_begin, epoch_end, select_clause, where_clause, file_format = None, batch_size = 10000,
+                 order_by = "FIRST_SEEN, FLOW_ID", types = None, progress = None):
+    """
+    Export the historical flows matching a query to a file
+
+    :param historical: The Historical handle
+    :type historical: Historical
+    :param path: The output file name
+    :type path: string
+    :param ifid: The interface ID
+    :type ifid: int
+    :param epoch_begin: Start of the time interval (epoch)
+    :type epoch_begin: int
+    :param epoch_end: End of the time interval (epoch)
+    :type epoch_end: int
+    :param select_clause: Select clause (SQL syntax), must include the order_by columns
+    :type select_clause: string
+    :param where_clause: Where clause (SQL syntax)
+    :type where_clause: string
+    :param file_format: The export format: parquet, arrow or csv (default: from the file name)
+    :type file_format: string
+    :param batch_size: The number of flows read and written at once
+    :type batch_size: int
+    :param order_by: Unique order by condition (SQL syntax) used for pagination
+    :type order_by: string
+    :param types: The column types (int, uint, float, string), inferred from the first batch if not specified
+    :type types: object
+    :param progress: Function called as progress(rows) after each batch
+    :type progress: function
+    :return: Export statistics (rows, batches, bytes written, elapsed time)
+    :rtype: object
+    """
+    file_format = file_format or get_format(path)
+
+    if(file_format not in EXPORT_FORMATS):
+        raise ValueError("Unknown export format '" + str(file_format) + "'")
+
+    # Check the query (e.g. the order by columns are selected) before creating the file
+    pages = historical.iter_flows_pages(ifid, epoch_begin, epoch_end, select_clause, where_clause, batch_size, order_by)
+
+    if(file_format == "csv"):
+        writer = CSVFlowWriter(path)
+    else:
+        writer = ArrowFlowWriter(path, file_format, types)
+
+    start   = time.perf_counter()
+    rows    = 0
+    batches = 0
+
+    try:
+        for page in pages:
+            writer.write(page)
+            rows    += len(page)
+            batches += 1
+
+            if(progress is not None):
+                progress(rows)
+    finally:
+        writer.close()
+
+    return({ "rows": rows, "batches": batches, "format": file_format,
+             "bytes": os.path.getsize(path) if os.path.exists(path) else 0,
+             "elapsed": time.perf_counter() - start })
@@ -5,6 +5,20 @@ The Flow class can be used to access information about active flows through the
 REST API (https://www.ntop.org/guides/ntopng/api/rest/api_v2.html).
 """
 
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from .ntopng import get_filter_params
+from .flow_table import FlowTableBuilder
+from .records import ActiveFlowRecord
+from .flow_planner import HostFlowsPlanner
+
+# Filters supported by flow/active.lua
+FLOW_FILTERS = ( "host", "vlan", "application", "category", "l4proto", "port", "version", "network", "traffic_type",
+                 "flowhosts_type", "alert_type", "asn", "host_pool_id", "dscp", "tcp_flow_state", "talking_with",
+                 "username", "pid_name", "container", "pod", "deviceIP", "inIfIdx", "outIfIdx" )
+
 class Flow:
     """
     Flow provides information about active flows
@@ -21,9 +35,39 @@ class Flow:
         self.rest_v2_url     = "/lua/rest/v2"
         self.rest_pro_v2_url = "/lua/pro/rest/v2"
 
-    def get_active_flows_paginated(self, ifid, currentPage, perPage):
+    def get_active_flows_params(self, ifid, sortColumn, sortOrder, verbose, filters):
+        # internal method building the flow/active.lua parameters
+        params = { "ifid": ifid }
+        params.update(get_filter_params(filters, FLOW_FILTERS))
+
+        if(sortColumn is not None):
+            params["sortColumn"] = sortColumn
+        if(sortOrder is not None):
+            params["sortOrder"] = sortOrder
+        if(verbose):
+            params["verbose"] = "true"
+
+        return(params)
+
+    def get_active_flows_paginated(self, ifid, currentPage, perPage, sortColumn = None, sortOrder = None, verbose = False, **filters):
         """
-        Retrieve the (paginated) list of active flows for the specified interface
+        Retrieve the (paginated) list of active flows for the specified interface. Flows
+        are selected and sorted by ntopng, so that only the matching flows are transferred,
+        e.g. get_active_flows_paginated(0, 1, 100, "bytes", "desc", application = "TLS", l4proto = 6)
+
+        Supported filters (see FLOW_FILTERS) include:
+
+        - host: IP address of the client or server
+        - vlan: VLAN ID
+        - application: L7 protocol name (e.g. TLS)
+        - category: L7 category name
+        - l4proto: L4 protocol number (e.g. 6 for TCP)
+        - port: client or server port
+        - version: IP version (4 or 6)
+        - traffic_type: unicast, broadcast_multicast, one_way_unicast, one_way_broadcast_multicast
+        - flowhosts_type: local_only, remote_only, local_origin_remote_target, remote_origin_local_target
+        - alert_type: normal, alerted, periodic, filtered or the flow status ID
+        - asn: AS number
         
         :param ifid: The interface ID
         :type ifid: int
@@ -31,14 +75,24 @@ class Flow:
         :type currentPage: int
         :param perPage: The number of results per page
         :type perPage: int
+        :param sortColumn: The sort column: client, server, bytes, thpt, duration, first_seen, last_seen, score, vlan, proto_l4, ndpi, info
+        :type sortColumn: string
+        :param sortOrder: The sort order: asc or desc
+        :type sortOrder: string
+        :param verbose: Include packets and TCP statistics (latency, retransmissions, out of order, lost)
+        :type verbose: boolean
         :return: All active flows
         :rtype: array
         """
-        return(self.ntopng_obj.request(self.rest_v2_url + "/get/flow/active.lua", {"ifid": ifid, "currentPage": currentPage, "perPage": perPage}))
+        params = self.get_active_flows_params(ifid, sortColumn, sortOrder, verbose, filters)
+        params.update({ "currentPage": currentPage, "perPage": perPage })
+
+        return(self.ntopng_obj.request(self.rest_v2_url + "/get/flow/active.lua", params))
 
-    def get_active_host_flows_paginated(self, ifid, host, vlan, currentPage, perPage):
+    def get_active_host_flows_paginated(self, ifid, host, vlan, currentPage, perPage, sortColumn = None, sortOrder = None, verbose = False, **filters):
         """
         Retrieve the (paginated) list of active flows for the specified interface and host
+        (see get_active_flows_paginated for sorting and filters)
         
         :param ifid: The interface ID
         :type ifid: int
@@ -50,10 +104,259 @@ class Flow:
         :type currentPage: int
         :param perPage: The number of results per page
         :type perPage: int
+        :param sortColumn: The sort column
+        :type sortColumn: string
+        :param sortOrder: The sort order: asc or desc
+        :type sortOrder: string
+        :param verbose: Include packets and TCP statistics
+        :type verbose: boolean
         :return: All active flows
         :rtype: array
         """
-        return(self.ntopng_obj.request(self.rest_v2_url + "/get/flow/active.lua", {"ifid": ifid, "host": host, "vlan": vlan, "currentPage": currentPage, "perPage": perPage}))
+        return(self.get_active_flows_paginated(ifid, currentPage, perPage, sortColumn, sortOrder, verbose, **dict(filters, host = host, vlan = vlan)))
+
+    def get_active_flows_paginated_stream(self, ifid, currentPage, perPage, sortColumn = None, sortOrder = None, verbose = False, **filters):
+        """
+        Retrieve the (paginated) list of active flows for the specified interface, decoding
+        the response incrementally: flows are returned as soon as they are received and
+        memory usage does not depend on the page size (see get_active_flows_paginated for
+        sorting and filters)
+        
+        :param ifid: The interface ID
+        :type ifid: int
+        :param currentPage: The current page
+        :type currentPage: int
+        :param perPage: The number of results per page
+        :type perPage: int
+        :param sortColumn: The sort column
+        :type sortColumn: string
+        :param sortOrder: The sort order: asc or desc
+        :type sortOrder: string
+        :param verbose: Include packets and TCP statistics
+        :type verbose: boolean
+        :return: The active flows of the page
+        :rtype: generator
+        """
+        params = self.get_active_flows_params(ifid, sortColumn, sortOrder, verbose, filters)
+        params.update({ "currentPage": currentPage, "perPage": perPage })
+
+        return(self.ntopng_obj.request_stream(self.rest_v2_url + "/get/flow/active.lua", params, ("rsp", "data")))
+
+    def iter_active_flows_pages(self, ifid, host = None, vlan = None, per_page = 1000, prefetch = 4, adaptive = True, target_page_time = 0.5, max_per_page = 16000,
+                                sortColumn = None, sortOrder = None, verbose = False, **filters):
+        """
+        Walk all the pages of active flows for the specified interface (and host, if any).
+        While a page is being consumed, the next pages are fetched in background. When
+        adaptive is set, the page size is doubled/halved (within [per_page, max_per_page])
+        so that a page takes about target_page_time seconds to be retrieved.
+
+        Note that flows are live data: flows starting/ending during the walk can be
+        missed or returned twice. Sorting and filters are applied by ntopng (see
+        get_active_flows_paginated).
+        
+        :param ifid: The interface ID
+        :type ifid: int
+        :param host: The host (None for all the interface flows)
+        :type host: string
+        :param vlan: The host VLAN ID (if any)
+        :type vlan: string
+        :param per_page: The initial (and minimum) number of results per page
+        :type per_page: int
+        :param prefetch: The max number of pages fetched in background
+        :type prefetch: int
+        :param adaptive: Adapt the page size to the observed response time
+        :type adaptive: boolean
+        :param target_page_time: The target response time (seconds) of a page
+        :type target_page_time: float
+        :param max_per_page: The max number of results per page
+        :type max_per_page: int
+        :param sortColumn: The sort column
+        :type sortColumn: string
+        :param sortOrder: The sort order: asc or desc
+        :type sortOrder: string
+        :param verbose: Include packets and TCP statistics
+        :type verbose: boolean
+        :return: Pages (lists) of active flows
+        :rtype: generator
+        """
+        if(host is not None):
+            filters = dict(filters, host = host, vlan = vlan)
+
+        params = self.get_active_flows_params(ifid, sortColumn, sortOrder, verbose, filters)
+
+        def fetch(offset, size):
+            start = time.perf_counter()
+            rsp = self.ntopng_obj.request(self.rest_v2_url + "/get/flow/active.lua", dict(params, currentPage = (offset // size) + 1, perPage = size))
+
+            return(rsp, time.perf_counter() - start)
+
+        executor  = ThreadPoolExecutor(max_workers = max(prefetch, 1))
+        size      = per_page
+        rate      = None
+        total     = None
+        pending   = deque([ (0, per_page, executor.submit(fetch, 0, per_page)) ])
+        next_offset = per_page
+
+        try:
+            while(pending):
+                offset, req_size, future = pending.popleft()
+                rsp, elapsed = future.result()
+                data = rsp.get("data") or []
+
+                if(rsp.get("totalRows") is not None):
+                    total = rsp["totalRows"]
+
+                if(len(data) < req_size):
+                    # Last page
+                    yield(data)
+                    return
+
+                if(adaptive and (elapsed > 0)):
+                    rate = (req_size / elapsed) if (rate is None) else (0.5 * rate + 0.5 * (req_size / elapsed))
+                    size = per_page
+
+                    while(((size * 2) <= max_per_page) and ((size * 2) <= (rate * target_page_time))):
+                        size *= 2
+
+                # Pages are always multiple of per_page: a page of size s starts at a multiple of s
+                while((len(pending) < max(prefetch, 1)) and ((total is None) or (next_offset < total))):
+                    s = size
+
+                    while((next_offset % s) != 0):
+                        s //= 2
+
+                    pending.append((next_offset, s, executor.submit(fetch, next_offset, s)))
+                    next_offset += s
+
+                yield(data)
+        finally:
+            executor.shutdown(wait = False, cancel_futures = True)
+
+    def iter_active_flows(self, ifid, host = None, vlan = None, per_page = 1000, prefetch = 4, adaptive = True, sortColumn = None, sortOrder = None, verbose = False, **filters):
+        """
+        Iterate over all the active flows for the specified interface (and host, if any),
+        fetching pages in background (see iter_active_flows_pages for sorting and filters)
+        
+        :param ifid: The interface ID
+        :type ifid: int
+        :param host: The host (None for all the interface flows)
+        :type host: string
+        :param vlan: The host VLAN ID (if any)
+        :type vlan: string
+        :param per_page: The initial (and minimum) number of results per page
+        :type per_page: int
+        :param prefetch: The max number of pages fetched in background
+        :type prefetch: int
+        :param adaptive: Adapt the page size to the observed response time
+        :type adaptive: boolean
+        :param sortColumn: The sort column
+        :type sortColumn: string
+        :param sortOrder: The sort order: asc or desc
+        :type sortOrder: string
+        :param verbose: Include packets and TCP statistics
+        :type verbose: boolean
+        :return: Active flows
+        :rtype: generator
+        """
+        for page in self.iter_active_flows_pages(ifid, host, vlan, per_page, prefetch, adaptive, sortColumn = sortColumn, sortOrder = sortOrder, verbose = verbose, **filters):
+            for flow in page:
+                yield(flow)
+
+    def get_active_flows_delta(self, ifid, differ, host = None, vlan = None, per_page = 1000, verbose = False, **filters):
+        """
+        Walk the active flows for the specified interface (and host, if any) and compare
+        them with the previous snapshot seen by the differ. Set verbose to compute the
+        packets deltas; the same filters (see get_active_flows_paginated) must be used at
+        each poll
+
+        :param ifid: The interface ID
+        :type ifid: int
+        :param differ: The differ keeping the previous snapshot
+        :type differ: FlowSnapshotDiffer
+        :param host: The host (None for all the interface flows)
+        :type host: string
+        :param vlan: The host VLAN ID (if any)
+        :type vlan: string
+        :param per_page: The initial (and minimum) number of results per page
+        :type per_page: int
+        :param verbose: Include packets and TCP statistics
+        :type verbose: boolean
+        :return: The delta events (added, removed, changed flows)
+        :rtype: array
+        """
+        return(differ.update(self.iter_active_flows(ifid, host, vlan, per_page, verbose = verbose, **filters)))
+
+    def get_active_flows_table(self, ifid, host = None, vlan = None, per_page = 1000, columns = None, verbose = False, **filters):
+        """
+        Retrieve all the active flows for the specified interface (and host, if any) as a
+        columnar FlowTable (NumPy arrays), converting pages as they are received. Filters
+        (see get_active_flows_paginated) are applied by ntopng
+
+        :param ifid: The interface ID
+        :type ifid: int
+        :param host: The host (None for all the interface flows)
+        :type host: string
+        :param vlan: The host VLAN ID (if any)
+        :type vlan: string
+        :param per_page: The initial (and minimum) number of results per page
+        :type per_page: int
+        :param columns: The columns as (name, path, kind) tuples (default: flow_table.DEFAULT_FLOW_COLUMNS)
+        :type columns: array
+        :param verbose: Include packets and TCP statistics
+        :type verbose: boolean
+        :return: The active flows
+        :rtype: FlowTable
+        """
+        builder = FlowTableBuilder(columns)
+
+        for page in self.iter_active_flows_pages(ifid, host, vlan, per_page, verbose = verbose, **filters):
+            builder.add(page)
+
+        return(builder.build())
+
+    def get_active_flows_records(self, ifid, host = None, vlan = None, per_page = 1000, verbose = False, **filters):
+        """
+        Retrieve all the active flows for the specified interface (and host, if any) as
+        compact ActiveFlowRecord objects, converting pages as they are received. Filters
+        (see get_active_flows_paginated) are applied by ntopng
+
+        :param ifid: The interface ID
+        :type ifid: int
+        :param host: The host (None for all the interface flows)
+        :type host: string
+        :param vlan: The host VLAN ID (if any)
+        :type vlan: string
+        :param per_page: The initial (and minimum) number of results per page
+        :type per_page: int
+        :param verbose: Include packets and TCP statistics
+        :type verbose: boolean
+        :return: The active flows
+        :rtype: array
+        """
+        records = []
+
+        for page in self.iter_active_flows_pages(ifid, host, vlan, per_page, verbose = verbose, **filters):
+            records.extend(ActiveFlowRecord.from_rsp(page))
+
+        return(records)
+
+    def get_hosts_active_flows(self, ifid, hosts, strategy = None, max_workers = 8, **filters):
+        """
+        Retrieve the active flows of many hosts, choosing between one request per host and
+        a single scan of the interface flows partitioned locally (see HostFlowsPlanner)
+
+        :param ifid: The interface ID
+        :type ifid: int
+        :param hosts: The hosts: IP addresses or (IP, VLAN) tuples
+        :type hosts: array
+        :param strategy: Force a strategy (fanout or scan) instead of planning
+        :type strategy: string
+        :param max_workers: The number of concurrent requests
+        :type max_workers: int
+        :return: The plan chosen (strategy, estimated costs, reason) and the flows of each host (plan, flows)
+        :rtype: object
+        """
+        return(HostFlowsPlanner(self, max_workers).get_flows(ifid, hosts, strategy, **filters))
 
     def get_active_l4_proto_flow_counters(self, ifid):
         """
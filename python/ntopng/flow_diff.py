@@ -0,0 +1,150 @@
+"""
+FlowDiff
+====================================
+The FlowSnapshotDiffer class compares consecutive snapshots of the active flows
+(e.g. polled every 30 seconds) and emits delta events:
+
+- added: the flow was not part of the previous snapshot
+- removed: the flow is no longer active
+- changed: the flow counters changed (with the bytes and packets deltas)
+
+Flows are identified by their 5-tuple (client and server IP and port, L4 protocol)
+plus VLAN. Only a compact index of the last snapshot is kept (a hash table mapping
+the key to first seen and counters, no flow dictionaries) so memory usage is
+proportional to the number of live flows. A flow returned twice by the same
+snapshot (e.g. moved to another page during the walk) is counted once, using its
+most recent record.
+"""
+
+FLOW_ADDED   = "added"
+FLOW_REMOVED = "removed"
+FLOW_CHANGED = "changed"
+
+def get_flow_key(flow):
+    """
+    Return the key of an active flow: client IP and port, server IP and port, L4 protocol, VLAN
+
+    :param flow: The active flow (as returned by Flow.get_active_flows_paginated)
+    :type flow: object
+    :return: The flow key
+    :rtype: tuple
+    """
+    client = flow.get("client") or {}
+    server = flow.get("server") or {}
+
+    return((client.get("ip"), client.get("port"), server.get("ip"), server.get("port"),
+            (flow.get("protocol") or {}).get("l4"), flow.get("vlan")))
+
+def get_flow_age(flow):
+    return((flow.get("last_seen") or 0, int(flow.get("bytes") or 0), flow.get("packets") or 0))
+
+class FlowEvent:
+    """
+    FlowEvent describes the change of a flow between two snapshots
+
+    :param type: The event type (added, removed, changed)
+    :param key: The flow key (see get_flow_key)
+    :param flow: The flow (None for removed flows)
+    :param bytes_delta: The bytes exchanged since the previous snapshot
+    :param packets_delta: The packets exchanged since the previous snapshot (None if packets are not available)
+    """
+    __slots__ = ("type", "key", "flow", "bytes_delta", "packets_delta")
+
+    def __init__(self, type, key, flow, bytes_delta, packets_delta):
+        self.type          = type
+        self.key           = key
+        self.flow          = flow
+        self.bytes_delta   = bytes_delta
+        self.packets_delta = packets_delta
+
+    def __repr__(self):
+        return("FlowEvent(" + self.type + ", " + str(self.key) + ", bytes_delta=" + str(self.bytes_delta)
+               + ", packets_delta=" + str(self.packets_delta) + ")")
+
+class FlowSnapshotDiffer:
+    """
+    FlowSnapshotDiffer computes the delta events between consecutive active flow snapshots
+    """
+    def __init__(self, emit_initial = True):
+        """
+        Construct a new FlowSnapshotDiffer object
+
+        :param emit_initial: Emit an added event for every flow of the first snapshot
+        :type emit_initial: boolean
+        """
+        self.emit_initial = emit_initial
+        self.index        = None # key -> (first_seen, bytes, packets)
+        self.stats        = { "snapshots": 0, "flows": 0, "added": 0, "removed": 0, "changed": 0 }
+
+    def update(self, flows):
+        """
+        Compare a new snapshot with the previous one
+
+        :param flows: The active flows of the snapshot (any iterable, e.g. Flow.iter_active_flows)
+        :type flows: array
+        :return: The delta events
+        :rtype: array
+        """
+        previous = self.index
+        latest   = {}
+        events   = []
+        emit     = (previous is not None) or self.emit_initial
+
+        # The paged walk can return a flow twice (flows move between pages while
+        # the walk runs): keep the most recent record of each key
+        for flow in flows:
+            key  = get_flow_key(flow)
+            seen = latest.get(key)
+
+            if((seen is None) or (get_flow_age(flow) >= get_flow_age(seen))):
+                latest[key] = flow
+
+        current = {}
+
+        for key, flow in latest.items():
+            bytes      = int(flow.get("bytes") or 0)
+            packets    = flow.get("packets")
+            first_seen = flow.get("first_seen")
+            old        = previous.pop(key, None) if (previous is not None) else None
+
+            if((old is not None) and ((old[0] != first_seen) or (bytes < old[1]))):
+                # Same 5-tuple but a different flow (e.g. the port was reused)
+                events.append(FlowEvent(FLOW_REMOVED, key, None, 0, 0 if (old[2] is not None) else None))
+                old = None
+
+            current[key] = (first_seen, bytes, packets)
+
+            if(old is None):
+                if(emit):
+                    events.append(FlowEvent(FLOW_ADDED, key, flow, bytes, packets))
+            elif((bytes != old[1]) or (packets != old[2])):
+                packets_delta = (packets - old[2]) if ((packets is not None) and (old[2] is not None)) else None
+                events.append(FlowEvent(FLOW_CHANGED, key, flow, bytes - old[1], packets_delta))
+
+        if(previous is not None):
+            for key, (first_seen, bytes, packets) in previous.items():
+                events.append(FlowEvent(FLOW_REMOVED, key, None, 0, 0 if (packets is not None) else None))
+
+        self.index = current
+        self.stats["snapshots"] += 1
+        self.stats["flows"] = len(current)
+
+        for event in events:
+            self.stats[event.type] += 1
+
+        return(events)
+
+    def reset(self):
+        """
+        Forget the previous snapshot
+        """
+        self.index = None
+
+    def get_stats(self):
+        """
+        Return statistics (snapshots compared, live flows, events emitted by type)
+
+        :return: The differ statistics
+        :rtype: object
+        """
+        return(dict(self.stats))
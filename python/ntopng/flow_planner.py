@@ -0,0 +1,191 @@
+"""
+FlowPlanner
+====================================
+The HostFlowsPlanner class retrieves the active flows of a set of hosts choosing the
+cheapest of two strategies:
+
+- fanout: one (paginated) flow/active.lua request per host, run concurrently
+- scan: a single walk of all the interface flows, partitioned locally by host
+
+ntopng walks (and sorts) all the interface flows for every request, whatever the host
+filter, so the cost of a request grows with the number of flows of the interface. The
+planner estimates both strategies from the interface flow and host counts (see
+Interface.get_data) and the number of requested hosts:
+
+- fanout: hosts x (request latency + flows x walk cost) + flows of the hosts x transfer cost
+- scan: pages x (request latency + flows x walk cost) + flows x transfer cost
+
+where the flows of the hosts are estimated from the average number of flows per
+host. The costs per request and per flow can be tuned to the deployment. The plan
+chosen, the estimates and the reason are returned with the flows.
+"""
+
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .interface import Interface
+
+class HostFlowsPlanner:
+    """
+    HostFlowsPlanner retrieves the active flows of many hosts with per-host requests or a single scan
+
+    :param flow: The Flow handle
+    """
+    def __init__(self, flow, max_workers = 8, per_page = 1000, scan_per_page = 5000, request_latency = 0.02, walk_cost = 2e-07, transfer_cost = 2e-05):
+        """
+        Construct a new HostFlowsPlanner object
+
+        :param flow: The Flow handle
+        :type flow: Flow
+        :param max_workers: The number of concurrent requests (fanout) or prefetched pages (scan)
+        :type max_workers: int
+        :param per_page: The number of results per page of the per-host requests
+        :type per_page: int
+        :param scan_per_page: The initial number of results per page of the scan
+        :type scan_per_page: int
+        :param request_latency: The fixed cost (seconds) of a request
+        :type request_latency: float
+        :param walk_cost: The cost (seconds) of walking one interface flow in ntopng, for every request
+        :type walk_cost: float
+        :param transfer_cost: The cost (seconds) of returning one flow (serialization, transfer, decoding)
+        :type transfer_cost: float
+        """
+        self.flow            = flow
+        self.interface       = Interface(flow.ntopng_obj)
+        self.max_workers     = max(max_workers, 1)
+        self.per_page        = per_page
+        self.scan_per_page   = scan_per_page
+        self.request_latency = request_latency
+        self.walk_cost       = walk_cost
+        self.transfer_cost   = transfer_cost
+        self.stats           = { "fanout": 0, "scan": 0, "last_plan": None }
+
+    def plan(self, ifid, hosts, num_flows = None, num_hosts = None):
+        """
+        Choose the strategy to retrieve the flows of the specified hosts
+
+        :param ifid: The interface ID
+        :type ifid: int
+        :param hosts: The hosts: IP addresses or (IP, VLAN) tuples
+        :type hosts: array
+        :param num_flows: The number of active flows of the interface (default: from Interface.get_data)
+        :type num_flows: int
+        :param num_hosts: The number of active hosts of the interface (default: from Interface.get_data)
+        :type num_hosts: int
+        :return: The plan: strategy (fanout or scan), estimated costs (seconds), number of requests and reason
+        :rtype: object
+        """
+        num_watched = len(set(hosts))
+
+        if((num_flows is None) or (num_hosts is None)):
+            data = self.interface.get_data(ifid) or {}
+            num_flows = data.get("num_flows") if (num_flows is None) else num_flows
+            num_hosts = data.get("num_hosts") if (num_hosts is None) else num_hosts
+
+        if(num_flows is None):
+            return({ "strategy": "fanout", "num_flows": None, "num_hosts": num_hosts, "watched_hosts": num_watched,
+                     "estimated_cost": None, "requests": None,
+                     "reason": "interface flow count not available: one request per host" })
+
+        num_flows = int(num_flows)
+        num_hosts = max(int(num_hosts or 0), num_watched, 1)
+
+        # Each flow has two hosts
+        flows_per_host = min(num_flows, 2.0 * num_flows / num_hosts)
+        walk           = self.request_latency + num_flows * self.walk_cost
+
+        fanout_requests = num_watched * max(1, math.ceil(flows_per_host / self.per_page))
+        fanout_cost     = (fanout_requests * walk + num_watched * flows_per_host * self.transfer_cost) / self.max_workers
+
+        scan_requests = max(1, math.ceil(num_flows / self.scan_per_page))
+        scan_cost     = (scan_requests * walk + num_flows * self.transfer_cost) / self.max_workers
+
+        strategy = "scan" if (scan_cost < fanout_cost) else "fanout"
+        reason   = ("%d per-host requests (~%.0f flows each) estimated %.2fs vs a single scan of %d flows (%d pages) estimated %.2fs"
+                    % (fanout_requests, flows_per_host, fanout_cost, num_flows, scan_requests, scan_cost))
+
+        if(strategy == "scan"):
+            reason = "scan: " + reason + ("; every request walks all the interface flows" if (fanout_requests * walk > num_flows * self.transfer_cost) else "")
+        else:
+            reason = "fanout: " + reason + "; the hosts are a small part of the interface traffic"
+
+        return({ "strategy": strategy, "num_flows": num_flows, "num_hosts": num_hosts, "watched_hosts": num_watched,
+                 "estimated_cost": { "fanout": fanout_cost, "scan": scan_cost },
+                 "requests": fanout_requests if (strategy == "fanout") else scan_requests, "reason": reason })
+
+    def fanout(self, ifid, hosts, filters):
+        def fetch(host):
+            ip, vlan = host if isinstance(host, tuple) else (host, None)
+
+            return(list(self.flow.iter_active_flows(ifid, ip, vlan, self.per_page, prefetch = 1, adaptive = False, **filters)))
+
+        with ThreadPoolExecutor(max_workers = self.max_workers) as executor:
+            return(dict(zip(hosts, executor.map(fetch, hosts))))
+
+    def scan(self, ifid, hosts, filters):
+        flows   = { host: [] for host in hosts }
+        watched = {}
+
+        for host in hosts:
+            ip, vlan = host if isinstance(host, tuple) else (host, None)
+            watched.setdefault(ip, []).append((host, vlan))
+
+        for page in self.flow.iter_active_flows_pages(ifid, per_page = self.scan_per_page, prefetch = self.max_workers, **filters):
+            for flow in page:
+                cli_ip = (flow.get("client") or {}).get("ip")
+                srv_ip = (flow.get("server") or {}).get("ip")
+
+                for ip in ((cli_ip,) if (cli_ip == srv_ip) else (cli_ip, srv_ip)):
+                    for host, vlan in watched.get(ip, ()):
+                        if((vlan is None) or (str(vlan) == str(flow.get("vlan")))):
+                            flows[host].append(flow)
+
+        return(flows)
+
+    def get_flows(self, ifid, hosts, strategy = None, **filters):
+        """
+        Retrieve the active flows of the specified hosts (flows where the host is client or server)
+
+        :param ifid: The interface ID
+        :type ifid: int
+        :param hosts: The hosts: IP addresses or (IP, VLAN) tuples
+        :type hosts: array
+        :param strategy: Force a strategy (fanout or scan) instead of planning
+        :type strategy: string
+        :return: The plan (see plan, with the elapsed time) and the flows of each host (plan, flows)
+        :rtype: object
+        """
+        hosts = list(dict.fromkeys(hosts))
+
+        if(("host" in filters) or ("vlan" in filters)):
+            raise ValueError("Hosts are specified with the hosts parameter")
+
+        if(strategy is None):
+            plan = self.plan(ifid, hosts)
+        elif(strategy in ("fanout", "scan")):
+            plan = { "strategy": strategy, "watched_hosts": len(hosts), "reason": strategy + ": forced" }
+        else:
+            raise ValueError("Unknown strategy '" + str(strategy) + "'")
+
+        start = time.perf_counter()
+
+        if(plan["strategy"] == "scan"):
+            flows = self.scan(ifid, hosts, filters)
+        else:
+            flows = self.fanout(ifid, hosts, filters)
+
+        plan["elapsed"] = time.perf_counter() - start
+        self.stats[plan["strategy"]] += 1
+        self.stats["last_plan"] = plan
+
+        return({ "plan": plan, "flows": flows })
+
+    def get_stats(self):
+        """
+        Return statistics (number of fanout and scan executions, last plan)
+
+        :return: The planner statistics
+        :rtype: object
+        """
+        return(dict(self.stats))
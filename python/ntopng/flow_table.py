@@ -0,0 +1,567 @@
+"""
+FlowTable
+====================================
+The FlowTable class stores active flows column by column in NumPy arrays, for
+vectorized filtering, grouping and top-N queries over large flow lists:
+
+- IP addresses are packed as uint32 (IPv4 only) or 16-byte values (IPv6, with IPv4
+  stored as IPv4-mapped addresses)
+- strings such as L4/L7 protocols are dictionary encoded as small integers
+- ports and VLANs are uint16, byte and packet counters uint64
+
+Pages are converted as they are received (see FlowTableBuilder), so the flow
+dictionaries are never held all together. The columns read from each flow are
+configurable: a column is described by its name, the (dotted) path of the field in
+the flow and its kind (ip, code, uint16, uint64, int64, float64).
+
+NumPy is an optional dependency of this package (pip3 install numpy).
+"""
+
+import socket
+import ipaddress
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+def require_numpy():
+    if(np is None):
+        raise ImportError("NumPy is required for the columnar flow table (pip3 install numpy)")
+
+# (name, path, kind) of the columns read from the active flows
+DEFAULT_FLOW_COLUMNS = [ ("first_seen", "first_seen", "int64"),
+                         ("last_seen", "last_seen", "int64"),
+                         ("cli_ip", "client.ip", "ip"),
+                         ("cli_port", "client.port", "uint16"),
+                         ("srv_ip", "server.ip", "ip"),
+                         ("srv_port", "server.port", "uint16"),
+                         ("vlan", "vlan", "uint16"),
+                         ("l4_proto", "protocol.l4", "code"),
+                         ("l7_proto", "protocol.l7", "code"),
+                         ("duration", "duration", "int64"),
+                         ("bytes", "bytes", "uint64"),
+                         ("packets", "packets", "uint64"),
+                         ("bps", "thpt.bps", "float64") ]
+
+IPV4_MAPPED_PREFIX = b"\x00" * 10 + b"\xff\xff"
+
+def get_path_values(rows, path):
+    keys = path.split(".")
+
+    if(len(keys) == 1):
+        return([ row.get(keys[0]) for row in rows ])
+    elif(len(keys) == 2):
+        return([ (row.get(keys[0]) or {}).get(keys[1]) for row in rows ])
+
+    values = []
+
+    for row in rows:
+        for key in keys:
+            row = (row or {}).get(key)
+
+        values.append(row)
+
+    return(values)
+
+def pack_ip16(ip):
+    if(not ip):
+        return(b"\x00" * 16)
+    elif(":" in ip):
+        return(socket.inet_pton(socket.AF_INET6, ip))
+
+    return(IPV4_MAPPED_PREFIX + socket.inet_pton(socket.AF_INET, ip))
+
+def pack_ips(values):
+    """
+    Pack IP addresses: uint32 array if all the addresses are IPv4, 16-byte (S16) array otherwise
+
+    :param values: The IP addresses (missing addresses are packed as 0.0.0.0)
+    :type values: array
+    :return: The packed addresses
+    :rtype: numpy.ndarray
+    """
+    try:
+        buf = b"".join([ socket.inet_pton(socket.AF_INET, v or "0.0.0.0") for v in values ])
+        return(np.frombuffer(buf, dtype = ">u4").astype(np.uint32))
+    except (OSError, TypeError):
+        return(np.frombuffer(b"".join([ pack_ip16(v) for v in values ]), dtype = "S16"))
+
+def ipv4_to_ip16(values):
+    raw = np.ascontiguousarray(values.astype(">u4")).view(np.uint8).reshape(-1, 4)
+    prefix = np.broadcast_to(np.frombuffer(IPV4_MAPPED_PREFIX, dtype = np.uint8), (len(values), 12))
+
+    return(np.ascontiguousarray(np.hstack([ prefix, raw ])).view("S16").ravel())
+
+def unpack_ip(value):
+    if(isinstance(value, bytes)):
+        value = value.ljust(16, b"\x00")
+
+        if(value.startswith(IPV4_MAPPED_PREFIX)):
+            return(socket.inet_ntop(socket.AF_INET, value[12:]))
+
+        return(socket.inet_ntop(socket.AF_INET6, value))
+
+    return(socket.inet_ntop(socket.AF_INET, int(value).to_bytes(4, "big")))
+
+def to_number(value):
+    if(value is None or value == ""):
+        return(0)
+    elif(isinstance(value, str)):
+        value = value.replace(",", "")
+
+        # Large counters are exact as int only
+        try:
+            return(int(value))
+        except ValueError:
+            return(float(value))
+
+    return(value)
+
+def get_code_dtype(size):
+    if(size <= 256):
+        return(np.uint8)
+    elif(size <= 65536):
+        return(np.uint16)
+
+    return(np.uint32)
+
+REDUCERS = { "sum": np.add, "min": np.minimum, "max": np.maximum } if (np is not None) else {}
+
+def dense_reduce(gid, values, size, how):
+    if(len(values) == 0):
+        return(np.zeros(size, dtype = values.dtype))
+    elif(how in ("min", "max")):
+        res = np.full(size, values.max() if (how == "min") else values.min(), dtype = values.dtype)
+        REDUCERS[how].at(res, gid, values)
+        return(res)
+    elif(values.dtype.kind != "u"):
+        return(np.bincount(gid, weights = values, minlength = size).astype(values.dtype))
+
+    # Integer sums are computed on the 32 bit halves to stay exact in float64 (up to 2^21 rows)
+    values = values.astype(np.uint64)
+    lo = np.bincount(gid, weights = (values & np.uint64(0xffffffff)).astype(np.float64), minlength = size)
+    hi = np.bincount(gid, weights = (values >> np.uint64(32)).astype(np.float64), minlength = size)
+
+    return((hi.astype(np.uint64) << np.uint64(32)) + lo.astype(np.uint64))
+
+class FlowTableBuilder:
+    """
+    FlowTableBuilder converts pages of active flows into columns and builds a FlowTable
+    """
+    def __init__(self, columns = None):
+        """
+        Construct a new FlowTableBuilder object
+
+        :param columns: The columns as (name, path, kind) tuples (default: DEFAULT_FLOW_COLUMNS)
+        :type columns: array
+        """
+        require_numpy()
+
+        self.columns = list(columns or DEFAULT_FLOW_COLUMNS)
+        self.chunks  = { name: [] for name, path, kind in self.columns }
+        self.vocabs  = { name: [] for name, path, kind in self.columns if (kind == "code") }
+        self.indexes = { name: {} for name in self.vocabs }
+        self.rows    = 0
+
+    def encode(self, name, values):
+        vocab = self.vocabs[name]
+        index = self.indexes[name]
+        codes = []
+
+        for value in values:
+            code = index.get(value)
+
+            if(code is None):
+                code = len(vocab)
+                index[value] = code
+                vocab.append(value)
+
+            codes.append(code)
+
+        return(np.array(codes, dtype = np.uint32))
+
+    def add(self, flows):
+        """
+        Convert and append a page of active flows
+
+        :param flows: The active flows (e.g. a page returned by Flow.iter_active_flows_pages)
+        :type flows: array
+        """
+        if(not flows):
+            return
+
+        for name, path, kind in self.columns:
+            values = get_path_values(flows, path)
+
+            if(kind == "ip"):
+                chunk = pack_ips(values)
+            elif(kind == "code"):
+                chunk = self.encode(name, values)
+            elif(kind in ("uint16", "uint64", "int64")):
+                chunk = np.array([ int(to_number(v)) for v in values ], dtype = kind)
+            elif(kind == "float64"):
+                chunk = np.array([ to_number(v) for v in values ], dtype = np.float64)
+            else:
+                raise ValueError("Unknown column kind '" + str(kind) + "'")
+
+            self.chunks[name].append(chunk)
+
+        self.rows += len(flows)
+
+    def build(self):
+        """
+        Build the table with the flows appended so far
+
+        :return: The flow table
+        :rtype: FlowTable
+        """
+        data  = {}
+        kinds = {}
+
+        for name, path, kind in self.columns:
+            chunks = self.chunks[name]
+
+            if(kind == "ip"):
+                if(any([ c.dtype.kind == "S" for c in chunks ])):
+                    chunks = [ c if (c.dtype.kind == "S") else ipv4_to_ip16(c) for c in chunks ]
+                    empty = np.zeros(0, dtype = "S16")
+                else:
+                    empty = np.zeros(0, dtype = np.uint32)
+            elif(kind == "code"):
+                empty = np.zeros(0, dtype = np.uint32)
+            else:
+                empty = np.zeros(0, dtype = kind)
+
+            column = np.concatenate(chunks) if chunks else empty
+
+            if(kind == "code"):
+                column = column.astype(get_code_dtype(len(self.vocabs[name])))
+
+            data[name]  = column
+            kinds[name] = kind
+
+        return(FlowTable(data, kinds, { name: list(vocab) for name, vocab in self.vocabs.items() }))
+
+class FlowTable:
+    """
+    FlowTable stores flows as typed NumPy columns
+
+    :param columns: The columns (name -> array)
+    :param kinds: The column kinds (name -> ip, code, uint16, uint64, int64, float64)
+    :param vocabs: The values of the dictionary encoded columns (name -> array)
+    """
+    def __init__(self, columns, kinds, vocabs = None):
+        require_numpy()
+
+        self.columns = dict(columns)
+        self.kinds   = dict(kinds)
+        self.vocabs  = dict(vocabs or {})
+
+    @classmethod
+    def from_flows(cls, flows, columns = None):
+        """
+        Build a FlowTable from a list of active flows
+
+        :param flows: The active flows (as returned by Flow.get_active_flows_paginated)
+        :type flows: array
+        :param columns: The columns as (name, path, kind) tuples (default: DEFAULT_FLOW_COLUMNS)
+        :type columns: array
+        :return: The flow table
+        :rtype: FlowTable
+        """
+        builder = FlowTableBuilder(columns)
+        builder.add(flows)
+
+        return(builder.build())
+
+    def __len__(self):
+        for column in self.columns.values():
+            return(len(column))
+
+        return(0)
+
+    def column(self, name):
+        """
+        Return a column
+
+        :param name: The column name (e.g. bytes)
+        :type name: string
+        :return: The column values (codes for dictionary encoded columns, packed addresses for IP columns)
+        :rtype: numpy.ndarray
+        """
+        return(self.columns[name])
+
+    def decode(self, name, value):
+        kind = self.kinds[name]
+
+        if(kind == "ip"):
+            return(unpack_ip(value))
+        elif(kind == "code"):
+            return(self.vocabs[name][int(value)])
+        elif(kind == "float64"):
+            return(float(value))
+
+        return(int(value))
+
+    def encode(self, name, value):
+        kind = self.kinds[name]
+
+        if(kind == "ip"):
+            if(self.columns[name].dtype.kind == "S"):
+                return(pack_ip16(value).rstrip(b"\x00"))
+            elif(":" in value):
+                return(None)
+
+            return(int.from_bytes(socket.inet_pton(socket.AF_INET, value), "big"))
+        elif(kind == "code"):
+            vocab = self.vocabs[name]
+            return(vocab.index(value) if (value in vocab) else None)
+
+        return(value)
+
+    def eq(self, name, value):
+        """
+        Return the mask of the flows whose column equals a (decoded) value,
+        e.g. eq("l7_proto", "TLS") or eq("cli_ip", "192.168.1.1")
+
+        :param name: The column name
+        :type name: string
+        :param value: The value
+        :type value: string
+        :return: The mask
+        :rtype: numpy.ndarray
+        """
+        encoded = self.encode(name, value)
+
+        if(encoded is None):
+            return(np.zeros(len(self), dtype = bool))
+
+        return(self.columns[name] == encoded)
+
+    def isin(self, name, values):
+        """
+        Return the mask of the flows whose column equals one of the (decoded) values
+
+        :param name: The column name
+        :type name: string
+        :param values: The values
+        :type values: array
+        :return: The mask
+        :rtype: numpy.ndarray
+        """
+        encoded = [ e for e in [ self.encode(name, v) for v in values ] if (e is not None) ]
+
+        return(np.isin(self.columns[name], np.array(encoded, dtype = self.columns[name].dtype)))
+
+    def in_network(self, name, cidr):
+        """
+        Return the mask of the flows whose IP column belongs to a network
+
+        :param name: The IP column name (e.g. cli_ip)
+        :type name: string
+        :param cidr: The network (e.g. 192.168.0.0/16)
+        :type cidr: string
+        :return: The mask
+        :rtype: numpy.ndarray
+        """
+        network = ipaddress.ip_network(cidr, strict = False)
+        column  = self.columns[name]
+
+        if(column.dtype.kind != "S"):
+            if(network.version != 4):
+                return(np.zeros(len(column), dtype = bool))
+
+            netmask = np.uint32(int(network.netmask))
+            return((column & netmask) == np.uint32(int(network.network_address)))
+
+        if(network.version == 4):
+            prefix = IPV4_MAPPED_PREFIX + network.network_address.packed
+            prefixlen = network.prefixlen + 96
+        else:
+            prefix = network.network_address.packed
+            prefixlen = network.prefixlen
+
+        raw  = column.view(np.uint8).reshape(-1, 16)
+        net  = np.frombuffer(prefix, dtype = np.uint8)
+        full = prefixlen // 8
+        mask = np.all(raw[:, :full] == net[:full], axis = 1)
+
+        if(prefixlen % 8):
+            bits = np.uint8((0xff << (8 - (prefixlen % 8))) & 0xff)
+            mask &= (raw[:, full] & bits) == (net[full] & bits)
+
+        return(mask)
+
+    def take(self, indexes):
+        """
+        Return a table with the selected flows
+
+        :param indexes: The flow indexes or a boolean mask (e.g. table.eq("l4_proto", "UDP"))
+        :type indexes: numpy.ndarray
+        :return: The selected flows
+        :rtype: FlowTable
+        """
+        return(FlowTable({ name: column[indexes] for name, column in self.columns.items() }, self.kinds, self.vocabs))
+
+    def filter(self, mask):
+        """
+        Return a table with the flows matching a mask
+
+        :param mask: The mask (combine masks with &, | and ~)
+        :type mask: numpy.ndarray
+        :return: The matching flows
+        :rtype: FlowTable
+        """
+        return(self.take(np.asarray(mask, dtype = bool)))
+
+    def top(self, n, by = "bytes", ascending = False):
+        """
+        Return the top-N flows (or groups, on a table returned by group_by)
+
+        :param n: The number of rows
+        :type n: int
+        :param by: The column to sort by
+        :type by: string
+        :param ascending: Return the lowest values instead of the highest
+        :type ascending: boolean
+        :return: The top rows, sorted
+        :rtype: FlowTable
+        """
+        values = self.columns[by]
+        n = min(n, len(values))
+
+        if(n <= 0):
+            return(self.take(np.zeros(0, dtype = np.int64)))
+
+        keys = values.astype(np.float64) if (values.dtype.kind == "u") else values
+
+        if(not ascending):
+            keys = -keys
+
+        if(n < len(values)):
+            idx = np.argpartition(keys, n - 1)[:n]
+        else:
+            idx = np.arange(len(values))
+
+        return(self.take(idx[np.argsort(keys[idx], kind = "stable")]))
+
+    def group_by(self, keys, aggregates = None):
+        """
+        Group the flows by one or more columns, e.g. group_by(["l7_proto"]) or
+        group_by(["cli_ip", "srv_ip"], { "bytes": ("bytes", "sum"), "max_bps": ("bps", "max") })
+
+        :param keys: The columns to group by
+        :type keys: array
+        :param aggregates: The aggregated columns: name -> (column, function) with function sum, min, max or mean (default: bytes sum)
+        :type aggregates: object
+        :return: A table with the key columns, the aggregated columns and the number of flows (count) per group
+        :rtype: FlowTable
+        """
+        if(isinstance(keys, str)):
+            keys = [ keys ]
+
+        aggregates = aggregates or { "bytes": ("bytes", "sum") }
+        num = len(self)
+        gid = np.zeros(num, dtype = np.int64)
+        radix = 1
+
+        for key in keys:
+            inverse, size = self.factorize(key)
+
+            if((radix * size) >= (1 << 62)):
+                # Keep group ids small
+                uniques, gid = np.unique(gid, return_inverse = True)
+                radix = max(len(uniques), 1)
+
+            gid   = gid * size + inverse
+            radix = radix * size
+
+        if((radix <= max(num, 1 << 16)) and (num < (1 << 21))):
+            # Small group id space: dense aggregation, no sort
+            counts = np.bincount(gid, minlength = radix)
+            groups = np.flatnonzero(counts)
+            first  = np.zeros(radix, dtype = np.int64)
+            first[gid] = np.arange(num, dtype = np.int64) # any row of a group has the same keys
+            first  = first[groups]
+            counts = counts[groups]
+            reduce = lambda values, how: dense_reduce(gid, values, radix, how)[groups]
+        else:
+            order  = np.argsort(gid, kind = "stable")
+            sgid   = gid[order]
+            starts = np.flatnonzero(np.concatenate(([ True ], sgid[1:] != sgid[:-1]))) if num else np.zeros(0, dtype = np.int64)
+            first  = order[starts]
+            counts = np.diff(np.concatenate((starts, [ num ])))
+            reduce = lambda values, how: REDUCERS[how].reduceat(values[order], starts) if num else np.zeros(0, dtype = values.dtype)
+
+        columns = { key: self.columns[key][first] for key in keys }
+        kinds   = { key: self.kinds[key] for key in keys }
+
+        for name, (column, how) in aggregates.items():
+            if(how not in ("sum", "mean", "min", "max")):
+                raise ValueError("Unknown aggregation '" + str(how) + "'")
+
+            values = self.columns[column]
+
+            if((how in ("sum", "mean")) and (values.dtype.kind == "u")):
+                values = values.astype(np.uint64)
+
+            res = reduce(values, "sum" if (how == "mean") else how)
+
+            if(how == "mean"):
+                res = res / counts
+
+            columns[name] = res
+            kinds[name]   = "float64" if (res.dtype.kind == "f") else ("int64" if (res.dtype.kind == "i") else "uint64")
+
+        columns["count"] = counts.astype(np.int64)
+        kinds["count"]   = "int64"
+
+        return(FlowTable(columns, kinds, { key: self.vocabs[key] for key in keys if (key in self.vocabs) }))
+
+    def factorize(self, key):
+        # Map the column values to dense integers: return (inverse, number of distinct values)
+        column = self.columns[key]
+
+        if(self.kinds[key] == "code"):
+            return(column.astype(np.int64), max(len(self.vocabs[key]), 1))
+        elif(column.dtype == np.uint16):
+            return(column.astype(np.int64), 65536)
+        elif(column.dtype.kind == "S"):
+            # Factorize the two 64 bit halves instead of sorting 16-byte strings
+            halves = np.ascontiguousarray(column).view(np.uint64).reshape(-1, 2)
+            lo_uniques, inverse = np.unique(halves[:, 1], return_inverse = True)
+
+            if(len(column) and np.all(halves[:, 0] == halves[0, 0])):
+                # e.g. IPv4 only (mapped) addresses
+                return(inverse, max(len(lo_uniques), 1))
+
+            hi_uniques, hi = np.unique(halves[:, 0], return_inverse = True)
+            return(hi * len(lo_uniques) + inverse, max(len(hi_uniques) * len(lo_uniques), 1))
+
+        uniques, inverse = np.unique(column, return_inverse = True)
+        return(inverse, max(len(uniques), 1))
+
+    def to_dicts(self, limit = None):
+        """
+        Return the rows as dictionaries with decoded values (IP addresses and protocol names)
+
+        :param limit: The max number of rows (None for all)
+        :type limit: int
+        :return: The rows
+        :rtype: array
+        """
+        num = len(self) if (limit is None) else min(limit, len(self))
+        names = list(self.columns.keys())
+        cols = [ [ self.decode(name, v) for v in self.columns[name][:num].tolist() ] for name in names ]
+
+        return([ dict(zip(names, row)) for row in zip(*cols) ])
+
+    def get_memory_usage(self):
+        """
+        Return the memory used by the columns (bytes)
+
+        :return: The memory usage
+        :rtype: int
+        """
+        return(sum([ column.nbytes for column in self.columns.values() ]))
@@ -6,6 +6,24 @@ REST API (https://www.ntop.org/guides/ntopng/api/rest/api_v2.html).
 """
 
 import time
+from concurrent.futures import ThreadPoolExecutor
+from .time_slicer import TimeSlicedQuery, merge_sorted, sort_rows
+from .pagination import iter_keyset_pages, check_select_clause
+from .historical_cache import HistoricalCache
+from .ntopng import get_identity
+from .timeseries import TimeseriesResult
+from .timeseries_bulk import BulkTimeseriesFetcher
+from .timeseries_tail import TimeseriesTail
+from .alert_follower import AlertFollower
+from .topk import SlicedTopK
+from .profiler import QueryProfiler
+from .export import export_flows
+from .replica import FlowReplica
+from .rollup import FlowRollups
+from .records import get_historical_flow_records
+
+# Alert families accepted by the alert list endpoint
+ALERT_FAMILIES = [ "active_monitoring", "flow", "host", "interface", "mac", "network", "snmp", "system", "user" ]
 
 class Historical:
     """
@@ -22,6 +40,69 @@ class Historical:
         self.ntopng_obj      = ntopng_obj
         self.rest_v2_url     = "/lua/rest/v2"
         self.rest_pro_v2_url = "/lua/pro/rest/v2"
+        self.cache           = None
+        self.profiler        = None
+
+    def enable_cache(self, cache = None):
+        """
+        Cache the results of flow, alert, alert counter and timeseries queries. Results of
+        time windows in the past are stored on disk, the others are kept for a short TTL.
+        
+        :param cache: The cache to use (default: a HistoricalCache with default settings)
+        :type cache: HistoricalCache
+        :return: The cache in use
+        :rtype: HistoricalCache
+        """
+        if(cache is None):
+            cache = HistoricalCache()
+
+        self.cache = cache
+        return(self.cache)
+
+    def disable_cache(self):
+        self.cache = None
+
+    def enable_profiling(self, profiler = None):
+        """
+        Profile the flow, alert, alert counter, Top-K and timeseries queries: time to first byte,
+        transfer and decode time, bytes, rows and clauses of each query (cache hits are not profiled)
+        
+        :param profiler: The profiler to use (default: a new QueryProfiler)
+        :type profiler: QueryProfiler
+        :return: The profiler in use (use get_records() or get_slowest_shapes() to read the profiles)
+        :rtype: QueryProfiler
+        """
+        if(profiler is None):
+            profiler = QueryProfiler()
+
+        self.profiler = profiler
+        return(self.profiler)
+
+    def disable_profiling(self):
+        self.profiler = None
+
+    # internal method used to issue queries (profiled if enabled)
+    def issue_query(self, method, url, params):
+        if(self.profiler is not None):
+            return(self.profiler.run(self.ntopng_obj, method, url, params))
+        elif(method == "POST"):
+            return(self.ntopng_obj.post_request(url, params))
+
+        return(self.ntopng_obj.request(url, params))
+
+    # internal method used to issue queries over a time window (cached if enabled)
+    def query(self, url, params, epoch_end):
+        if(self.cache is None):
+            return(self.issue_query("GET", url, params))
+
+        return(self.cache.get("GET " + get_identity(self.ntopng_obj) + " " + url, params, epoch_end, lambda: self.issue_query("GET", url, params)))
+
+    # internal method used to issue queries over a time window (cached if enabled)
+    def post_query(self, url, params, epoch_end):
+        if(self.cache is None):
+            return(self.issue_query("POST", url, params))
+
+        return(self.cache.get("POST " + get_identity(self.ntopng_obj) + " " + url, params, epoch_end, lambda: self.issue_query("POST", url, params)))
 
     def get_alert_type_counters(self, ifid, epoch_begin, epoch_end):
         """
@@ -36,7 +117,7 @@ class Historical:
         :return: Statistics
         :rtype: object
         """
-        return(self.ntopng_obj.request(self.rest_v2_url + "/get/alert/type/counters.lua", { "ifid": ifid, "status": "historical", "epoch_begin": epoch_begin, "epoch_end": epoch_end }))
+        return(self.query(self.rest_v2_url + "/get/alert/type/counters.lua", { "ifid": ifid, "status": "historical", "epoch_begin": epoch_begin, "epoch_end": epoch_end }, epoch_end))
 
     def get_alert_severity_counters(self, ifid, epoch_begin, epoch_end):
         """
@@ -78,9 +159,73 @@ class Historical:
         :return: Query result
         :rtype: object
         """
-        return(self.ntopng_obj.request(self.rest_v2_url + "/get/alert/list/alerts.lua", { "ifid": ifid, "alert_family": alert_family, "epoch_begin": epoch_begin, "epoch_end": epoch_end,
-                                                                                          "select_clause": select_clause, "where_clause": where_clause,
-                                                                                          "maxhits_clause": maxhits, "group_by_clause": group_by, "order_by_clause": order_by }))
+        return(self.query(self.rest_v2_url + "/get/alert/list/alerts.lua", { "ifid": ifid, "alert_family": alert_family, "epoch_begin": epoch_begin, "epoch_end": epoch_end,
+                                                                             "select_clause": select_clause, "where_clause": where_clause,
+                                                                             "maxhits_clause": maxhits, "group_by_clause": group_by, "order_by_clause": order_by,
+                                                                             "group_by": group_by or None, "order_by": order_by or None }, epoch_end))
+
+    def iter_alerts_pages(self, alert_family, ifid, epoch_begin, epoch_end, select_clause, where_clause, page_size = 1000, order_by = "tstamp, rowid", after = None):
+        """
+        Run queries on the alert database returning all the matching alerts page by page.
+        Pages are retrieved with keyset pagination: each page selects the alerts following
+        the last alert of the previous page in the (unique) order_by order.
+        
+        :param alert_family: The alert family (flow, host, interface, etc)
+        :type alert_family: string
+        :param ifid: The interface ID
+        :type ifid: int
+        :param epoch_begin: Start of the time interval (epoch)
+        :type epoch_begin: int
+        :param epoch_end: End of the time interval (epoch)
+        :type epoch_end: int
+        :param select_clause: Select clause (SQL syntax), must include the order_by columns
+        :type select_clause: string
+        :param where_clause: Where clause (SQL syntax)
+        :type where_clause: string
+        :param page_size: The number of alerts per page
+        :type page_size: int
+        :param order_by: Unique order by condition (SQL syntax)
+        :type order_by: string
+        :param after: Resume after this alert (e.g. the last alert of a previous run)
+        :type after: object
+        :return: Pages (lists) of alerts
+        :rtype: generator
+        """
+        check_select_clause(select_clause, order_by)
+
+        def fetch(clause, maxhits, order):
+            return(self.get_alerts(alert_family, ifid, epoch_begin, epoch_end, select_clause, clause, maxhits, None, order))
+
+        return(iter_keyset_pages(fetch, where_clause, order_by, page_size, after))
+
+    def get_alert_follower(self, ifid, families = None, select_clause = "*", where_clause = None, state_file = None, start = None, page_size = 1000, overlap = 60):
+        """
+        Return an AlertFollower reading each new alert once: a watermark (the newest alert read)
+        is kept per family and each poll reads again the overlap window before it, skipping the
+        alerts already read, so alerts stored late are not missed (see the alert_follower module).
+        Watermarks are saved to state_file (if set), so a restarted follower does not read
+        alerts again. Use follow() to get a generator of alerts polled with an adaptive interval.
+        
+        :param ifid: The interface ID
+        :type ifid: int
+        :param families: The alert families to follow (default: all)
+        :type families: array
+        :param select_clause: Select clause (SQL syntax), must include tstamp and rowid
+        :type select_clause: string
+        :param where_clause: Where clause (SQL syntax) selecting the alerts to follow (None to follow all the alerts)
+        :type where_clause: string
+        :param state_file: The file where watermarks are saved
+        :type state_file: string
+        :param start: Read alerts starting from this epoch when no watermark is available (default: now)
+        :type start: int
+        :param page_size: Max number of alerts read per family and poll
+        :type page_size: int
+        :param overlap: The window (seconds) before the watermark read again at each poll
+        :type overlap: int
+        :return: The alert follower
+        :rtype: AlertFollower
+        """
+        return(AlertFollower(self, ifid, families, select_clause, where_clause, state_file, start, page_size, overlap = overlap))
 
     def get_flow_alerts(self, ifid, epoch_begin, epoch_end, select_clause, where_clause, maxhits, group_by, order_by):
         """
@@ -307,9 +452,59 @@ class Historical:
         """
         return(self.get_alerts("user", ifid, epoch_begin, epoch_end, select_clause, where_clause, maxhits, group_by, order_by))
 
-    def get_timeseries(self, ts_schema, ts_query, epoch_begin, epoch_end):
+    def get_all_alerts(self, ifid, epoch_begin, epoch_end, select_clause, where_clause, maxhits, order_by = "tstamp DESC", families = None, skip_errors = False):
         """
-        Return timeseries for a specified schema and query
+        Return the alerts of all the families as a single list ordered by order_by (default: most recent first).
+        Families are queried concurrently, so the cost is about the latency of the slowest family.
+        Each alert is tagged with its family (alert_family). maxhits applies to each family before
+        the merge: the rows of each family are sorted again locally, as ntopng versions not accepting
+        the order_by parameter return maxhits rows in no particular order.
+        
+        :param ifid: The interface ID
+        :type ifid: int
+        :param epoch_begin: Start of the time interval (epoch)
+        :type epoch_begin: int
+        :param epoch_end: End of the time interval (epoch)
+        :type epoch_end: int
+        :param select_clause: Select clause (SQL syntax), must include the order_by columns
+        :type select_clause: string
+        :param where_clause: Where clause (SQL syntax), applied to all the families
+        :type where_clause: string
+        :param maxhits: Max number of results (limit)
+        :type maxhits: int
+        :param order_by: Order by condition (SQL syntax)
+        :type order_by: string
+        :param families: The alert families to query (default: all)
+        :type families: array
+        :param skip_errors: Skip the families whose query fails (e.g. not available) instead of raising an error
+        :type skip_errors: boolean
+        :return: Query result
+        :rtype: array
+        """
+        families = list(families or ALERT_FAMILIES)
+        results  = []
+
+        with ThreadPoolExecutor(max_workers = len(families)) as executor:
+            futures = [ (family, executor.submit(self.get_alerts, family, ifid, epoch_begin, epoch_end, select_clause,
+                                                 where_clause, maxhits, None, order_by)) for family in families ]
+
+            for family, future in futures:
+                try:
+                    rows = future.result() or []
+                except Exception:
+                    if(skip_errors):
+                        continue
+                    raise
+
+                # Rows may be shared with the cache: tag copies
+                results.append(sort_rows([ dict(row, alert_family = family) for row in rows ], order_by))
+
+        return(merge_sorted(results, order_by, maxhits))
+
+    def get_timeseries(self, ts_schema, ts_query, epoch_begin, epoch_end, limit = None, ts_aggregation = None, no_fill = False, initial_point = False, ts_compare = None, extended = False):
+        """
+        Return timeseries for a specified schema and query. The optional parameters are
+        sent only when set, leaving the server defaults untouched otherwise.
         
         :param ts_schema: The timeseries schema
         :type ts_schema: string
@@ -319,10 +514,37 @@ class Historical:
         :type epoch_begin: int
         :param epoch_end: End of the time interval (epoch)
         :type epoch_end: int
+        :param limit: Max number of points, the series is downsampled by the server (server default: 60)
+        :type limit: int
+        :param ts_aggregation: The data aggregation to read (raw, 1h, 1d)
+        :type ts_aggregation: string
+        :param no_fill: Return missing points as NaN instead of filling them
+        :type no_fill: boolean
+        :param initial_point: Include the point preceding epoch_begin
+        :type initial_point: boolean
+        :param ts_compare: Add the total of a past period for comparison (e.g. 1d, 1w)
+        :type ts_compare: string
+        :param extended: Return the points as epoch: value
+        :type extended: boolean
         :return: Timeseries data
         :rtype: object
         """
-        return(self.ntopng_obj.post_request(self.rest_v2_url + "/get/timeseries/ts.lua", { "ts_schema": ts_schema, "ts_query": ts_query, "epoch_begin": epoch_begin, "epoch_end": epoch_end }))
+        params = { "ts_schema": ts_schema, "ts_query": ts_query, "epoch_begin": epoch_begin, "epoch_end": epoch_end }
+
+        if(limit is not None):
+            params["limit"] = int(limit)
+        if(ts_aggregation):
+            params["ts_aggregation"] = ts_aggregation
+        if(no_fill):
+            params["no_fill"] = 1
+        if(initial_point):
+            params["initial_point"] = "true"
+        if(ts_compare):
+            params["ts_compare"] = ts_compare
+        if(extended):
+            params["extended"] = 1
+
+        return(self.post_query(self.rest_v2_url + "/get/timeseries/ts.lua", params, epoch_end))
 
     def get_timeseries_metadata(self):
         """
@@ -369,6 +591,155 @@ class Historical:
         """
         return(self.get_timeseries(ts_schema, "ifid:"+str(ifid), epoch_begin, epoch_end))
 
+    def get_timeseries_array(self, ts_schema, ts_query, epoch_begin, epoch_end):
+        """
+        Return timeseries for a specified schema and query as NumPy arrays (requires numpy)
+        
+        :param ts_schema: The timeseries schema
+        :type ts_schema: string
+        :param ts_query: The timeseries query (e.g. 'ifid:0,host:10.0.0.1')
+        :type ts_query: string
+        :param epoch_begin: Start of the time interval (epoch)
+        :type epoch_begin: int
+        :param epoch_end: End of the time interval (epoch)
+        :type epoch_end: int
+        :return: Timeseries data (timestamps vector and values matrix, one column per metric)
+        :rtype: TimeseriesResult
+        """
+        return(TimeseriesResult.from_rsp(self.get_timeseries(ts_schema, ts_query, epoch_begin, epoch_end), ts_schema, ts_query))
+
+    def get_host_timeseries_array(self, ifid, host_ip, ts_schema, epoch_begin, epoch_end):
+        """
+        Return timeseries data for a specified interface and host as NumPy arrays (requires numpy)
+        
+        :param ifid: The interface ID
+        :type ifid: int
+        :param host_ip: The host IP
+        :type host: string
+        :param ts_schema: The timeseries schema
+        :type ts_schema: string
+        :param epoch_begin: Start of the time interval (epoch)
+        :type epoch_begin: int
+        :param epoch_end: End of the time interval (epoch)
+        :type epoch_end: int
+        :return: Timeseries data
+        :rtype: TimeseriesResult
+        """
+        return(self.get_timeseries_array(ts_schema, "ifid:"+str(ifid)+",host:"+host_ip, epoch_begin, epoch_end))
+
+    def get_interface_timeseries_array(self, ifid, ts_schema, epoch_begin, epoch_end):
+        """
+        Return timeseries data for a specified interface as NumPy arrays (requires numpy)
+        
+        :param ifid: The interface ID
+        :type ifid: int
+        :param ts_schema: The timeseries schema
+        :type ts_schema: string
+        :param epoch_begin: Start of the time interval (epoch)
+        :type epoch_begin: int
+        :param epoch_end: End of the time interval (epoch)
+        :type epoch_end: int
+        :return: Timeseries data
+        :rtype: TimeseriesResult
+        """
+        return(self.get_timeseries_array(ts_schema, "ifid:"+str(ifid), epoch_begin, epoch_end))
+
+    def get_timeseries_downsampled(self, ts_schema, ts_query, epoch_begin, epoch_end, max_points, ts_aggregation = None, metric = None):
+        """
+        Return timeseries reduced to at most max_points points (requires numpy). The series
+        is first downsampled by the server (limit, ts_aggregation) so that only max_points
+        points are transferred, then the largest-triangle-three-buckets (LTTB) algorithm is
+        applied in case the server returned more points.
+        
+        :param ts_schema: The timeseries schema
+        :type ts_schema: string
+        :param ts_query: The timeseries query (e.g. 'ifid:0,host:10.0.0.1')
+        :type ts_query: string
+        :param epoch_begin: Start of the time interval (epoch)
+        :type epoch_begin: int
+        :param epoch_end: End of the time interval (epoch)
+        :type epoch_end: int
+        :param max_points: The max number of points
+        :type max_points: int
+        :param ts_aggregation: The data aggregation to read (raw, 1h, 1d)
+        :type ts_aggregation: string
+        :param metric: The metric driving the LTTB point selection (default: the total of all metrics)
+        :type metric: string
+        :return: Timeseries data
+        :rtype: TimeseriesResult
+        """
+        rsp = self.get_timeseries(ts_schema, ts_query, epoch_begin, epoch_end, limit = max_points, ts_aggregation = ts_aggregation)
+
+        return(TimeseriesResult.from_rsp(rsp, ts_schema, ts_query).downsample(max_points, metric))
+
+    def get_timeseries_tail(self, window = 3600, max_points = 4096, limit = None):
+        """
+        Return a TimeseriesTail following timeseries over a sliding window: each call
+        only requests the points after the last known one and merges them into a
+        local buffer (e.g. for live charts refreshed every few seconds)
+        
+        :param window: The window duration (seconds)
+        :type window: int
+        :param max_points: The max number of points buffered per timeseries
+        :type max_points: int
+        :param limit: The number of points requested to the server (default: max_points, at least the points of the window)
+        :type limit: int
+        :return: The timeseries follower (use get(), get_host() or get_interface())
+        :rtype: TimeseriesTail
+        """
+        return(TimeseriesTail(self, window, max_points, limit))
+
+    def get_timeseries_bulk(self, queries, epoch_begin, epoch_end, max_workers = 8, retries = 2, progress = None):
+        """
+        Return many timeseries running the queries concurrently. Identical queries are
+        issued once, failed queries are retried and reported without aborting the batch.
+        
+        :param queries: The list of (ts_schema, ts_query) pairs
+        :type queries: array
+        :param epoch_begin: Start of the time interval (epoch)
+        :type epoch_begin: int
+        :param epoch_end: End of the time interval (epoch)
+        :type epoch_end: int
+        :param max_workers: The max number of queries in flight
+        :type max_workers: int
+        :param retries: The number of times a failed query is retried
+        :type retries: int
+        :param progress: Function called as progress(done, total, failed) after each query
+        :type progress: function
+        :return: The results and failures (use to_matrix() to align them)
+        :rtype: BulkTimeseriesResult
+        """
+        fetcher = BulkTimeseriesFetcher(self, max_workers = max_workers, retries = retries)
+
+        return(fetcher.fetch(queries, epoch_begin, epoch_end, progress))
+
+    def get_hosts_timeseries_bulk(self, ifid, hosts, ts_schema, epoch_begin, epoch_end, max_workers = 8, retries = 2, progress = None):
+        """
+        Return the timeseries of a schema (e.g. host:traffic) for many hosts of an interface
+        
+        :param ifid: The interface ID
+        :type ifid: int
+        :param hosts: The host IPs
+        :type hosts: array
+        :param ts_schema: The timeseries schema
+        :type ts_schema: string
+        :param epoch_begin: Start of the time interval (epoch)
+        :type epoch_begin: int
+        :param epoch_end: End of the time interval (epoch)
+        :type epoch_end: int
+        :param max_workers: The max number of queries in flight
+        :type max_workers: int
+        :param retries: The number of times a failed query is retried
+        :type retries: int
+        :param progress: Function called as progress(done, total, failed) after each query
+        :type progress: function
+        :return: The results and failures (use to_matrix() to align them)
+        :rtype: BulkTimeseriesResult
+        """
+        queries = [ (ts_schema, "ifid:"+str(ifid)+",host:"+host_ip) for host_ip in hosts ]
+
+        return(self.get_timeseries_bulk(queries, epoch_begin, epoch_end, max_workers, retries, progress))
+
     def get_flows(self, ifid, epoch_begin, epoch_end, select_clause, where_clause, maxhits, group_by, order_by):
         """
         Run queries on the historical flows database (ClickHouse)
@@ -392,9 +763,199 @@ class Historical:
         :return: Query result
         :rtype: object
         """
-        return(self.ntopng_obj.post_request(self.rest_pro_v2_url + "/get/db/flows.lua", { "ifid": ifid, "epoch_begin": epoch_begin, "epoch_end": epoch_end, "select_clause": select_clause, "where_clause": where_clause, "maxhits_clause": maxhits, "group_by_clause": group_by, "order_by_clause": order_by }))
+        return(self.post_query(self.rest_pro_v2_url + "/get/db/flows.lua", { "ifid": ifid, "epoch_begin": epoch_begin, "epoch_end": epoch_end, "select_clause": select_clause, "where_clause": where_clause, "maxhits_clause": maxhits, "group_by_clause": group_by, "order_by_clause": order_by }, epoch_end))
+
+    def get_flows_records(self, ifid, epoch_begin, epoch_end, select_clause, where_clause, maxhits, group_by, order_by):
+        """
+        Run queries on the historical flows database (ClickHouse), returning the rows as
+        compact HistoricalFlowRecord tuples (see get_flows for the parameters)
+
+        :param ifid: The interface ID
+        :type ifid: int
+        :param epoch_begin: Start of the time interval (epoch)
+        :type epoch_begin: int
+        :param epoch_end: End of the time interval (epoch)
+        :type epoch_end: int
+        :param select_clause: Select clause (SQL syntax)
+        :type select_clause: string
+        :param where_clause: Where clause (SQL syntax)
+        :type where_clause: string
+        :param maxhits: Max number of results (limit)
+        :type maxhits: int
+        :param group_by: Group by condition (SQL syntax)
+        :type group_by: string
+        :param order_by: Order by condition (SQL syntax)
+        :type order_by: string
+        :return: Query result
+        :rtype: array
+        """
+        return(get_historical_flow_records(self.get_flows(ifid, epoch_begin, epoch_end, select_clause, where_clause, maxhits, group_by, order_by)))
+
+    def get_flows_stream(self, ifid, epoch_begin, epoch_end, select_clause, where_clause, maxhits, group_by, order_by):
+        """
+        Run queries on the historical flows database (ClickHouse), decoding the response
+        incrementally: rows are returned as soon as they are received and memory usage
+        does not depend on maxhits
+        
+        :param ifid: The interface ID
+        :type ifid: int
+        :param epoch_begin: Start of the time interval (epoch)
+        :type epoch_begin: int
+        :param epoch_end: End of the time interval (epoch)
+        :type epoch_end: int
+        :param select_clause: Select clause (SQL syntax)
+        :type select_clause: string
+        :param where_clause: Where clause (SQL syntax)
+        :type where_clause: string
+        :param maxhits: Max number of results (limit)
+        :type maxhits: int
+        :param group_by: Group by condition (SQL syntax)
+        :type group_by: string
+        :param order_by: Order by condition (SQL syntax)
+        :type order_by: string
+        :return: Query result rows
+        :rtype: generator
+        """
+        return(self.ntopng_obj.post_request_stream(self.rest_pro_v2_url + "/get/db/flows.lua", { "ifid": ifid, "epoch_begin": epoch_begin, "epoch_end": epoch_end, "select_clause": select_clause, "where_clause": where_clause, "maxhits_clause": maxhits, "group_by_clause": group_by, "order_by_clause": order_by }))
+
+    def iter_flows_pages(self, ifid, epoch_begin, epoch_end, select_clause, where_clause, page_size = 10000, order_by = "FIRST_SEEN, FLOW_ID", after = None):
+        """
+        Run queries on the historical flows database (ClickHouse) returning all the matching
+        flows page by page. Pages are retrieved with keyset pagination: each page selects the
+        flows following the last flow of the previous page in the (unique) order_by order.
+        
+        :param ifid: The interface ID
+        :type ifid: int
+        :param epoch_begin: Start of the time interval (epoch)
+        :type epoch_begin: int
+        :param epoch_end: End of the time interval (epoch)
+        :type epoch_end: int
+        :param select_clause: Select clause (SQL syntax), must include the order_by columns
+        :type select_clause: string
+        :param where_clause: Where clause (SQL syntax)
+        :type where_clause: string
+        :param page_size: The number of flows per page
+        :type page_size: int
+        :param order_by: Unique order by condition (SQL syntax)
+        :type order_by: string
+        :param after: Resume after this flow (e.g. the last flow of a previous run)
+        :type after: object
+        :return: Pages (lists) of flows
+        :rtype: generator
+        """
+        check_select_clause(select_clause, order_by)
+
+        def fetch(clause, maxhits, order):
+            return(self.get_flows(ifid, epoch_begin, epoch_end, select_clause, clause, maxhits, None, order))
+
+        return(iter_keyset_pages(fetch, where_clause, order_by, page_size, after))
+
+    def export_flows(self, path, ifid, epoch_begin, epoch_end, select_clause, where_clause, file_format = None, batch_size = 10000, order_by = "FIRST_SEEN, FLOW_ID", types = None, progress = None):
+        """
+        Export the historical flows matching a query to a Parquet, Arrow IPC or (gzip) CSV file.
+        Flows are read page by page and written incrementally, so memory usage is bounded by batch_size.
+        
+        :param path: The output file name (the format is taken from the extension: .parquet, .arrow, .csv, .csv.gz)
+        :type path: string
+        :param ifid: The interface ID
+        :type ifid: int
+        :param epoch_begin: Start of the time interval (epoch)
+        :type epoch_begin: int
+        :param epoch_end: End of the time interval (epoch)
+        :type epoch_end: int
+        :param select_clause: Select clause (SQL syntax), must include the order_by columns
+        :type select_clause: string
+        :param where_clause: Where clause (SQL syntax)
+        :type where_clause: string
+        :param file_format: The export format: parquet, arrow or csv (default: from the file name)
+        :type file_format: string
+        :param batch_size: The number of flows read and written at once
+        :type batch_size: int
+        :param order_by: Unique order by condition (SQL syntax) used for pagination
+        :type order_by: string
+        :param types: The column types (int, uint, float, string), inferred from the first batch if not specified
+        :type types: object
+        :param progress: Function called as progress(rows) after each batch
+        :type progress: function
+        :return: Export statistics (rows, batches, bytes written, elapsed time)
+        :rtype: object
+        """
+        return(export_flows(self, path, ifid, epoch_begin, epoch_end, select_clause, where_clause, file_format, batch_size, order_by, types, progress))
+
+    def get_replica(self, db_path, columns = None, page_size = 10000, overlap = 600, max_flow_duration = 3600):
+        """
+        Return a FlowReplica keeping a local SQLite copy of the historical flows. Use sync()
+        to copy the new flows of an interface and get_flows() to run queries, answered
+        locally when the time range is covered by the replica.
+        
+        :param db_path: The SQLite database file
+        :type db_path: string
+        :param columns: The replicated columns (default: time, addresses, ports, protocols, counters, score)
+        :type columns: array
+        :param page_size: The number of flows read per query while syncing
+        :type page_size: int
+        :param overlap: Seconds read again at each sync to catch flows written late
+        :type overlap: int
+        :param max_flow_duration: The max duration (seconds) of a flow, also read again at each sync (flows are written when they end)
+        :type max_flow_duration: int
+        :return: The flows replica
+        :rtype: FlowReplica
+        """
+        return(FlowReplica(self, db_path, columns, page_size, overlap, max_flow_duration))
+
+    def get_rollups(self, db_path, host_column = None, closed_after = 600):
+        """
+        Return a FlowRollups maintaining local hourly and daily aggregates (bytes, packets, flows)
+        per host (client and server) and L7 protocol. Use update() to roll up the hours closed since the last update
+        and get_flows() to run grouped queries answered from the rollups (partial buckets are
+        queried to ntopng).
+        
+        :param db_path: The SQLite database file
+        :type db_path: string
+        :param host_column: The flows column (or expression) identifying the host (default: the client and server IPv4/IPv6 addresses)
+        :type host_column: string
+        :param closed_after: Seconds after the end of an hour after which the hour is rolled up
+        :type closed_after: int
+        :return: The flow rollups
+        :rtype: FlowRollups
+        """
+        return(FlowRollups(self, db_path, host_column, closed_after))
+
+    def get_flows_sliced(self, ifid, epoch_begin, epoch_end, select_clause, where_clause, maxhits, group_by, order_by, max_workers = 4, slice_duration = None):
+        """
+        Run queries on the historical flows database (ClickHouse) splitting the time range
+        in slices queried concurrently, merging results according to order_by and maxhits.
+        Use it for long ranges that would exceed the request timeout as a single query.
+        Grouped queries are not supported.
+        
+        :param ifid: The interface ID
+        :type ifid: int
+        :param epoch_begin: Start of the time interval (epoch)
+        :type epoch_begin: int
+        :param epoch_end: End of the time interval (epoch)
+        :type epoch_end: int
+        :param select_clause: Select clause (SQL syntax)
+        :type select_clause: string
+        :param where_clause: Where clause (SQL syntax)
+        :type where_clause: string
+        :param maxhits: Max number of results (limit)
+        :type maxhits: int
+        :param group_by: Group by condition (SQL syntax), must be empty
+        :type group_by: string
+        :param order_by: Order by condition (SQL syntax)
+        :type order_by: string
+        :param max_workers: The max number of slices queried concurrently
+        :type max_workers: int
+        :param slice_duration: Fixed slice duration in seconds (None to size slices from the row density)
+        :type slice_duration: int
+        :return: Query result
+        :rtype: object
+        """
+        query = TimeSlicedQuery(self, max_workers = max_workers, slice_duration = slice_duration)
 
-    def get_topk_flows(self, ifid, epoch_begin, epoch_end, max_hits, where_clause):
+        return(query.get_flows(ifid, epoch_begin, epoch_end, select_clause, where_clause, maxhits, group_by, order_by))
+
+    def get_topk_flows(self, ifid, epoch_begin, epoch_end, max_hits, where_clause, select_keys = None, select_values = None, topk = None, approx_search = None):
         """
         Retrieve Top-K from the historical flows database
         
@@ -408,10 +969,66 @@ class Historical:
         :type maxhits: int
         :param where_clause: Where clause (SQL syntax)
         :type where_clause: string
+        :param select_keys: Comma-separated keys (server default: IPV4_SRC_ADDR,IPV4_DST_ADDR,L7_PROTO)
+        :type select_keys: string
+        :param select_values: Select value (server default: BYTES)
+        :type select_values: string
+        :param topk: Top-K function (server default: SUM)
+        :type topk: string
+        :param approx_search: Approximate search (server default: true)
+        :type approx_search: boolean
         :return: Query result
         :rtype: object
         """
-        return(self.ntopng_obj.request(self.rest_pro_v2_url + "/get/db/topk_flows.lua", {"ifid": ifid, "begin_time_clause": epoch_begin, "end_time_clause": epoch_end, "maxhits_clause": max_hits, "where_clause": where_clause }))
+        params = {"ifid": ifid, "begin_time_clause": epoch_begin, "end_time_clause": epoch_end, "maxhits_clause": max_hits, "where_clause": where_clause }
+
+        if(select_keys):
+            params["select_keys_clause"] = select_keys
+        if(select_values):
+            params["select_values_clause"] = select_values
+        if(topk):
+            params["topk_clause"] = topk
+        if(approx_search is not None):
+            params["approx_search"] = "true" if approx_search else "false"
+
+        return(self.query(self.rest_pro_v2_url + "/get/db/topk_flows.lua", params, epoch_end))
+
+    def get_topk_flows_sliced(self, ifid, epoch_begin, epoch_end, max_hits, where_clause, select_keys = None, select_values = None, topk = None,
+                              max_workers = 4, slice_duration = 3600, overfetch = 4):
+        """
+        Retrieve Top-K from the historical flows database over long time ranges: a Top-K query
+        with max_hits*overfetch entries is run for each slice concurrently and the partial
+        results are merged. Each entry reports its value (lower bound) and max error (error).
+        Slices are aligned to slice_duration: with the cache enabled (enable_cache) extending
+        the range only queries the new slices.
+        
+        :param ifid: The interface ID
+        :type ifid: int
+        :param epoch_begin: Start of the time interval (epoch)
+        :type epoch_begin: int
+        :param epoch_end: End of the time interval (epoch)
+        :type epoch_end: int
+        :param max_hits: The number of entries (K)
+        :type max_hits: int
+        :param where_clause: Where clause (SQL syntax)
+        :type where_clause: string
+        :param select_keys: Comma-separated keys (default: IPV4_SRC_ADDR,IPV4_DST_ADDR,L7_PROTO)
+        :type select_keys: string
+        :param select_values: Select value (server default: BYTES)
+        :type select_values: string
+        :param topk: Top-K function (SUM, COUNT, MAX; server default: SUM)
+        :type topk: string
+        :param max_workers: The max number of slices queried concurrently
+        :type max_workers: int
+        :param slice_duration: The slice duration in seconds
+        :type slice_duration: int
+        :param overfetch: Each slice is asked for max_hits * overfetch entries
+        :type overfetch: int
+        :return: Query result
+        :rtype: array
+        """
+        return(SlicedTopK(self, max_workers, slice_duration, overfetch).get_topk_flows(ifid, epoch_begin, epoch_end, max_hits, where_clause,
+                                                                                       select_keys, select_values, topk))
 
     def self_test(self, ifid, host):
         try:
@@ -0,0 +1,277 @@
+"""
+HistoricalCache
+====================================
+The HistoricalCache class caches the results of historical queries (flows, alerts,
+alert counters, timeseries) keyed by a fingerprint of the normalized query
+(ntopng instance and user, endpoint, interface, clauses, epochs).
+
+Data of a time window entirely in the past does not change: such results are stored
+on disk permanently, with LRU eviction bounded by the total size of the cache
+directory. Results of windows including "now" are kept in memory for a short TTL.
+The cache can be shared by several handles: results of different ntopng instances or
+users (who may not see the same data) have different fingerprints.
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+from .ntopng import get_identity
+
+def normalize_whitespace(clause):
+    # Collapse the whitespace outside the quoted literals ('a  b' and 'a b' are different values)
+    if(("'" not in clause) and ('"' not in clause) and ("`" not in clause)):
+        return(" ".join(clause.split()))
+
+    out     = []
+    quote   = None
+    space   = False
+    escaped = False
+
+    for c in clause:
+        if(quote is not None):
+            out.append(c)
+
+            if(escaped):
+                escaped = False
+            elif(c == "\\"):
+                escaped = True
+            elif(c == quote):
+                quote = None
+        elif(c.isspace()):
+            space = True
+        else:
+            if(space and out):
+                out.append(" ")
+
+            space = False
+
+            if(c in "'\"`"):
+                quote = c
+
+            out.append(c)
+
+    return("".join(out))
+
+def normalize_value(value):
+    # Clauses differing only in whitespace (outside literals) are the same query
+    if(isinstance(value, str)):
+        return(normalize_whitespace(value))
+    elif(isinstance(value, (int, float, bool)) or (value is None)):
+        return(value)
+
+    return(str(value))
+
+def get_fingerprint(url, params):
+    """
+    Return the fingerprint of a query
+
+    :param url: The endpoint URL
+    :type url: string
+    :param params: The query parameters
+    :type params: object
+    :return: The fingerprint (hex digest)
+    :rtype: string
+    """
+    normalized = { k: normalize_value(v) for k, v in (params or {}).items() if (v is not None) and (v != "") }
+    key = json.dumps({ "url": url, "params": normalized }, sort_keys = True)
+
+    return(hashlib.sha256(key.encode("utf-8")).hexdigest())
+
+class HistoricalCache:
+    """
+    HistoricalCache caches historical query results on disk (closed windows) and in memory (open windows)
+
+    :param cache_dir: The directory where results of closed windows are stored
+    """
+    def __init__(self, cache_dir = None, max_disk_bytes = 256*1024*1024, open_ttl = 30, max_open_entries = 256, closed_after = 300):
+        """
+        Construct a new HistoricalCache object
+
+        :param cache_dir: The directory where results of closed windows are stored (default: ~/.cache/ntopng/historical)
+        :type cache_dir: string
+        :param max_disk_bytes: Max size of the results stored on disk
+        :type max_disk_bytes: int
+        :param open_ttl: TTL (seconds) of the results of windows including now
+        :type open_ttl: int
+        :param max_open_entries: Max number of results of open windows kept in memory
+        :type max_open_entries: int
+        :param closed_after: Seconds after which a window end is considered closed (data no longer written)
+        :type closed_after: int
+        """
+        if(cache_dir is None):
+            cache_dir = os.path.join(os.path.expanduser("~"), ".cache", "ntopng", "historical")
+
+        self.cache_dir        = cache_dir
+        self.max_disk_bytes   = max_disk_bytes
+        self.open_ttl         = open_ttl
+        self.max_open_entries = max_open_entries
+        self.closed_after     = closed_after
+        self.lock             = threading.Lock()
+        self.open_entries     = OrderedDict()
+        self.disk_entries     = OrderedDict() # fingerprint -> size, in LRU order
+        self.disk_bytes       = 0
+        self.stats            = { "memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0 }
+
+        os.makedirs(self.cache_dir, exist_ok = True)
+        self.load_index()
+
+    def load_index(self):
+        files = []
+
+        for name in os.listdir(self.cache_dir):
+            if(name.endswith(".json")):
+                st = os.stat(os.path.join(self.cache_dir, name))
+                files.append((st.st_mtime, name[:-5], st.st_size))
+
+        for _, fingerprint, size in sorted(files):
+            self.disk_entries[fingerprint] = size
+            self.disk_bytes += size
+
+    def get_path(self, fingerprint):
+        return(os.path.join(self.cache_dir, fingerprint + ".json"))
+
+    def is_closed(self, epoch_end):
+        return((epoch_end is not None) and (int(epoch_end) <= (time.time() - self.closed_after)))
+
+    def get(self, url, params, epoch_end, loader):
+        """
+        Return the cached result of a query, calling loader() on cache miss
+
+        :param url: The endpoint URL
+        :type url: string
+        :param params: The query parameters
+        :type params: object
+        :param epoch_end: End of the query time window (epoch)
+        :type epoch_end: int
+        :param loader: The function issuing the actual query
+        :type loader: function
+        :return: The query result (shared with the cache: do not modify it)
+        :rtype: object
+        """
+        fingerprint = get_fingerprint(url, params)
+        closed = self.is_closed(epoch_end)
+
+        if(closed):
+            value = self.read_disk(fingerprint)
+
+            if(value is not None):
+                return(value[0])
+        else:
+            with self.lock:
+                entry = self.open_entries.get(fingerprint)
+
+                if((entry is not None) and (entry[1] > time.time())):
+                    self.stats["memory_hits"] += 1
+                    self.open_entries.move_to_end(fingerprint)
+                    return(entry[0])
+
+        with self.lock:
+            self.stats["misses"] += 1
+
+        value = loader()
+
+        if(closed):
+            self.write_disk(fingerprint, url, params, value)
+        else:
+            with self.lock:
+                self.open_entries[fingerprint] = (value, time.time() + self.open_ttl)
+                self.open_entries.move_to_end(fingerprint)
+
+                while(len(self.open_entries) > self.max_open_entries):
+                    self.open_entries.popitem(last = False)
+                    self.stats["evictions"] += 1
+
+        return(value)
+
+    def read_disk(self, fingerprint):
+        with self.lock:
+            if(fingerprint not in self.disk_entries):
+                return(None)
+
+            self.disk_entries.move_to_end(fingerprint)
+
+        path = self.get_path(fingerprint)
+
+        try:
+            with open(path, "r") as f:
+                entry = json.load(f)
+
+            os.utime(path)
+        except (OSError, ValueError):
+            with self.lock:
+                self.forget(fingerprint)
+            return(None)
+
+        with self.lock:
+            self.stats["disk_hits"] += 1
+
+        return((entry["rsp"],))
+
+    def write_disk(self, fingerprint, url, params, value):
+        path = self.get_path(fingerprint)
+        tmp_path = path + "." + str(threading.get_ident()) + ".tmp"
+        data = json.dumps({ "url": url, "params": params, "created": int(time.time()), "rsp": value }, default = str)
+
+        if(len(data) > self.max_disk_bytes):
+            return
+
+        with open(tmp_path, "w") as f:
+            f.write(data)
+
+        os.replace(tmp_path, path)
+
+        with self.lock:
+            self.forget(fingerprint)
+            self.disk_entries[fingerprint] = len(data)
+            self.disk_bytes += len(data)
+
+            while(self.disk_bytes > self.max_disk_bytes):
+                oldest = next(iter(self.disk_entries))
+                self.forget(oldest)
+                self.stats["evictions"] += 1
+
+                try:
+                    os.remove(self.get_path(oldest))
+                except OSError:
+                    pass
+
+    # internal method (the caller must hold the lock)
+    def forget(self, fingerprint):
+        size = self.disk_entries.pop(fingerprint, None)
+
+        if(size is not None):
+            self.disk_bytes -= size
+
+    def clear(self):
+        """
+        Remove all the cached results (memory and disk)
+        """
+        with self.lock:
+            self.open_entries.clear()
+
+            for fingerprint in list(self.disk_entries.keys()):
+                self.forget(fingerprint)
+
+                try:
+                    os.remove(self.get_path(fingerprint))
+                except OSError:
+                    pass
+
+    def get_stats(self):
+        """
+        Return cache statistics (memory/disk hits, misses, evictions, size)
+
+        :return: The cache statistics
+        :rtype: object
+        """
+        with self.lock:
+            stats = dict(self.stats)
+            stats["open_entries"] = len(self.open_entries)
+            stats["disk_entries"] = len(self.disk_entries)
+            stats["disk_bytes"]   = self.disk_bytes
+
+        return(stats)
@@ -5,6 +5,12 @@ The Host class can be used to access information about hosts through the
 REST API (https://www.ntop.org/guides/ntopng/api/rest/api_v2.html).
 """
 
+from .ntopng import get_filter_params
+from .records import ActiveHostRecord
+
+# Filters supported by host/active.lua
+HOST_FILTERS = ( "mode", "version", "protocol", "traffic_type", "asn", "vlan", "network", "network_cidr", "pool", "country", "os", "mac" )
+
 class Host:
     """
     Host provides information about hosts
@@ -32,8 +38,69 @@ class Host:
         """
         return(self.ntopng_obj.request(self.rest_v2_url + "/get/host/active.lua", {"ifid": ifid}))
 
-    def get_active_hosts_paginated(self, ifid, currentPage, perPage):
-        return(self.ntopng_obj.request(self.rest_v2_url + "/get/host/active.lua", {"ifid": ifid, "currentPage": currentPage, "perPage": perPage}))
+    def get_active_hosts_paginated(self, ifid, currentPage, perPage, sortColumn = None, sortOrder = None, **filters):
+        """
+        Retrieve the (paginated) list of active hosts for the specified interface. Hosts
+        are selected and sorted by ntopng, so that only the matching hosts are transferred,
+        e.g. get_active_hosts_paginated(0, 1, 100, "traffic", "desc", mode = "local", country = "IT")
+
+        Supported filters:
+
+        - mode: all, local, remote, broadcast_domain, filtered, blacklisted, dhcp
+        - version: IP version (4 or 6)
+        - protocol: L7 protocol ID
+        - traffic_type: one_way, bidirectional
+        - asn: AS number
+        - vlan: VLAN ID
+        - network: local network ID
+        - network_cidr: network (e.g. 192.168.1.0/24)
+        - pool: host pool ID
+        - country: country code
+        - os: OS ID
+        - mac: MAC address
+
+        :param ifid: The interface ID
+        :type ifid: int
+        :param currentPage: The current page
+        :type currentPage: int
+        :param perPage: The number of results per page
+        :type perPage: int
+        :param sortColumn: The sort column: ip, name, since, last, alerts, country, vlan, num_flows, traffic, thpt (default: ip)
+        :type sortColumn: string
+        :param sortOrder: The sort order: asc or desc
+        :type sortOrder: string
+        :return: The active hosts of the page
+        :rtype: object
+        """
+        params = {"ifid": ifid, "currentPage": currentPage, "perPage": perPage}
+        params.update(get_filter_params(filters, HOST_FILTERS))
+
+        if(sortColumn is not None):
+            params["sortColumn"] = sortColumn
+        if(sortOrder is not None):
+            params["sortOrder"] = sortOrder
+
+        return(self.ntopng_obj.request(self.rest_v2_url + "/get/host/active.lua", params))
+
+    def get_active_hosts_records(self, ifid, currentPage, perPage, sortColumn = None, sortOrder = None, **filters):
+        """
+        Retrieve the (paginated) list of active hosts for the specified interface as compact
+        ActiveHostRecord objects (see get_active_hosts_paginated for sorting and filters)
+
+        :param ifid: The interface ID
+        :type ifid: int
+        :param currentPage: The current page
+        :type currentPage: int
+        :param perPage: The number of results per page
+        :type perPage: int
+        :param sortColumn: The sort column
+        :type sortColumn: string
+        :param sortOrder: The sort order: asc or desc
+        :type sortOrder: string
+        :return: The active hosts of the page
+        :rtype: array
+        """
+        return(ActiveHostRecord.from_rsp(self.get_active_hosts_paginated(ifid, currentPage, perPage, sortColumn, sortOrder, **filters)))
 
     def get_host_interfaces(self, host):
         """
@@ -0,0 +1,267 @@
+"""
+Metrics
+====================================
+The Metrics class collects per-endpoint statistics about the REST calls issued
+through an Ntopng handle: latency histograms, request/response bytes, status codes,
+JSON decode time and errors.
+
+Statistics can be read as a Python object (get_stats) or exported in the
+OpenMetrics (Prometheus) text format (to_openmetrics).
+"""
+
+import time
+import threading
+from urllib.parse import urlsplit
+
+# Histogram buckets (seconds)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts  = [ 0 ] * (len(buckets) + 1)
+        self.sum     = 0.0
+        self.count   = 0
+
+    def observe(self, value):
+        i = 0
+
+        while((i < len(self.buckets)) and (value > self.buckets[i])):
+            i += 1
+
+        self.counts[i] += 1
+        self.sum       += value
+        self.count     += 1
+
+    def get_stats(self):
+        cumulative = 0
+        buckets = []
+
+        for i, bound in enumerate(self.buckets):
+            cumulative += self.counts[i]
+            buckets.append((bound, cumulative))
+
+        buckets.append((float("inf"), self.count))
+
+        return({ "count": self.count, "sum": self.sum,
+                 "avg": (self.sum / self.count) if self.count else 0.0,
+                 "buckets": buckets })
+
+class EndpointMetrics:
+    def __init__(self, buckets):
+        self.latency        = Histogram(buckets)
+        self.decode         = Histogram(buckets)
+        self.requests       = 0
+        self.request_bytes  = 0
+        self.response_bytes = 0
+        self.status_codes   = {}
+        self.errors         = {}
+
+    def get_stats(self):
+        return({ "requests": self.requests,
+                 "request_bytes": self.request_bytes,
+                 "response_bytes": self.response_bytes,
+                 "status_codes": dict(self.status_codes),
+                 "errors": dict(self.errors),
+                 "latency": self.latency.get_stats(),
+                 "decode": self.decode.get_stats() })
+
+def escape_label(value):
+    return(str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n"))
+
+def format_value(value):
+    if(value == float("inf")):
+        return("+Inf")
+
+    return(repr(float(value)) if isinstance(value, float) else str(value))
+
+class Metrics:
+    """
+    Metrics collects per-endpoint statistics about REST calls
+
+    :param buckets: The latency histogram buckets (seconds)
+    """
+    def __init__(self, buckets = DEFAULT_BUCKETS, prefix = "ntopng_rest"):
+        """
+        Construct a new Metrics object
+
+        :param buckets: The latency histogram buckets (seconds)
+        :type buckets: array
+        :param prefix: The prefix of the exported metric names
+        :type prefix: string
+        """
+        self.buckets   = tuple(sorted(buckets))
+        self.prefix    = prefix
+        self.endpoints = {}
+        self.lock      = threading.Lock()
+        self.created   = time.time()
+
+    # internal method (the caller must hold the lock)
+    def get_endpoint(self, method, url):
+        key = (method, urlsplit(url).path)
+        endpoint = self.endpoints.get(key)
+
+        if(endpoint is None):
+            endpoint = EndpointMetrics(self.buckets)
+            self.endpoints[key] = endpoint
+
+        return(endpoint)
+
+    def observe_request(self, method, url, latency, request_bytes, response_bytes, status_code):
+        """
+        Record a completed REST call
+
+        :param method: The HTTP method (GET, POST)
+        :type method: string
+        :param url: The request URL
+        :type url: string
+        :param latency: The time (seconds) elapsed until the response was received
+        :type latency: float
+        :param request_bytes: The number of bytes sent (query string or body)
+        :type request_bytes: int
+        :param response_bytes: The number of bytes received (body)
+        :type response_bytes: int
+        :param status_code: The HTTP status code
+        :type status_code: int
+        """
+        with self.lock:
+            endpoint = self.get_endpoint(method, url)
+            endpoint.requests       += 1
+            endpoint.request_bytes  += request_bytes
+            endpoint.response_bytes += response_bytes
+            endpoint.status_codes[status_code] = endpoint.status_codes.get(status_code, 0) + 1
+            endpoint.latency.observe(latency)
+
+            if(status_code != 200):
+                endpoint.errors["http_status"] = endpoint.errors.get("http_status", 0) + 1
+
+    def observe_response_bytes(self, method, url, response_bytes):
+        """
+        Record the bytes of a response body read after the call was recorded (streamed responses)
+
+        :param method: The HTTP method (GET, POST)
+        :type method: string
+        :param url: The request URL
+        :type url: string
+        :param response_bytes: The number of bytes received (body)
+        :type response_bytes: int
+        """
+        with self.lock:
+            self.get_endpoint(method, url).response_bytes += response_bytes
+
+    def observe_decode(self, method, url, decode_time):
+        """
+        Record the time spent decoding a JSON response
+
+        :param method: The HTTP method (GET, POST)
+        :type method: string
+        :param url: The request URL
+        :type url: string
+        :param decode_time: The decode time (seconds)
+        :type decode_time: float
+        """
+        with self.lock:
+            self.get_endpoint(method, url).decode.observe(decode_time)
+
+    def observe_error(self, method, url, error_type):
+        """
+        Record a failed REST call
+
+        :param method: The HTTP method (GET, POST)
+        :type method: string
+        :param url: The request URL
+        :type url: string
+        :param error_type: The error type (e.g. ConnectionError, decode)
+        :type error_type: string
+        """
+        with self.lock:
+            endpoint = self.get_endpoint(method, url)
+            endpoint.errors[error_type] = endpoint.errors.get(error_type, 0) + 1
+
+    def reset(self):
+        """
+        Discard all the collected statistics
+        """
+        with self.lock:
+            self.endpoints = {}
+            self.created   = time.time()
+
+    def get_stats(self):
+        """
+        Return the statistics per endpoint, keyed by '<method> <endpoint path>'
+
+        :return: Requests, bytes, status codes, errors, latency and decode time histograms per endpoint
+        :rtype: object
+        """
+        with self.lock:
+            return({ (method + " " + path): endpoint.get_stats() for (method, path), endpoint in self.endpoints.items() })
+
+    def get_top_endpoints(self, max_num_results = 10):
+        """
+        Return the endpoints ranked by total time spent waiting for responses
+
+        :param max_num_results: The max number of endpoints to return
+        :type max_num_results: int
+        :return: List of (endpoint, total latency, requests)
+        :rtype: array
+        """
+        stats = self.get_stats()
+        top = [ (name, s["latency"]["sum"], s["requests"]) for name, s in stats.items() ]
+        top.sort(key = lambda t: t[1], reverse = True)
+
+        return(top[:max_num_results])
+
+    def to_openmetrics(self):
+        """
+        Export the statistics in the OpenMetrics text format
+
+        :return: The OpenMetrics exposition
+        :rtype: string
+        """
+        p = self.prefix
+        lines = []
+        stats = []
+
+        with self.lock:
+            for (method, path), endpoint in sorted(self.endpoints.items()):
+                labels = "method=\"" + escape_label(method) + "\",endpoint=\"" + escape_label(path) + "\""
+                stats.append((labels, endpoint.get_stats()))
+
+        def histogram(name, key, help_text):
+            lines.append("# TYPE " + name + " histogram")
+            lines.append("# UNIT " + name + " seconds")
+            lines.append("# HELP " + name + " " + help_text)
+
+            for labels, s in stats:
+                h = s[key]
+
+                for bound, count in h["buckets"]:
+                    lines.append(name + "_bucket{" + labels + ",le=\"" + format_value(bound) + "\"} " + str(count))
+
+                lines.append(name + "_sum{" + labels + "} " + format_value(h["sum"]))
+                lines.append(name + "_count{" + labels + "} " + str(h["count"]))
+
+        def counter(name, key, help_text):
+            lines.append("# TYPE " + name + " counter")
+            lines.append("# HELP " + name + " " + help_text)
+
+            for labels, s in stats:
+                lines.append(name + "_total{" + labels + "} " + str(s[key]))
+
+        def labeled_counter(name, key, label, help_text):
+            lines.append("# TYPE " + name + " counter")
+            lines.append("# HELP " + name + " " + help_text)
+
+            for labels, s in stats:
+                for value, count in sorted(s[key].items(), key = lambda kv: str(kv[0])):
+                    lines.append(name + "_total{" + labels + "," + label + "=\"" + escape_label(value) + "\"} " + str(count))
+
+        histogram(p + "_request_duration_seconds", "latency", "Time elapsed until the REST response is received.")
+        histogram(p + "_decode_duration_seconds", "decode", "Time spent decoding the JSON REST response.")
+        counter(p + "_request_bytes", "request_bytes", "Bytes sent in REST requests.")
+        counter(p + "_response_bytes", "response_bytes", "Bytes received in REST responses.")
+        labeled_counter(p + "_responses", "status_codes", "code", "REST responses by HTTP status code.")
+        labeled_counter(p + "_errors", "errors", "type", "Failed REST calls by error type.")
+        lines.append("# EOF")
+
+        return("\n".join(lines) + "\n")
@@ -5,45 +5,185 @@ The Ntopng class stores information for accessing the ntopng instance (IP and cr
 and provides global traffic information and constants (interfaces, alert types, etc).
 """
 
-import requests
 import json
+import time
+import hashlib
+from urllib.parse import urlsplit
 from requests.auth import HTTPBasicAuth
+from .session import get_session_pool
+from .cache import ResponseCache
+from .stream import iter_json_items
+from .metrics import Metrics
+
+def get_filter_params(filters, allowed):
+    """
+    Return the REST parameters of the specified filters, skipping unset (None) values
+
+    :param filters: The filters (name -> value)
+    :type filters: object
+    :param allowed: The filters supported by the endpoint
+    :type allowed: array
+    :return: The request parameters
+    :rtype: object
+    """
+    params = {}
+
+    for name, value in (filters or {}).items():
+        if(name not in allowed):
+            raise ValueError("Unknown filter '" + str(name) + "' (supported: " + ", ".join(allowed) + ")")
+
+        if(value is not None):
+            params[name] = str(value).lower() if isinstance(value, bool) else value
+
+    return(params)
+
+def get_identity(ntopng_obj):
+    """
+    Return the identity of an ntopng handle (instance URL and user) used to scope cached results
+
+    :param ntopng_obj: The ntopng handle
+    :type ntopng_obj: Ntopng
+    :return: The identity (the token, if any, is hashed)
+    :rtype: string
+    """
+    if(getattr(ntopng_obj, "auth_token", None) is not None):
+        user = "token:" + hashlib.sha256(ntopng_obj.auth_token.encode("utf-8")).hexdigest()[:32]
+    else:
+        user = "user:" + str(getattr(ntopng_obj, "username", None))
+
+    return(str(ntopng_obj.url).rstrip("/") + " " + user)
 
 class Ntopng:
-    def issue_request(self, url, params):
+    def issue_request(self, url, params, stream = False):
         if(self.debug):
             print("Requesting [GET]: "+url)
             print(params)
 
-        if(self.auth_token != None):
-            response = requests.get(url, auth = None, headers = { "Authorization" : "Token " + self.auth_token }, params = params)
-        else:
-            response = requests.get(url, auth = HTTPBasicAuth(self.username, self.password), params = params)
+        start = time.perf_counter()
+
+        try:
+            response = self.session_pool.get(url, auth = self.auth, headers = self.headers, params = params, stream = stream)
+        except Exception as e:
+            self.metrics.observe_error("GET", url, type(e).__name__)
+            raise
+
+        self.observe_response("GET", url, response, time.perf_counter() - start, stream)
 
         if(self.debug):
             print("Elapsed time: " + str(response.elapsed))
             
         return(response)
 
-    def issue_post_request(self, url, params):
+    def issue_post_request(self, url, params, stream = False):
         if(self.debug):
             print("Requesting [POST]: " + url)
             print(params)
         
-        if(self.auth_token != None):
-            response = requests.post(url, auth = None, headers = { "Authorization" : "Token " + self.auth_token, "Content-Type" : "application/json" }, json = params)
-        else:
-            response = requests.post(url, auth = HTTPBasicAuth(self.username, self.password), headers = { "Content-Type" : "application/json" }, json = params)
+        start = time.perf_counter()
+
+        try:
+            response = self.session_pool.post(url, auth = self.auth, headers = self.post_headers, json = params, stream = stream)
+        except Exception as e:
+            self.metrics.observe_error("POST", url, type(e).__name__)
+            raise
+
+        self.observe_response("POST", url, response, time.perf_counter() - start, stream)
 
         if(self.debug):
             print("Elapsed time: " + str(response.elapsed))
             
         return(response)
 
+    # internal method used to account requests in the metrics
+    def observe_response(self, method, url, response, latency, stream):
+        request_bytes = len(urlsplit(response.request.url).query) + len(response.request.body or b"")
+
+        if(stream):
+            # The body has not been read yet (and chunked responses have no Content-Length):
+            # its bytes are recorded as they are consumed (see count_response_bytes)
+            response_bytes = 0
+        else:
+            response_bytes = len(response.content)
+
+        self.metrics.observe_request(method, url, latency, request_bytes, response_bytes, response.status_code)
+
+    # internal method used to account the body of streamed responses as it is consumed
+    def count_response_bytes(self, response, chunks):
+        response_bytes = 0
+
+        try:
+            for chunk in chunks:
+                response_bytes += len(chunk)
+                yield(chunk)
+        finally:
+            self.metrics.observe_response_bytes(response.request.method, response.url, response_bytes)
+
+    # internal method used to decode responses
+    def decode_response(self, method, url, response):
+        start = time.perf_counter()
+
+        try:
+            response = response.json()
+        except ValueError:
+            self.metrics.observe_error(method, url, "decode")
+            raise
+
+        self.metrics.observe_decode(method, url, time.perf_counter() - start)
+
+        return(response)
+
+    def get_metrics(self):
+        """
+        Return the statistics (latency, bytes, status codes, errors) of the REST calls issued so far
+        
+        :return: The metrics (use get_stats() or to_openmetrics() to read them)
+        :rtype: Metrics
+        """
+        return(self.metrics)
+
     def enable_debug(self):
         self.debug = True
+
+    def enable_cache(self, cache = None):
+        """
+        Cache the responses of constant and slow-changing endpoints
         
-    def __init__(self, username, password, auth_token, url):
+        :param cache: The cache to use (default: a ResponseCache with the default TTLs); it can be shared by many handles, responses are kept per instance and user
+        :type cache: ResponseCache
+        :return: The cache in use
+        :rtype: ResponseCache
+        """
+        if(cache is None):
+            cache = ResponseCache()
+
+        self.cache = cache
+        return(self.cache)
+
+    def disable_cache(self):
+        self.cache = None
+
+    def get_cache_stats(self):
+        """
+        Return the response cache statistics (hits, misses, evictions)
+        
+        :return: The cache statistics (None if the cache is disabled)
+        :rtype: object
+        """
+        if(self.cache is None):
+            return(None)
+
+        return(self.cache.get_stats())
+        
+    def get_session_stats(self):
+        """
+        Return statistics about the pooled connections towards ntopng
+        
+        :return: Number of requests, new and reused connections
+        :rtype: object
+        """
+        return(self.session_pool.get_stats())
+
+    def __init__(self, username, password, auth_token, url, pool_size = 10):
         """
         Construct a new 'Ntopng' object
         
@@ -55,6 +195,8 @@ class Ntopng:
         :type auth_token: int
         :param url: The ntopng URL (e.g. http://localhost:3000)
         :type url: string
+        :param pool_size: The max number of keep-alive connections towards the ntopng URL (shared by all handles and threads using the same URL, grown to the largest size requested)
+        :type pool_size: int
         """
         
         self.url        = url
@@ -67,8 +209,23 @@ class Ntopng:
             self.username   = username
             self.password   = password
             self.auth_token = None
-            
-        self.debug = False
+
+        # Authentication and headers are built once and reused by all requests
+        if(self.auth_token != None):
+            self.auth    = None
+            self.headers = { "Authorization" : "Token " + self.auth_token }
+        else:
+            self.auth    = HTTPBasicAuth(self.username, self.password)
+            self.headers = { }
+
+        self.post_headers = dict(self.headers)
+        self.post_headers["Content-Type"] = "application/json"
+
+        self.session_pool = get_session_pool(self.url, pool_size)
+        self.identity = get_identity(self)
+        self.cache   = None
+        self.metrics = Metrics()
+        self.debug   = False
         
         # self_test
         try:
@@ -83,6 +240,20 @@ class Ntopng:
         
     # internal method used to issue requests
     def request(self, url, params):
+        if(self.cache is not None):
+            return(self.cache.get("GET", url, params, lambda: self.do_request(url, params), self.identity))
+
+        return(self.do_request(url, params))
+
+    # internal method used to issue requests
+    def post_request(self, url, params):
+        if(self.cache is not None):
+            return(self.cache.get("POST", url, params, lambda: self.do_post_request(url, params), self.identity))
+
+        return(self.do_post_request(url, params))
+
+    # internal method used to issue requests (bypassing the cache)
+    def do_request(self, url, params):
         api_url = self.url + url
 
         if(self.debug):
@@ -96,13 +267,13 @@ class Ntopng:
             print("Invalid response code " + str(response.status_code))
             raise Exception("Invalid response code " + str(response.status_code))
 
-        response = response.json()
+        response = self.decode_response("GET", api_url, response)
 
         return response['rsp']
 
 
-    # internal method used to issue requests
-    def post_request(self, url, params):
+    # internal method used to issue requests (bypassing the cache)
+    def do_post_request(self, url, params):
         api_url = self.url + url
 
         if(self.debug):
@@ -116,10 +287,50 @@ class Ntopng:
             print("Invalid response code " + str(response.status_code))
             raise Exception("Invalid response code " + str(response.status_code))
 
-        response = response.json()
+        response = self.decode_response("POST", api_url, response)
 
         return response['rsp']
 
+    # internal method used to issue requests whose response is decoded incrementally
+    def request_stream(self, url, params, path = ("rsp",), chunk_size = 65536):
+        api_url = self.url + url
+        response = self.issue_request(api_url, params, stream = True)
+
+        return(self.stream_response(api_url, params, response, path, chunk_size))
+
+    # internal method used to issue requests whose response is decoded incrementally
+    def post_request_stream(self, url, params, path = ("rsp",), chunk_size = 65536):
+        api_url = self.url + url
+        response = self.issue_post_request(api_url, params, stream = True)
+
+        return(self.stream_response(api_url, params, response, path, chunk_size))
+
+    def stream_response(self, api_url, params, response, path, chunk_size):
+        """
+        Yield the elements of the response list found at path as they are received
+        
+        :param path: The list of keys leading to the list (e.g. ('rsp', 'data'))
+        :type path: array
+        :param chunk_size: The number of bytes read from the network at once
+        :type chunk_size: int
+        :return: The list elements
+        :rtype: generator
+        """
+        chunks = self.count_response_bytes(response, response.iter_content(chunk_size))
+
+        try:
+            if response.status_code != 200:
+                print(api_url)
+                print(params)
+                print("Invalid response code " + str(response.status_code))
+                raise Exception("Invalid response code " + str(response.status_code))
+
+            for item in iter_json_items(chunks, path):
+                yield(item)
+        finally:
+            chunks.close()
+            response.close()
+
     def get_alert_types(self):
         """
         Return all alert types
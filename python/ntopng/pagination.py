@@ -0,0 +1,184 @@
+"""
+Pagination
+====================================
+Keyset (cursor) pagination for historical queries. Instead of skipping rows with
+OFFSET, each page is requested with a where clause selecting the rows that follow
+the last row of the previous page in the sort order, so the cost of a page does not
+grow with the number of rows already read.
+
+The sort order must be unique (e.g. 'FIRST_SEEN, FLOW_ID' for flows or
+'tstamp, rowid' for alerts) and its columns must be part of the select clause.
+"""
+
+import re
+
+from .time_slicer import parse_order_by
+
+def format_sql_value(value):
+    """
+    Format a value as SQL literal
+
+    :param value: The value
+    :type value: object
+    :return: The SQL literal
+    :rtype: string
+    """
+    if(value is None):
+        return("NULL")
+    elif(isinstance(value, bool)):
+        return("1" if value else "0")
+    elif(isinstance(value, (int, float))):
+        return(repr(value))
+
+    # Quotes are doubled (understood by both ClickHouse and SQLite)
+    return("'" + str(value).replace("'", "''") + "'")
+
+def split_select_clause(select_clause):
+    """
+    Split a select clause into its expressions (commas inside parentheses are kept)
+
+    :param select_clause: Select clause (SQL syntax)
+    :type select_clause: string
+    :return: The select expressions
+    :rtype: array
+    """
+    items = []
+    depth = 0
+    item  = ""
+
+    for c in select_clause:
+        if((c == ",") and (depth == 0)):
+            items.append(item.strip())
+            item = ""
+            continue
+        elif(c == "("):
+            depth += 1
+        elif(c == ")"):
+            depth -= 1
+
+        item += c
+
+    items.append(item.strip())
+
+    return(items)
+
+def check_select_clause(select_clause, order_by):
+    """
+    Check that the select clause includes the order by columns (required to build the
+    where clause of the next page), so that a query fails before the first page is read
+
+    :param select_clause: Select clause (SQL syntax)
+    :type select_clause: string
+    :param order_by: Order by condition (e.g. 'FIRST_SEEN, FLOW_ID')
+    :type order_by: string
+    """
+    names = set()
+
+    for item in split_select_clause(select_clause or "*"):
+        if((item == "*") or item.endswith(".*")):
+            return
+
+        m = re.match(r"^(.*?)\s+AS\s+(\w+)$", item, re.IGNORECASE)
+        names.add(m.group(2) if m else item)
+
+    missing = [ column for column, _ in parse_order_by(order_by) if (column not in names) ]
+
+    if(len(missing) > 0):
+        raise ValueError("Order by column(s) '" + ", ".join(missing) + "' must be part of the select clause (required by keyset pagination)")
+
+def build_keyset_clause(order_by, last_row):
+    """
+    Build the where clause selecting the rows following last_row in the order_by order
+
+    :param order_by: Order by condition (e.g. 'FIRST_SEEN, FLOW_ID')
+    :type order_by: string
+    :param last_row: The last row read (must contain all the order by columns)
+    :type last_row: object
+    :return: Where clause (SQL syntax)
+    :rtype: string
+    """
+    columns = parse_order_by(order_by)
+    terms   = []
+
+    for i, (column, descending) in enumerate(columns):
+        if(column not in last_row):
+            raise ValueError("Order by column '" + column + "' is not part of the selected columns")
+
+        conditions = [ (c + " = " + format_sql_value(last_row[c])) for c, _ in columns[:i] ]
+        conditions.append(column + (" < " if descending else " > ") + format_sql_value(last_row[column]))
+        terms.append("(" + " AND ".join(conditions) + ")")
+
+    return("(" + " OR ".join(terms) + ")")
+
+def get_page_clause(where_clause, order_by, last_row):
+    # Where clause of the page following last_row (None for the first page)
+    if(last_row is None):
+        return(where_clause)
+
+    keyset = build_keyset_clause(order_by, last_row)
+
+    return(keyset if (not where_clause) else ("(" + where_clause + ") AND " + keyset))
+
+def iter_keyset_pages(fetch, where_clause, order_by, page_size, after = None):
+    """
+    Yield the pages of a query using keyset pagination
+
+    :param fetch: Function issuing the query: fetch(where_clause, maxhits, order_by) returns the rows
+    :type fetch: function
+    :param where_clause: Where clause (SQL syntax) of the query
+    :type where_clause: string
+    :param order_by: Unique order by condition (e.g. 'FIRST_SEEN, FLOW_ID')
+    :type order_by: string
+    :param page_size: The number of rows per page
+    :type page_size: int
+    :param after: Resume after this row (e.g. the last row of a previous run)
+    :type after: object
+    :return: Pages (lists) of rows
+    :rtype: generator
+    """
+    if(len(parse_order_by(order_by)) == 0):
+        raise ValueError("Keyset pagination requires an order by condition")
+
+    last_row = after
+
+    while(True):
+        rows = fetch(get_page_clause(where_clause, order_by, last_row), page_size, order_by) or []
+
+        if(len(rows) > 0):
+            yield(rows)
+            last_row = rows[-1]
+
+        if(len(rows) < page_size):
+            return
+
+async def async_iter_keyset_pages(fetch, where_clause, order_by, page_size, after = None):
+    """
+    Yield the pages of a query using keyset pagination, from asyncio code (see iter_keyset_pages)
+
+    :param fetch: Coroutine function issuing the query: await fetch(where_clause, maxhits, order_by) returns the rows
+    :type fetch: function
+    :param where_clause: Where clause (SQL syntax) of the query
+    :type where_clause: string
+    :param order_by: Unique order by condition (e.g. 'FIRST_SEEN, FLOW_ID')
+    :type order_by: string
+    :param page_size: The number of rows per page
+    :type page_size: int
+    :param after: Resume after this row (e.g. the last row of a previous run)
+    :type after: object
+    :return: Pages (lists) of rows
+    :rtype: async generator
+    """
+    if(len(parse_order_by(order_by)) == 0):
+        raise ValueError("Keyset pagination requires an order by condition")
+
+    last_row = after
+
+    while(True):
+        rows = (await fetch(get_page_clause(where_clause, order_by, last_row), page_size, order_by)) or []
+
+        if(len(rows) > 0):
+            yield(rows)
+            last_row = rows[-1]
+
+        if(len(rows) < page_size):
+            return
@@ -0,0 +1,203 @@
+"""
+Profiler
+====================================
+The QueryProfiler class breaks down the time spent by historical queries:
+
+- time to first byte (the request is sent and ntopng runs the query: database and Lua REST layer)
+- transfer time (the response body is received)
+- decode time (the JSON response is decoded in Python)
+
+together with the response size, the number of rows and the exact parameters
+(clauses) sent. Queries are also grouped by shape (the query with literals replaced by
+'?') and ranked, to find the query patterns worth optimizing (e.g. adding indexes or
+rewriting the where clause).
+"""
+
+import re
+import time
+import threading
+from collections import deque
+
+LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+def get_query_shape(url, params):
+    """
+    Return the shape of a query: the endpoint and the parameters with literals replaced by '?'
+
+    :param url: The endpoint URL
+    :type url: string
+    :param params: The query parameters
+    :type params: object
+    :return: The query shape
+    :rtype: string
+    """
+    items = []
+
+    for key in sorted((params or {}).keys()):
+        value = params[key]
+
+        if((value is None) or (value == "")):
+            continue
+        elif(isinstance(value, str)):
+            value = LITERAL_RE.sub("?", " ".join(value.split()))
+        else:
+            value = "?"
+
+        items.append(key + "=" + value)
+
+    return(url + " " + " ".join(items))
+
+def count_rows(rsp):
+    if(isinstance(rsp, list)):
+        return(len(rsp))
+    elif(isinstance(rsp, dict)):
+        for key in ("data", "records", "series"):
+            if(isinstance(rsp.get(key), list)):
+                return(len(rsp[key]))
+
+    return(None)
+
+class QueryShapeStats:
+    def __init__(self, shape):
+        self.shape   = shape
+        self.count   = 0
+        self.total   = 0.0
+        self.ttfb    = 0.0
+        self.max     = 0.0
+        self.bytes   = 0
+        self.rows    = 0
+        self.slowest = None
+
+    def observe(self, record):
+        self.count += 1
+        self.total += record["total"]
+        self.ttfb  += record["ttfb"]
+        self.bytes += record["bytes"]
+        self.rows  += record["rows"] or 0
+
+        if(record["total"] >= self.max):
+            self.max     = record["total"]
+            self.slowest = record
+
+    def get_stats(self):
+        return({ "shape": self.shape, "count": self.count, "total": self.total, "max": self.max,
+                 "avg": self.total / self.count, "avg_ttfb": self.ttfb / self.count,
+                 "bytes": self.bytes, "rows": self.rows, "slowest": self.slowest })
+
+class QueryProfiler:
+    """
+    QueryProfiler records the time breakdown of the queries issued through it
+    """
+    def __init__(self, max_records = 1000):
+        """
+        Construct a new QueryProfiler object
+
+        :param max_records: The number of most recent queries kept in the log
+        :type max_records: int
+        """
+        self.records = deque(maxlen = max_records)
+        self.shapes  = {}
+        self.lock    = threading.Lock()
+
+    def run(self, ntopng_obj, method, url, params):
+        """
+        Issue a query through the ntopng handle recording its profile
+
+        :param ntopng_obj: The ntopng handle
+        :type ntopng_obj: Ntopng
+        :param method: The HTTP method (GET or POST)
+        :type method: string
+        :param url: The endpoint URL (e.g. /lua/rest/v2/get/alert/list/alerts.lua)
+        :type url: string
+        :param params: The query parameters
+        :type params: object
+        :return: The response (rsp)
+        :rtype: object
+        """
+        api_url = ntopng_obj.url + url
+        start   = time.perf_counter()
+
+        # With stream the call returns as soon as the response headers are received
+        if(method == "POST"):
+            response = ntopng_obj.issue_post_request(api_url, params, stream = True)
+        else:
+            response = ntopng_obj.issue_request(api_url, params, stream = True)
+
+        ttfb = time.perf_counter() - start
+
+        try:
+            content = response.content
+        finally:
+            response.close()
+
+        # The call was recorded when the headers were received
+        ntopng_obj.metrics.observe_response_bytes(method, api_url, len(content))
+
+        transfer = time.perf_counter() - start - ttfb
+        record = { "method": method, "url": url, "params": dict(params or {}), "status": response.status_code,
+                   "ttfb": ttfb, "transfer": transfer, "decode": 0.0, "bytes": len(content), "rows": None,
+                   "timestamp": time.time() }
+
+        try:
+            if response.status_code != 200:
+                raise Exception("Invalid response code " + str(response.status_code))
+
+            decode_start = time.perf_counter()
+            rsp = ntopng_obj.decode_response(method, api_url, response)['rsp']
+            record["decode"] = time.perf_counter() - decode_start
+            record["rows"]   = count_rows(rsp)
+        finally:
+            record["total"] = time.perf_counter() - start
+            self.observe(record)
+
+        return(rsp)
+
+    def observe(self, record):
+        shape = get_query_shape(record["url"], record["params"])
+        record["shape"] = shape
+
+        with self.lock:
+            self.records.append(record)
+
+            stats = self.shapes.get(shape)
+
+            if(stats is None):
+                stats = QueryShapeStats(shape)
+                self.shapes[shape] = stats
+
+            stats.observe(record)
+
+    def get_records(self):
+        """
+        Return the profile of the most recent queries (ttfb, transfer, decode and total time in seconds,
+        bytes, rows, status and the exact parameters sent)
+
+        :return: The query profiles
+        :rtype: array
+        """
+        with self.lock:
+            return(list(self.records))
+
+    def get_slowest_shapes(self, n = 10, by = "total"):
+        """
+        Return the query shapes ranked by time spent
+
+        :param n: The number of shapes
+        :type n: int
+        :param by: The ranking criteria: total (time spent by all the queries of a shape), max or avg
+        :type by: string
+        :return: The shapes statistics, each with the slowest query of the shape
+        :rtype: array
+        """
+        with self.lock:
+            stats = [ s.get_stats() for s in self.shapes.values() ]
+
+        return(sorted(stats, key = lambda s: s[by], reverse = True)[:n])
+
+    def reset(self):
+        """
+        Drop the recorded profiles
+        """
+        with self.lock:
+            self.records.clear()
+            self.shapes.clear()
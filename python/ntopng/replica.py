@@ -0,0 +1,356 @@
+"""
+Replica
+====================================
+The FlowReplica class keeps an incremental local copy of the historical flows of
+selected interfaces in a SQLite database, indexed on time, addresses and L7
+protocol, so that repeated exploratory queries over the last days of traffic are
+answered locally instead of hitting the ntopng (ClickHouse) database.
+
+Each sync only reads the flows after the covered range (watermark). The range
+start is moved back by an overlap plus the max flow duration, so that flows written
+late (e.g. long flows, written when they end) are not missed; duplicates are
+discarded by the unique key. Queries whose time range is covered are answered
+locally, the others (or those using SQL not understood by SQLite) are sent to ntopng.
+
+Times are stored as epoch: datetime literals ('YYYY-MM-DD hh:mm:ss', toDateTime())
+in the where clause are translated to epoch, and the time columns of the results are
+returned as 'YYYY-MM-DD hh:mm:ss' as ntopng does.
+"""
+
+import re
+import json
+import time
+import sqlite3
+import threading
+
+from .alert_follower import get_epoch
+from .pagination import split_select_clause
+
+DEFAULT_REPLICA_COLUMNS = [ "FLOW_ID", "FIRST_SEEN", "LAST_SEEN", "VLAN_ID", "PROTOCOL",
+                            "IPV4_SRC_ADDR", "IPV6_SRC_ADDR", "IP_SRC_PORT", "IPV4_DST_ADDR", "IPV6_DST_ADDR", "IP_DST_PORT",
+                            "L7_PROTO", "L7_PROTO_MASTER", "L7_CATEGORY", "PACKETS", "TOTAL_BYTES", "SRC2DST_BYTES", "DST2SRC_BYTES",
+                            "SRC_ASN", "DST_ASN", "SCORE" ]
+
+# Columns stored as epoch
+TIME_COLUMNS = ( "FIRST_SEEN", "LAST_SEEN" )
+
+# Time literals translated to epoch in the where clause
+TO_DATETIME_CALL = re.compile(r"toDateTime\(\s*('\d{4}-\d{2}-\d{2}(?: \d{2}:\d{2}:\d{2})?'|\d+)\s*\)")
+DATETIME_LITERAL = re.compile(r"'(\d{4}-\d{2}-\d{2}(?: \d{2}:\d{2}:\d{2})?)'")
+
+# Select expressions returning a time column
+TIME_EXPRESSION = re.compile(r"^(?:(?:MIN|MAX|ANY)\s*\(\s*)?(?:" + "|".join(TIME_COLUMNS) + r")(?:\s*\))?$", re.IGNORECASE)
+
+# Indexes created on the replica (besides the unique key)
+REPLICA_INDEXES = [ ("FIRST_SEEN",), ("IPV4_SRC_ADDR",), ("IPV4_DST_ADDR",), ("IPV6_SRC_ADDR",), ("IPV6_DST_ADDR",), ("L7_PROTO",) ]
+
+def get_literal_epoch(literal):
+    literal = literal.strip("'")
+
+    if(len(literal) == 10):
+        literal += " 00:00:00"
+
+    return(str(get_epoch(literal)))
+
+def translate_where_clause(where_clause):
+    """
+    Translate the datetime literals of a where clause (ClickHouse syntax) to epoch
+
+    :param where_clause: Where clause (SQL syntax)
+    :type where_clause: string
+    :return: The where clause with epoch times
+    :rtype: string
+    """
+    if(not where_clause):
+        return(where_clause)
+
+    where_clause = TO_DATETIME_CALL.sub(lambda m: get_literal_epoch(m.group(1)), where_clause)
+
+    return(DATETIME_LITERAL.sub(lambda m: get_literal_epoch(m.group(1)), where_clause))
+
+def get_time_keys(select_clause):
+    # The result keys holding a time column
+    keys = set()
+
+    for item in split_select_clause(select_clause):
+        m = re.match(r"^(.*?)\s+AS\s+(\w+)$", item, re.IGNORECASE)
+        expression, key = (m.group(1).strip(), m.group(2)) if m else (item, item)
+
+        if(expression == "*"):
+            keys.update(TIME_COLUMNS)
+        elif(TIME_EXPRESSION.match(expression)):
+            keys.add(key)
+
+    return(keys)
+
+def format_epoch(epoch):
+    return(time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(epoch)))
+
+class FlowReplica:
+    """
+    FlowReplica keeps a local SQLite copy of historical flows and answers queries from it
+
+    :param historical: The Historical handle
+    :param db_path: The SQLite database file
+    """
+    def __init__(self, historical, db_path, columns = None, page_size = 10000, overlap = 600, max_flow_duration = 3600):
+        """
+        Construct a new FlowReplica object
+
+        :param historical: The Historical handle
+        :type historical: Historical
+        :param db_path: The SQLite database file (':memory:' for an in-memory replica)
+        :type db_path: string
+        :param columns: The replicated columns (default: time, addresses, ports, protocols, counters, score)
+        :type columns: array
+        :param page_size: The number of flows read per query while syncing
+        :type page_size: int
+        :param overlap: Seconds read again at each sync to catch flows written late
+        :type overlap: int
+        :param max_flow_duration: The max duration (seconds) of a flow: flows are written when they end, so each sync also reads again the flows started this long before the watermark
+        :type max_flow_duration: int
+        """
+        self.historical = historical
+        self.db_path    = db_path
+        self.columns    = list(columns or DEFAULT_REPLICA_COLUMNS)
+        self.page_size  = page_size
+        self.overlap    = overlap
+        self.max_flow_duration = max_flow_duration
+        self.lock       = threading.Lock()
+        self.stats      = { "synced_flows": 0, "local_queries": 0, "remote_queries": 0 }
+
+        for column in ("FLOW_ID",) + TIME_COLUMNS:
+            if(column not in self.columns):
+                raise ValueError("The replica requires column '" + column + "'")
+
+        self.db = sqlite3.connect(db_path, check_same_thread = False)
+        self.db.row_factory = sqlite3.Row
+        self.create_schema()
+
+    def create_schema(self):
+        columns = ", ".join([ (c + " INTEGER") if (c in TIME_COLUMNS) else c for c in self.columns ])
+
+        with self.lock, self.db:
+            self.db.execute("CREATE TABLE IF NOT EXISTS flows (INTERFACE_ID INTEGER, " + columns + ", UNIQUE (INTERFACE_ID, FIRST_SEEN, FLOW_ID))")
+            self.db.execute("CREATE TABLE IF NOT EXISTS sync_state (INTERFACE_ID INTEGER PRIMARY KEY, covered_begin INTEGER, covered_end INTEGER, "
+                            + "sync_begin INTEGER, sync_end INTEGER, last_row TEXT)")
+
+            for index in REPLICA_INDEXES:
+                if(all([ (c in self.columns) for c in index ])):
+                    name = "flows_" + "_".join(index).lower()
+                    self.db.execute("CREATE INDEX IF NOT EXISTS " + name + " ON flows (INTERFACE_ID, " + ", ".join(index) + ")")
+
+    def get_state(self, ifid):
+        """
+        Return the sync state of an interface: the covered range (watermark) and the sync in progress
+
+        :param ifid: The interface ID
+        :type ifid: int
+        :return: The sync state (None if the interface was never synced)
+        :rtype: object
+        """
+        with self.lock:
+            row = self.db.execute("SELECT * FROM sync_state WHERE INTERFACE_ID = ?", (int(ifid),)).fetchone()
+
+        if(row is None):
+            return(None)
+
+        state = dict(row)
+        state["last_row"] = json.loads(state["last_row"]) if state["last_row"] else None
+
+        return(state)
+
+    def save_state(self, ifid, covered_begin, covered_end, sync_begin, sync_end, last_row):
+        self.db.execute("INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?, ?, ?, ?)",
+                        (int(ifid), covered_begin, covered_end, sync_begin, sync_end, json.dumps(last_row) if last_row else None))
+
+    def insert(self, ifid, rows):
+        placeholders = ", ".join([ "?" ] * (len(self.columns) + 1))
+        values = []
+
+        for row in rows:
+            value = [ int(ifid) ]
+
+            for column in self.columns:
+                v = row.get(column)
+                value.append(get_epoch(v) if (column in TIME_COLUMNS) else v)
+
+            values.append(value)
+
+        self.db.executemany("INSERT OR IGNORE INTO flows (INTERFACE_ID, " + ", ".join(self.columns) + ") VALUES (" + placeholders + ")", values)
+
+    def sync(self, ifid, epoch_begin = None, epoch_end = None):
+        """
+        Copy the flows of an interface not yet replicated, up to epoch_end. The first sync
+        copies [epoch_begin, epoch_end], the following ones continue from the watermark.
+        An interrupted sync is resumed from the last page copied.
+
+        :param ifid: The interface ID
+        :type ifid: int
+        :param epoch_begin: Start of the range to replicate on the first sync (default: the last 24 hours)
+        :type epoch_begin: int
+        :param epoch_end: End of the range to replicate (default: now)
+        :type epoch_end: int
+        :return: The number of flows read
+        :rtype: int
+        """
+        epoch_end = int(epoch_end if (epoch_end is not None) else time.time())
+        state     = self.get_state(ifid)
+        after     = None
+
+        if((state is not None) and (state["sync_end"] is not None)):
+            # Resume the interrupted sync
+            covered_begin, covered_end = state["covered_begin"], state["covered_end"]
+            sync_begin, sync_end = state["sync_begin"], state["sync_end"]
+            after = state["last_row"]
+        elif(state is not None):
+            covered_begin, covered_end = state["covered_begin"], state["covered_end"]
+
+            if(epoch_end <= covered_end):
+                return(0)
+
+            sync_begin, sync_end = max(covered_end - self.overlap - self.max_flow_duration, covered_begin), epoch_end
+        else:
+            covered_begin = int(epoch_begin if (epoch_begin is not None) else (epoch_end - 86400))
+            covered_end   = None
+            sync_begin, sync_end = covered_begin, epoch_end
+
+        with self.lock, self.db:
+            self.save_state(ifid, covered_begin, covered_end, sync_begin, sync_end, after)
+
+        num = 0
+
+        for page in self.historical.iter_flows_pages(ifid, sync_begin, sync_end, ",".join(self.columns), None, self.page_size, "FIRST_SEEN, FLOW_ID", after):
+            with self.lock, self.db:
+                # The page and the position reached are committed together
+                self.insert(ifid, page)
+                self.save_state(ifid, covered_begin, covered_end, sync_begin, sync_end, page[-1])
+
+            num += len(page)
+
+        with self.lock, self.db:
+            self.save_state(ifid, covered_begin, max(sync_end, covered_end or sync_end), None, None, None)
+            self.stats["synced_flows"] += num
+
+        return(num)
+
+    def prune(self, ifid, epoch):
+        """
+        Remove the flows started before epoch, moving the start of the covered range
+
+        :param ifid: The interface ID
+        :type ifid: int
+        :param epoch: The new start of the covered range
+        :type epoch: int
+        """
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM flows WHERE INTERFACE_ID = ? AND FIRST_SEEN < ?", (int(ifid), int(epoch)))
+            self.db.execute("UPDATE sync_state SET covered_begin = MAX(covered_begin, ?) WHERE INTERFACE_ID = ?", (int(epoch), int(ifid)))
+
+    def is_covered(self, ifid, epoch_begin, epoch_end):
+        """
+        Check whether a time range is available in the replica
+
+        :param ifid: The interface ID
+        :type ifid: int
+        :param epoch_begin: Start of the time interval (epoch)
+        :type epoch_begin: int
+        :param epoch_end: End of the time interval (epoch)
+        :type epoch_end: int
+        :return: True if the range is covered
+        :rtype: boolean
+        """
+        state = self.get_state(ifid)
+
+        return((state is not None) and (state["covered_end"] is not None)
+               and (state["covered_begin"] <= int(epoch_begin)) and (int(epoch_end) <= state["covered_end"]))
+
+    def query(self, ifid, epoch_begin, epoch_end, select_clause, where_clause, maxhits, group_by, order_by):
+        """
+        Run a query on the replica (SQLite syntax, datetime literals are translated to epoch),
+        regardless of the covered range
+
+        :return: Query result (time columns as 'YYYY-MM-DD hh:mm:ss')
+        :rtype: array
+        """
+        sql = "SELECT " + select_clause + " FROM flows WHERE INTERFACE_ID = ? AND FIRST_SEEN >= ? AND LAST_SEEN <= ?"
+        where_clause = translate_where_clause(where_clause)
+
+        if(where_clause):
+            sql += " AND (" + where_clause + ")"
+        if(group_by):
+            sql += " GROUP BY " + group_by
+        if(order_by):
+            sql += " ORDER BY " + order_by
+        if(maxhits is not None):
+            sql += " LIMIT " + str(int(maxhits))
+
+        with self.lock:
+            rows = self.db.execute(sql, (int(ifid), int(epoch_begin), int(epoch_end))).fetchall()
+
+        rows = [ dict(row) for row in rows ]
+        keys = [ k for k in get_time_keys(select_clause) if (len(rows) > 0) and (k in rows[0]) ]
+
+        for row in rows:
+            for k in keys:
+                if(isinstance(row[k], int)):
+                    row[k] = format_epoch(row[k])
+
+        return(rows)
+
+    def get_flows(self, ifid, epoch_begin, epoch_end, select_clause, where_clause, maxhits, group_by, order_by):
+        """
+        Run a query on the historical flows: answered by the replica when the time range is
+        covered, by ntopng otherwise (or when the clauses are not valid SQLite syntax)
+
+        :param ifid: The interface ID
+        :type ifid: int
+        :param epoch_begin: Start of the time interval (epoch)
+        :type epoch_begin: int
+        :param epoch_end: End of the time interval (epoch)
+        :type epoch_end: int
+        :param select_clause: Select clause (SQL syntax)
+        :type select_clause: string
+        :param where_clause: Where clause (SQL syntax)
+        :type where_clause: string
+        :param maxhits: Max number of results (limit)
+        :type maxhits: int
+        :param group_by: Group by condition (SQL syntax)
+        :type group_by: string
+        :param order_by: Order by condition (SQL syntax)
+        :type order_by: string
+        :return: Query result
+        :rtype: array
+        """
+        if(self.is_covered(ifid, epoch_begin, epoch_end)):
+            try:
+                rows = self.query(ifid, epoch_begin, epoch_end, select_clause, where_clause, maxhits, group_by, order_by)
+
+                with self.lock:
+                    self.stats["local_queries"] += 1
+
+                return(rows)
+            except sqlite3.Error:
+                pass
+
+        with self.lock:
+            self.stats["remote_queries"] += 1
+
+        return(self.historical.get_flows(ifid, epoch_begin, epoch_end, select_clause, where_clause, maxhits, group_by, order_by))
+
+    def get_stats(self):
+        """
+        Return statistics (flows synced, queries answered locally and by ntopng, replicated flows)
+
+        :return: The replica statistics
+        :rtype: object
+        """
+        with self.lock:
+            stats = dict(self.stats)
+            stats["flows"] = self.db.execute("SELECT COUNT(*) FROM flows").fetchone()[0]
+
+        return(stats)
+
+    def close(self):
+        with self.lock:
+            self.db.close()
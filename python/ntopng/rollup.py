@@ -0,0 +1,326 @@
+"""
+Rollup
+====================================
+The FlowRollups class maintains local hourly and daily aggregates of the historical
+flows (bytes, packets and flows per host, L7 protocol and hour/day) in a SQLite
+database. By default a flow is accounted to both its hosts (client and server, IPv4
+or IPv6), identified by their IP address: with this (default) host expression results
+must be grouped by host, as totals per L7 protocol would count each flow twice.
+
+Each update only aggregates the hours closed since the previous update (one grouped
+query per batch of hours), so the cost of keeping the rollups current depends on the
+number of new hours, not on the reported range. The last closed hours are aggregated
+again at each update, to account the flows written late. Grouped queries are answered
+from the rollups for the whole hours they cover and from ntopng for the partial
+buckets at the edges of the range (or the hours not yet rolled up). Aggregation
+queries reaching max_rows_per_query rows are split, or raise an exception when they
+cannot be split, instead of returning truncated totals.
+"""
+
+import time
+import sqlite3
+import threading
+
+HOUR = 3600
+DAY  = 86400
+
+ROLLUP_GROUP_COLUMNS = ( "host", "L7_PROTO" )
+ROLLUP_VALUE_COLUMNS = ( "bytes", "packets", "flows" )
+
+def get_host_address(side):
+    # The IPv4 or IPv6 address of the flow side (SRC or DST) as string
+    return("if(IPV4_" + side + "_ADDR != 0, IPv4NumToString(IPV4_" + side + "_ADDR), IPv6NumToString(IPV6_" + side + "_ADDR))")
+
+# One row per host of the flow (client and server, once if they are the same host)
+DEFAULT_HOST_EXPRESSION = "arrayJoin(arrayDistinct([" + get_host_address("SRC") + ", " + get_host_address("DST") + "]))"
+
+def normalize_key(host, l7_proto):
+    # Values may be returned as numbers or strings: normalize them to match local and remote rows
+    try:
+        l7_proto = int(l7_proto)
+    except (TypeError, ValueError):
+        pass
+
+    return(str(host), l7_proto)
+
+class FlowRollups:
+    """
+    FlowRollups maintains hourly and daily flow aggregates per host and L7 protocol
+
+    :param historical: The Historical handle
+    :param db_path: The SQLite database file
+    """
+    def __init__(self, historical, db_path, host_column = None, closed_after = 600, max_hours_per_query = 24, max_rows_per_query = 1000000, recompute_hours = 2):
+        """
+        Construct a new FlowRollups object
+
+        :param historical: The Historical handle
+        :type historical: Historical
+        :param db_path: The SQLite database file (':memory:' for in-memory rollups)
+        :type db_path: string
+        :param host_column: The flows column (or expression) identifying the host (default: the client and server IPv4/IPv6 addresses)
+        :type host_column: string
+        :param closed_after: Seconds after the end of an hour after which the hour is rolled up
+        :type closed_after: int
+        :param max_hours_per_query: The max number of hours aggregated by a single query
+        :type max_hours_per_query: int
+        :param max_rows_per_query: The maxhits of the aggregation queries (batches returning more rows are split)
+        :type max_rows_per_query: int
+        :param recompute_hours: The number of closed hours aggregated again at each update (flows written late)
+        :type recompute_hours: int
+        """
+        self.historical          = historical
+        self.host_column         = host_column or DEFAULT_HOST_EXPRESSION
+        self.closed_after        = closed_after
+        self.max_hours_per_query = max_hours_per_query
+        self.max_rows_per_query  = max_rows_per_query
+        self.recompute_hours     = recompute_hours
+        self.lock                = threading.Lock()
+        self.stats               = { "hours_added": 0, "hours_recomputed": 0, "update_queries": 0, "local_queries": 0, "server_queries": 0 }
+
+        self.db = sqlite3.connect(db_path, check_same_thread = False)
+        self.db.row_factory = sqlite3.Row
+        self.create_schema()
+
+    def create_schema(self):
+        with self.lock, self.db:
+            for table, bucket in (("rollup_hourly", "hour"), ("rollup_daily", "day")):
+                self.db.execute("CREATE TABLE IF NOT EXISTS " + table + " (INTERFACE_ID INTEGER, " + bucket + " INTEGER, host TEXT, L7_PROTO INTEGER, "
+                                + "bytes INTEGER, packets INTEGER, flows INTEGER, PRIMARY KEY (INTERFACE_ID, " + bucket + ", host, L7_PROTO))")
+
+            self.db.execute("CREATE TABLE IF NOT EXISTS rollup_state (INTERFACE_ID INTEGER PRIMARY KEY, first_hour INTEGER, next_hour INTEGER)")
+
+    def get_state(self, ifid):
+        """
+        Return the rolled up hours of an interface: [first_hour, next_hour)
+
+        :param ifid: The interface ID
+        :type ifid: int
+        :return: The rollup state (None if the interface was never rolled up)
+        :rtype: object
+        """
+        with self.lock:
+            row = self.db.execute("SELECT * FROM rollup_state WHERE INTERFACE_ID = ?", (int(ifid),)).fetchone()
+
+        return(dict(row) if (row is not None) else None)
+
+    def fetch_server(self, ifid, epoch_begin, epoch_end, by_hour, maxhits):
+        # Flows are assigned to the bucket containing their FIRST_SEEN
+        select_clause = self.host_column + " AS host, L7_PROTO, SUM(TOTAL_BYTES) AS bytes, SUM(PACKETS) AS packets, COUNT(*) AS flows"
+        group_by      = "host, L7_PROTO"
+        where_clause  = "(FIRST_SEEN >= toDateTime(" + str(int(epoch_begin)) + ") AND FIRST_SEEN < toDateTime(" + str(int(epoch_end)) + "))"
+
+        if(by_hour):
+            select_clause = "toUnixTimestamp(toStartOfHour(FIRST_SEEN)) AS hour, " + select_clause
+            group_by      = "hour, " + group_by
+
+        return(self.historical.get_flows(ifid, int(epoch_begin), max(int(epoch_end), int(time.time())), select_clause, where_clause,
+                                         maxhits, group_by, None) or [])
+
+    def check_truncated(self, rows, epoch_begin, epoch_end):
+        # Partial aggregates would be returned as totals
+        if(len(rows) >= self.max_rows_per_query):
+            raise Exception("Aggregation of [" + str(int(epoch_begin)) + ", " + str(int(epoch_end)) + ") truncated at "
+                            + str(self.max_rows_per_query) + " rows (increase max_rows_per_query)")
+
+    def aggregate_hours(self, ifid, begin, end):
+        rows = self.fetch_server(ifid, begin, end, True, self.max_rows_per_query)
+
+        with self.lock:
+            self.stats["update_queries"] += 1
+
+        if((len(rows) >= self.max_rows_per_query) and ((end - begin) > HOUR)):
+            # Too many groups for a single query: split the batch
+            middle = begin + ((end - begin) // (2 * HOUR)) * HOUR
+            return(self.aggregate_hours(ifid, begin, middle) + self.aggregate_hours(ifid, middle, end))
+
+        self.check_truncated(rows, begin, end)
+
+        return(rows)
+
+    def update(self, ifid, epoch_begin = None, now = None):
+        """
+        Roll up the hours closed since the last update, and aggregate again the last recompute_hours closed hours
+
+        :param ifid: The interface ID
+        :type ifid: int
+        :param epoch_begin: The first hour to roll up on the first update (default: the last 24 hours)
+        :type epoch_begin: int
+        :param now: The current time (epoch, default: now)
+        :type now: int
+        :return: The number of hours added (recomputed hours excluded)
+        :rtype: int
+        """
+        now   = int(now if (now is not None) else time.time())
+        last  = ((now - self.closed_after) // HOUR) * HOUR # end of the last closed hour
+        state = self.get_state(ifid)
+
+        if(state is None):
+            first_hour = (int(epoch_begin if (epoch_begin is not None) else (last - DAY)) // HOUR) * HOUR
+            state = { "first_hour": first_hour, "next_hour": first_hour }
+
+        added      = 0
+        recomputed = 0
+        begin      = max(state["next_hour"] - self.recompute_hours * HOUR, state["first_hour"])
+
+        while(begin < last):
+            end   = min(begin + self.max_hours_per_query * HOUR, last)
+            rows  = self.aggregate_hours(ifid, begin, end)
+
+            with self.lock, self.db:
+                # Hours already rolled up are replaced
+                self.db.execute("DELETE FROM rollup_hourly WHERE INTERFACE_ID = ? AND hour >= ? AND hour < ?", (int(ifid), begin, end))
+                self.db.executemany("INSERT OR REPLACE INTO rollup_hourly VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                    [ (int(ifid), int(r["hour"])) + normalize_key(r["host"], r["L7_PROTO"]) + (r["bytes"], r["packets"], r["flows"]) for r in rows ])
+
+                # Recompute the days touched by the batch
+                self.db.execute("DELETE FROM rollup_daily WHERE INTERFACE_ID = ? AND day >= ? AND day < ?", (int(ifid), (begin // DAY) * DAY, end))
+                self.db.execute("INSERT INTO rollup_daily SELECT INTERFACE_ID, (hour / " + str(DAY) + ") * " + str(DAY) + " AS day, host, L7_PROTO, "
+                                + "SUM(bytes), SUM(packets), SUM(flows) FROM rollup_hourly WHERE INTERFACE_ID = ? AND hour >= ? AND hour < ? "
+                                + "GROUP BY day, host, L7_PROTO", (int(ifid), (begin // DAY) * DAY, ((end + DAY - 1) // DAY) * DAY))
+
+                recomputed += max(min(end, state["next_hour"]) - begin, 0) // HOUR
+                added      += (end - max(begin, state["next_hour"])) // HOUR
+                state["next_hour"] = max(end, state["next_hour"])
+                self.db.execute("INSERT OR REPLACE INTO rollup_state VALUES (?, ?, ?)", (int(ifid), state["first_hour"], state["next_hour"]))
+
+            begin = end
+
+        with self.lock:
+            self.stats["hours_added"] += added
+            self.stats["hours_recomputed"] += recomputed
+
+        return(added)
+
+    def query_local(self, ifid, table, bucket, begin, end, granularity):
+        columns = "host, L7_PROTO" + ((", " + bucket) if granularity else "")
+        sql = ("SELECT " + columns + ", SUM(bytes) AS bytes, SUM(packets) AS packets, SUM(flows) AS flows FROM " + table
+               + " WHERE INTERFACE_ID = ? AND " + bucket + " >= ? AND " + bucket + " < ? GROUP BY " + columns)
+        rows = []
+
+        with self.lock:
+            for row in self.db.execute(sql, (int(ifid), int(begin), int(end))).fetchall():
+                row = dict(row)
+
+                if(granularity):
+                    # Hours are mapped to the day they belong to when grouping by day
+                    row[granularity] = (row.pop(bucket) // (HOUR if (granularity == "hour") else DAY)) * (HOUR if (granularity == "hour") else DAY)
+
+                rows.append(row)
+
+        return(rows)
+
+    def get_flows(self, ifid, epoch_begin, epoch_end, group_by = ROLLUP_GROUP_COLUMNS, granularity = None, maxhits = None, order_by = "bytes"):
+        """
+        Return bytes, packets and flows grouped by host and/or L7 protocol (and optionally by hour or day).
+        Whole hours already rolled up are read from the local rollups (whole days from the daily
+        rollups), the rest of the range is queried to ntopng.
+
+        :param ifid: The interface ID
+        :type ifid: int
+        :param epoch_begin: Start of the time interval (epoch)
+        :type epoch_begin: int
+        :param epoch_end: End of the time interval (epoch)
+        :type epoch_end: int
+        :param group_by: The group columns (host, L7_PROTO; host is required with the default host expression)
+        :type group_by: array
+        :param granularity: Also group by time bucket (hour or day; None for the whole range)
+        :type granularity: string
+        :param maxhits: Max number of results (None for no limit)
+        :type maxhits: int
+        :param order_by: The value sorting the results, descending (bytes, packets, flows)
+        :type order_by: string
+        :return: Query result
+        :rtype: array
+        """
+        group_by = [ c for c in ROLLUP_GROUP_COLUMNS if (c in group_by) ]
+
+        if(("host" not in group_by) and ("arrayJoin" in self.host_column)):
+            # Each flow is accounted to more than one host: summing the hosts counts it twice
+            raise ValueError("The host expression accounts a flow to both its hosts: group by host, or use a single host column")
+        if(granularity not in (None, "hour", "day")):
+            raise ValueError("Unknown granularity '" + str(granularity) + "'")
+        if(order_by not in ROLLUP_VALUE_COLUMNS):
+            raise ValueError("Unknown order by '" + str(order_by) + "'")
+
+        epoch_begin = int(epoch_begin)
+        epoch_end   = int(epoch_end)
+        state       = self.get_state(ifid)
+        parts       = []
+
+        # Whole hours of the range that are rolled up
+        first = max(((epoch_begin + HOUR - 1) // HOUR) * HOUR, state["first_hour"]) if state else epoch_end
+        last  = min((epoch_end // HOUR) * HOUR, state["next_hour"]) if state else epoch_end
+
+        if(first < last):
+            # Whole days are read from the daily rollups (unless grouping by hour)
+            day_first = ((first + DAY - 1) // DAY) * DAY
+            day_last  = (last // DAY) * DAY
+
+            if((granularity != "hour") and (day_first < day_last)):
+                parts.append(self.query_local(ifid, "rollup_daily", "day", day_first, day_last, granularity))
+                hourly = [ (first, day_first), (day_last, last) ]
+            else:
+                hourly = [ (first, last) ]
+
+            for begin, end in hourly:
+                if(begin < end):
+                    parts.append(self.query_local(ifid, "rollup_hourly", "hour", begin, end, granularity))
+
+            with self.lock:
+                self.stats["local_queries"] += 1
+
+            remote = [ (epoch_begin, first), (last, epoch_end) ]
+        else:
+            remote = [ (epoch_begin, epoch_end) ]
+
+        for begin, end in remote:
+            if(begin < end):
+                rows = self.fetch_server(ifid, begin, end, granularity is not None, self.max_rows_per_query)
+                self.check_truncated(rows, begin, end)
+
+                for row in rows:
+                    if(granularity is not None):
+                        row[granularity] = (int(row.pop("hour")) // (HOUR if (granularity == "hour") else DAY)) * (HOUR if (granularity == "hour") else DAY)
+
+                    row["host"], row["L7_PROTO"] = normalize_key(row["host"], row["L7_PROTO"])
+
+                with self.lock:
+                    self.stats["server_queries"] += 1
+
+                parts.append(rows)
+
+        # Merge the partial aggregates
+        key_columns = group_by + ([ granularity ] if granularity else [])
+        merged = {}
+
+        for rows in parts:
+            for row in rows:
+                key = tuple(row[c] for c in key_columns)
+                entry = merged.get(key)
+
+                if(entry is None):
+                    entry = { c: row[c] for c in key_columns }
+                    entry.update({ v: 0 for v in ROLLUP_VALUE_COLUMNS })
+                    merged[key] = entry
+
+                for v in ROLLUP_VALUE_COLUMNS:
+                    entry[v] += int(row[v] or 0)
+
+        result = sorted(merged.values(), key = lambda r: r[order_by], reverse = True)
+
+        return(result[:maxhits] if (maxhits is not None) else result)
+
+    def get_stats(self):
+        """
+        Return statistics (hours added and recomputed, update queries, queries answered with local rollups, queries sent to ntopng)
+
+        :return: The rollup statistics
+        :rtype: object
+        """
+        with self.lock:
+            return(dict(self.stats))
+
+    def close(self):
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,190 @@
+"""
+Session
+====================================
+The SessionPool class keeps a pool of persistent (keep-alive) HTTP connections
+towards an ntopng instance, so that consecutive REST calls do not pay a new
+TCP (and TLS) handshake each time.
+
+Pools are registered per ntopng URL and shared by all the Ntopng handles and
+threads talking to that URL: use get_session_pool() to obtain one. A pool grows
+when a larger size is requested for its URL (it never shrinks).
+"""
+
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+class SessionPool:
+    """
+    SessionPool provides thread-safe pooled connections to a single ntopng URL
+
+    :param url: The ntopng URL (e.g. http://localhost:3000)
+    :param pool_size: The max number of connections kept open towards the URL
+    """
+    def __init__(self, url, pool_size = 10, pool_block = False):
+        """
+        Construct a new SessionPool object
+
+        :param url: The ntopng URL (e.g. http://localhost:3000)
+        :type url: string
+        :param pool_size: The max number of connections kept open towards the URL
+        :type pool_size: int
+        :param pool_block: Wait for a free connection instead of opening an extra (not pooled) one when the pool is exhausted
+        :type pool_block: boolean
+        """
+        self.url        = url
+        self.pool_size  = pool_size
+        self.pool_block = pool_block
+
+        # The adapter (hence the urllib3 connection pool) is shared by all threads,
+        # whereas each thread has its own Session (cookies are not thread-safe)
+        self.adapter = HTTPAdapter(pool_connections = 4, pool_maxsize = pool_size, pool_block = pool_block)
+        self.local   = threading.local()
+        self.lock    = threading.Lock()
+        self.num_sessions = 0
+        self.retired_requests    = 0 # counters of the connection pools replaced by resize
+        self.retired_connections = 0
+
+    def get_session(self):
+        """
+        Return the Session of the calling thread (created on first use)
+
+        :return: The thread session
+        :rtype: requests.Session
+        """
+        session = getattr(self.local, "session", None)
+
+        if(session is None):
+            session = requests.Session()
+            session.mount("http://", self.adapter)
+            session.mount("https://", self.adapter)
+            self.local.session = session
+
+            with self.lock:
+                self.num_sessions += 1
+
+        return(session)
+
+    def resize(self, pool_size):
+        """
+        Grow the pool to the specified number of connections (a smaller size is ignored)
+
+        :param pool_size: The max number of connections kept open towards the URL
+        :type pool_size: int
+        """
+        with self.lock:
+            if(pool_size <= self.pool_size):
+                return
+
+            # Sessions keep the adapter: replace its connection pools. Idle connections
+            # of the old pools are closed, busy ones are closed when released.
+            old_manager = self.adapter.poolmanager
+            requests_count, connections_count = self.get_counters(old_manager)
+
+            self.adapter.init_poolmanager(4, pool_size, block = self.pool_block)
+            self.pool_size = pool_size
+            self.retired_requests    += requests_count
+            self.retired_connections += connections_count
+
+        old_manager.clear()
+
+    # internal method returning the requests and new connections of a pool manager
+    def get_counters(self, manager):
+        num_requests    = 0
+        num_connections = 0
+        pools = manager.pools
+
+        for key in pools.keys():
+            pool = pools.get(key)
+
+            if(pool is not None):
+                num_requests    += pool.num_requests
+                num_connections += pool.num_connections
+
+        return(num_requests, num_connections)
+
+    def get(self, url, **kwargs):
+        """
+        Issue a GET request using a pooled connection
+
+        :param url: The URL to request
+        :type url: string
+        :return: The response
+        :rtype: requests.Response
+        """
+        return(self.get_session().get(url, **kwargs))
+
+    def post(self, url, **kwargs):
+        """
+        Issue a POST request using a pooled connection
+
+        :param url: The URL to request
+        :type url: string
+        :return: The response
+        :rtype: requests.Response
+        """
+        return(self.get_session().post(url, **kwargs))
+
+    def get_stats(self):
+        """
+        Return statistics about the connections handled by the pool
+
+        :return: Number of requests, new and reused connections, pool size and sessions
+        :rtype: object
+        """
+        num_requests, num_connections = self.get_counters(self.adapter.poolmanager)
+        num_requests    += self.retired_requests
+        num_connections += self.retired_connections
+
+        return({ "url": self.url,
+                 "pool_size": self.pool_size,
+                 "pool_block": self.pool_block,
+                 "sessions": self.num_sessions,
+                 "requests": num_requests,
+                 "new_connections": num_connections,
+                 "reused_connections": max(num_requests - num_connections, 0) })
+
+    def close(self):
+        """
+        Close all the connections of the pool
+        """
+        self.adapter.close()
+
+
+pools      = {}
+pools_lock = threading.Lock()
+
+def get_session_pool(url, pool_size = 10, pool_block = False):
+    """
+    Return the SessionPool for the specified ntopng URL, creating it if needed.
+    The pool is grown if a larger size than the current one is requested.
+
+    :param url: The ntopng URL (e.g. http://localhost:3000)
+    :type url: string
+    :param pool_size: The max number of connections kept open towards the URL
+    :type pool_size: int
+    :param pool_block: Wait for a free connection when the pool is exhausted
+    :type pool_block: boolean
+    :return: The session pool
+    :rtype: SessionPool
+    """
+    with pools_lock:
+        pool = pools.get(url)
+
+        if(pool is None):
+            pool = SessionPool(url, pool_size, pool_block)
+            pools[url] = pool
+        elif(pool_size > pool.pool_size):
+            pool.resize(pool_size)
+
+        return(pool)
+
+def close_session_pools():
+    """
+    Close and forget all the registered session pools
+    """
+    with pools_lock:
+        for pool in pools.values():
+            pool.close()
+
+        pools.clear()
@@ -0,0 +1,227 @@
+"""
+Stream
+====================================
+Incremental decoding of REST responses. Instead of loading the whole response body
+and decoding it into a single object, iter_json_items() parses the body chunk by
+chunk and yields the elements of the list found at the given path (e.g. the 'rsp'
+list) as soon as they are received.
+
+Memory usage is bounded by the size of a single element plus one chunk.
+"""
+
+import json
+import codecs
+
+WHITESPACE = " \t\n\r"
+NUMBER_CHARS = "0123456789.eE+-"
+
+# Yielded by JSONStreamParser.events() when the parser needs the next chunk
+NEED_DATA = object()
+
+class JSONStreamParser:
+    """
+    JSONStreamParser decodes a JSON document from a sequence of byte chunks
+
+    The parser does no I/O: events() yields NEED_DATA whenever it needs more input,
+    which is then provided with feed() (or feed_eof() at the end of the body), so the
+    same parser serves both blocking (items()) and asyncio readers.
+
+    :param chunks: Iterable of bytes (e.g. response.iter_content()), read by items()
+    """
+    def __init__(self, chunks = None):
+        self.chunks       = iter(chunks) if (chunks is not None) else None
+        self.decoder      = json.JSONDecoder()
+        self.text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buf          = ""
+        self.pos          = 0
+        self.eof          = False
+
+    def feed(self, chunk):
+        """
+        Append a chunk of the document
+
+        :param chunk: The chunk
+        :type chunk: bytes
+        """
+        self.buf += self.text_decoder.decode(chunk)
+
+    def feed_eof(self):
+        """
+        Signal the end of the document
+        """
+        self.buf += self.text_decoder.decode(b"", final = True)
+        self.eof = True
+
+    def fill(self, min_size = 1):
+        # Drop the consumed part of the buffer
+        if(self.pos > 65536):
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+
+        # Ask for chunks until at least min_size characters are buffered after the current position
+        size = len(self.buf)
+
+        while(not self.eof):
+            yield(NEED_DATA)
+
+            if((len(self.buf) - self.pos) >= min_size):
+                return(True)
+
+        return(len(self.buf) > size)
+
+    def skip(self):
+        # Skip whitespace and return the next buffered character (None if more data is needed)
+        while((self.pos < len(self.buf)) and (self.buf[self.pos] in WHITESPACE)):
+            self.pos += 1
+
+        return(self.buf[self.pos] if (self.pos < len(self.buf)) else None)
+
+    def peek(self):
+        c = self.skip()
+
+        if(c is not None):
+            return(c)
+
+        while(True):
+            if(not (yield from self.fill())):
+                return(None)
+
+            c = self.skip()
+
+            if(c is not None):
+                return(c)
+
+    def expect(self, c):
+        if((yield from self.peek()) != c):
+            raise ValueError("Invalid JSON stream: expected '" + c + "' at offset " + str(self.pos))
+
+        self.pos += 1
+
+    def number_continues(self, obj, end):
+        # A number followed only by number characters (e.g. '1.' or '1e') is decoded
+        # without them: the rest of the number may be in the next chunk
+        if(obj.__class__ not in (int, float)):
+            return(False)
+
+        for i in range(end, len(self.buf)):
+            if(self.buf[i] not in NUMBER_CHARS):
+                return(False)
+
+        return(True)
+
+    def value(self):
+        if(self.skip() is None):
+            yield from self.peek()
+
+        while(True):
+            try:
+                obj, end = self.decoder.raw_decode(self.buf, self.pos)
+
+                if(self.eof or ((end < len(self.buf)) and (not self.number_continues(obj, end)))):
+                    self.pos = end
+                    return(obj)
+
+                # A value ending with the buffer (e.g. a number, or a number split at '.' or 'e')
+                # may continue in the next chunk
+                size = end - self.pos
+
+                if(not (yield from self.fill())):
+                    self.pos += size
+                    return(obj)
+            except json.JSONDecodeError:
+                # Incomplete value: at least double the buffered data before decoding again
+                if(self.eof or (not (yield from self.fill(2 * (len(self.buf) - self.pos))))):
+                    raise
+
+    def events(self, path):
+        """
+        Yield the elements of the list found following the path of object keys, or
+        NEED_DATA when the next chunk must be fed
+
+        :param path: The list of keys leading to the list (e.g. ('rsp', 'data'))
+        :type path: array
+        :return: The list elements (a non-list value is returned as single element) and NEED_DATA events
+        :rtype: generator
+        """
+        for key in path:
+            yield from self.expect("{")
+
+            if((yield from self.peek()) == "}"):
+                return
+
+            while(True):
+                k = yield from self.value()
+                yield from self.expect(":")
+
+                if(k == key):
+                    break
+
+                yield from self.value()
+
+                if((yield from self.peek()) == "}"):
+                    return
+
+                yield from self.expect(",")
+
+        if((yield from self.peek()) != "["):
+            obj = yield from self.value()
+
+            if(obj is not None):
+                yield(obj)
+
+            return
+
+        self.pos += 1
+
+        if((yield from self.peek()) == "]"):
+            self.pos += 1
+            return
+
+        while(True):
+            yield((yield from self.value()))
+
+            c = self.skip()
+
+            if(c is None):
+                c = yield from self.peek()
+
+            self.pos += 1
+
+            if(c == "]"):
+                return
+            elif(c != ","):
+                raise ValueError("Invalid JSON stream: unexpected '" + str(c) + "' at offset " + str(self.pos - 1))
+
+    def items(self, path):
+        """
+        Yield the elements of the list found following the path of object keys, reading the chunks
+
+        :param path: The list of keys leading to the list (e.g. ('rsp', 'data'))
+        :type path: array
+        :return: The list elements (a non-list value is returned as single element)
+        :rtype: generator
+        """
+        for event in self.events(path):
+            if(event is not NEED_DATA):
+                yield(event)
+                continue
+
+            chunk = next(self.chunks, None)
+
+            if(chunk is None):
+                self.feed_eof()
+            else:
+                self.feed(chunk)
+
+def iter_json_items(chunks, path = ("rsp",)):
+    """
+    Incrementally decode a JSON document and yield the elements of the list at path
+
+    :param chunks: Iterable of bytes (e.g. response.iter_content())
+    :type chunks: iterable
+    :param path: The list of keys leading to the list (e.g. ('rsp', 'data'))
+    :type path: array
+    :return: The list elements
+    :rtype: generator
+    """
+    return(JSONStreamParser(chunks).items(path))
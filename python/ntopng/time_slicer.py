@@ -0,0 +1,342 @@
+"""
+TimeSlicer
+====================================
+The TimeSlicedQuery class runs a historical flows query over a long time range as
+several smaller queries on consecutive time slices, executed concurrently with
+bounded parallelism, and merges the results back respecting order_by and maxhits.
+
+The slice duration is sized from the observed row density (rows per second) so that
+each slice returns about target_rows rows; a slice that fails (e.g. because of a
+request timeout) is split in two and retried.
+"""
+
+import time
+import heapq
+import itertools
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+def parse_order_by(order_by):
+    """
+    Parse an order by condition (SQL syntax) into a list of (column, descending)
+
+    :param order_by: Order by condition (e.g. 'TOT DESC, FIRST_SEEN')
+    :type order_by: string
+    :return: The sort columns
+    :rtype: array
+    """
+    columns = []
+
+    for item in (order_by or "").split(","):
+        tokens = item.split()
+
+        if(len(tokens) == 0):
+            continue
+
+        descending = (len(tokens) > 1) and (tokens[-1].upper() == "DESC")
+
+        if((len(tokens) > 1) and (tokens[-1].upper() in ("ASC", "DESC"))):
+            tokens = tokens[:-1]
+
+        columns.append((" ".join(tokens), descending))
+
+    return(columns)
+
+def coerce_value(value):
+    # Numbers may be returned as strings (e.g. UInt64): compare them as numbers
+    if(value is None):
+        return((0, 0))
+    elif(isinstance(value, (int, float))):
+        return((1, value))
+    elif(isinstance(value, str)):
+        try:
+            return((1, int(value)))
+        except ValueError:
+            try:
+                return((1, float(value)))
+            except ValueError:
+                return((2, value))
+
+    return((2, str(value)))
+
+class RowKey:
+    """
+    RowKey compares rows according to a list of (column, descending)
+    """
+    __slots__ = ("values", "columns")
+
+    def __init__(self, row, columns):
+        self.columns = columns
+        self.values  = [ coerce_value(row.get(column)) for column, _ in columns ]
+
+    def __lt__(self, other):
+        for i, (_, descending) in enumerate(self.columns):
+            a = self.values[i]
+            b = other.values[i]
+
+            if(a != b):
+                return((a > b) if descending else (a < b))
+
+        return(False)
+
+def sort_rows(rows, order_by):
+    """
+    Sort rows according to order_by (e.g. the rows of a server not applying the order by)
+
+    :param rows: The rows
+    :type rows: array
+    :param order_by: Order by condition (SQL syntax)
+    :type order_by: string
+    :return: The sorted rows
+    :rtype: array
+    """
+    columns = parse_order_by(order_by)
+
+    if(len(columns) == 0):
+        return(list(rows))
+
+    return(sorted(rows, key = lambda row: RowKey(row, columns)))
+
+def merge_sorted(results, order_by, maxhits = None):
+    """
+    K-way merge of row lists, each sorted according to order_by
+
+    :param results: The row lists
+    :type results: array
+    :param order_by: Order by condition (SQL syntax)
+    :type order_by: string
+    :param maxhits: Max number of results (None for no limit)
+    :type maxhits: int
+    :return: The merged rows
+    :rtype: array
+    """
+    columns = parse_order_by(order_by)
+
+    if(len(columns) == 0):
+        merged = itertools.chain(*results)
+    else:
+        for column, _ in columns:
+            for rows in results:
+                if((len(rows) > 0) and (column not in rows[0])):
+                    raise ValueError("Unable to merge results: order by column '" + column + "' is not selected")
+
+        merged = heapq.merge(*results, key = lambda row: RowKey(row, columns))
+
+    if(maxhits is not None):
+        merged = itertools.islice(merged, int(maxhits))
+
+    return(list(merged))
+
+class TimeSlice:
+    def __init__(self, begin, end, last):
+        self.begin  = begin
+        self.end    = end
+        self.last   = last # the last slice includes epoch_end
+        self.rows   = None
+        self.future = None
+
+class TimeSlicedQuery:
+    """
+    TimeSlicedQuery runs historical flows queries as concurrent time slices
+
+    :param historical: The Historical handle
+    """
+    def __init__(self, historical, max_workers = 4, slice_duration = None, target_rows = None, min_slice_duration = 60, time_column = "FIRST_SEEN"):
+        """
+        Construct a new TimeSlicedQuery object
+
+        :param historical: The Historical handle
+        :type historical: Historical
+        :param max_workers: The max number of slices queried concurrently
+        :type max_workers: int
+        :param slice_duration: Fixed slice duration in seconds (None to size slices from the row density)
+        :type slice_duration: int
+        :param target_rows: Number of rows expected per slice when sizing slices (default: maxhits for queries ordered by time)
+        :type target_rows: int
+        :param min_slice_duration: The min slice duration in seconds
+        :type min_slice_duration: int
+        :param time_column: The column used to slice the time range
+        :type time_column: string
+        """
+        self.historical         = historical
+        self.max_workers        = max_workers
+        self.slice_duration     = slice_duration
+        self.target_rows        = target_rows
+        self.min_slice_duration = min_slice_duration
+        self.time_column        = time_column
+        self.last_stats         = None
+
+    def get_slice_where_clause(self, where_clause, s):
+        op = "<=" if s.last else "<"
+        clause = "(" + self.time_column + " >= toDateTime(" + str(int(s.begin)) + ") AND " + self.time_column + " " + op + " toDateTime(" + str(int(s.end)) + "))"
+
+        if(where_clause):
+            clause = "(" + where_clause + ") AND " + clause
+
+        return(clause)
+
+    def get_flows(self, ifid, epoch_begin, epoch_end, select_clause, where_clause, maxhits, group_by, order_by):
+        """
+        Run a query on the historical flows database splitting the time range in slices.
+        Grouped queries are not supported as aggregates cannot be merged across slices.
+        Each flow belongs to the slice containing its FIRST_SEEN.
+
+        :param ifid: The interface ID
+        :type ifid: int
+        :param epoch_begin: Start of the time interval (epoch)
+        :type epoch_begin: int
+        :param epoch_end: End of the time interval (epoch)
+        :type epoch_end: int
+        :param select_clause: Select clause (SQL syntax)
+        :type select_clause: string
+        :param where_clause: Where clause (SQL syntax)
+        :type where_clause: string
+        :param maxhits: Max number of results (limit)
+        :type maxhits: int
+        :param group_by: Group by condition (SQL syntax), must be empty
+        :type group_by: string
+        :param order_by: Order by condition (SQL syntax)
+        :type order_by: string
+        :return: Query result
+        :rtype: array
+        """
+        if(group_by):
+            raise ValueError("Grouped queries cannot be merged across time slices")
+
+        epoch_begin = int(epoch_begin)
+        epoch_end   = int(epoch_end)
+        maxhits     = int(maxhits)
+        columns     = parse_order_by(order_by)
+
+        # When results are ordered by time (or not ordered) slices are consumed in
+        # time order and querying stops as soon as maxhits rows are available
+        time_ordered = (len(columns) == 0) or (columns[0][0] == self.time_column)
+        descending   = (len(columns) > 0) and columns[0][1]
+
+        # Each slice returns up to maxhits rows: when merging, slices are sized by
+        # density only if target_rows is set, otherwise the range is split in
+        # max_workers*4 slices (failed slices are still split)
+        target_rows = self.target_rows or (maxhits if time_ordered else None)
+
+        cursor  = epoch_end if descending else epoch_begin
+        slices  = []
+        density = None
+        splits  = 0
+        start   = time.perf_counter()
+
+        def next_slice():
+            nonlocal cursor
+
+            if(self.slice_duration):
+                duration = self.slice_duration
+            elif(density and target_rows):
+                duration = target_rows / density
+            else:
+                duration = (epoch_end - epoch_begin) / (self.max_workers * 4)
+
+            duration = max(int(duration), self.min_slice_duration)
+
+            if(descending):
+                s = TimeSlice(max(cursor - duration, epoch_begin), cursor, cursor == epoch_end)
+                cursor = s.begin
+            else:
+                s = TimeSlice(cursor, min(cursor + duration, epoch_end), (cursor + duration) >= epoch_end)
+                cursor = s.end
+
+            return(s)
+
+        def exhausted():
+            return((cursor <= epoch_begin) if descending else (cursor >= epoch_end))
+
+        def ordered_slices():
+            return(sorted(slices, key = lambda s: s.begin, reverse = descending))
+
+        def collected_prefix():
+            num = 0
+
+            for s in ordered_slices():
+                if(s.rows is None):
+                    break
+
+                num += len(s.rows)
+
+            return(num)
+
+        executor = ThreadPoolExecutor(max_workers = self.max_workers)
+
+        def submit(s):
+            s.future = executor.submit(self.historical.get_flows, ifid, epoch_begin, epoch_end, select_clause,
+                                       self.get_slice_where_clause(where_clause, s), maxhits, group_by, order_by)
+            slices.append(s)
+
+        try:
+            while(True):
+                running = [ s for s in slices if (s.rows is None) ]
+
+                while((len(running) < self.max_workers) and (not exhausted())):
+                    submit(next_slice())
+                    running = [ s for s in slices if (s.rows is None) ]
+
+                if(len(running) == 0):
+                    break
+
+                wait([ s.future for s in running ], return_when = FIRST_COMPLETED)
+
+                for s in running:
+                    if(not s.future.done()):
+                        continue
+
+                    try:
+                        s.rows = s.future.result() or []
+                    except Exception:
+                        if((s.end - s.begin) < (2 * self.min_slice_duration)):
+                            raise
+
+                        # Retry the failed slice as two halves
+                        slices.remove(s)
+                        middle = s.begin + (s.end - s.begin) // 2
+                        submit(TimeSlice(s.begin, middle, False))
+                        submit(TimeSlice(middle, s.end, s.last))
+                        splits += 1
+                        continue
+
+                    duration = max(s.end - s.begin, 1)
+                    observed = len(s.rows) / duration
+
+                    if(len(s.rows) >= maxhits):
+                        # Saturated slice: the actual density is higher
+                        observed = 2 * observed
+
+                    density = observed if (density is None) else (0.5 * density + 0.5 * observed)
+
+                if(time_ordered and (collected_prefix() >= maxhits)):
+                    break
+        finally:
+            executor.shutdown(wait = False, cancel_futures = True)
+
+        done = []
+
+        for s in ordered_slices():
+            if(s.rows is None):
+                # Only the contiguous prefix of slices is complete
+                break
+
+            done.append(s.rows)
+
+        if(time_ordered):
+            rows = list(itertools.islice(itertools.chain(*done), maxhits))
+        else:
+            rows = merge_sorted(done, order_by, maxhits)
+
+        self.last_stats = { "slices": len(slices), "splits": splits, "rows": len(rows),
+                            "density": density, "elapsed": time.perf_counter() - start }
+
+        return(rows)
+
+    def get_stats(self):
+        """
+        Return statistics about the last query (slices, splits, rows, row density, elapsed time)
+
+        :return: The query statistics
+        :rtype: object
+        """
+        return(self.last_stats)
@@ -0,0 +1,427 @@
+"""
+Timeseries
+====================================
+The TimeseriesResult class decodes the result of a timeseries query into contiguous
+NumPy arrays: a timestamps vector and a values matrix with one column per metric
+(e.g. bytes_sent, bytes_rcvd).
+
+Results can be downsampled to a target number of points with the
+largest-triangle-three-buckets (LTTB) algorithm, resampled, aligned on a common time grid (align_series builds a
+TimeseriesMatrix with one column per series) and reduced (rate, sum, mean, max,
+percentile) with vectorized operations.
+
+NumPy is an optional dependency of this package (pip3 install numpy).
+"""
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+def require_numpy():
+    if(np is None):
+        raise ImportError("NumPy is required for vectorized timeseries (pip3 install numpy)")
+
+def bucket_reduce(timestamps, values, grid_start, step, num_buckets, how):
+    """
+    Reduce the rows of values falling in the same grid bucket
+
+    :param timestamps: The timestamps (n)
+    :type timestamps: numpy.ndarray
+    :param values: The values (n x m), NaN values are ignored
+    :type values: numpy.ndarray
+    :param grid_start: The first bucket start (epoch)
+    :type grid_start: int
+    :param step: The bucket duration (seconds)
+    :type step: int
+    :param num_buckets: The number of buckets
+    :type num_buckets: int
+    :param how: The reduction (mean, sum, max, min, last)
+    :type how: string
+    :return: The reduced values (num_buckets x m), NaN for empty buckets
+    :rtype: numpy.ndarray
+    """
+    idx  = (timestamps - grid_start) // step
+    keep = (idx >= 0) & (idx < num_buckets)
+    idx  = idx[keep].astype(np.int64)
+    vals = values[keep]
+    out  = np.full((num_buckets, vals.shape[1]), np.nan)
+
+    for j in range(vals.shape[1]):
+        col   = vals[:, j]
+        valid = ~np.isnan(col)
+        cidx  = idx[valid]
+        col   = col[valid]
+
+        if(how in ("mean", "sum")):
+            sums   = np.bincount(cidx, weights = col, minlength = num_buckets)
+            counts = np.bincount(cidx, minlength = num_buckets)
+
+            with np.errstate(invalid = "ignore", divide = "ignore"):
+                res = (sums / counts) if (how == "mean") else np.where(counts > 0, sums, np.nan)
+
+            out[:, j] = res
+        elif(how in ("max", "min")):
+            res = np.full(num_buckets, -np.inf if (how == "max") else np.inf)
+            (np.maximum if (how == "max") else np.minimum).at(res, cidx, col)
+            res[np.isinf(res)] = np.nan
+            out[:, j] = res
+        elif(how == "last"):
+            out[cidx, j] = col
+        else:
+            raise ValueError("Unknown reduction '" + str(how) + "'")
+
+    return(out)
+
+def lttb(timestamps, values, n):
+    """
+    Select the indexes of the n points that best preserve the shape of a series
+    using the largest-triangle-three-buckets (LTTB) algorithm
+
+    :param timestamps: The timestamps (epoch)
+    :type timestamps: numpy.ndarray
+    :param values: The values, NaN values are considered as 0
+    :type values: numpy.ndarray
+    :param n: The number of points to keep (at least 3)
+    :type n: int
+    :return: The sorted indexes of the selected points
+    :rtype: numpy.ndarray
+    """
+    require_numpy()
+
+    x = np.asarray(timestamps, dtype = np.float64)
+    y = np.nan_to_num(np.asarray(values, dtype = np.float64))
+    size = len(x)
+    n = int(n)
+
+    if(n >= size):
+        return(np.arange(size))
+    elif(n < 3):
+        raise ValueError("LTTB requires at least 3 points")
+
+    # The first and last points are always kept, the others are split in n-2 buckets
+    edges = np.floor(np.arange(n - 1) * ((size - 2) / (n - 2))).astype(np.int64) + 1
+    edges[-1] = size - 1
+    selected = np.empty(n, dtype = np.int64)
+    selected[0] = 0
+    selected[-1] = size - 1
+    a = 0
+
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+
+        # Average point of the next bucket (the last point for the last bucket)
+        if(i < n - 3):
+            next_x = x[hi:edges[i + 2]].mean()
+            next_y = y[hi:edges[i + 2]].mean()
+        else:
+            next_x = x[-1]
+            next_y = y[-1]
+
+        # Keep the point forming the largest triangle with the previous selected point
+        area = np.abs((x[a] - next_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (next_y - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+
+    return(selected)
+
+class TimeseriesResult:
+    """
+    TimeseriesResult stores a timeseries query result as NumPy arrays
+
+    :param timestamps: The point timestamps (epoch, int64 vector)
+    :param values: The point values (float64 matrix, one column per metric)
+    :param labels: The metric names
+    :param step: The distance (seconds) between points
+    """
+    def __init__(self, timestamps, values, labels, step, schema = None, query = None):
+        require_numpy()
+
+        self.timestamps = np.asarray(timestamps, dtype = np.int64)
+        self.values     = np.asarray(values, dtype = np.float64).reshape(len(self.timestamps), len(labels))
+        self.labels     = list(labels)
+        self.step       = int(step)
+        self.schema     = schema
+        self.query      = query
+
+    @classmethod
+    def from_rsp(cls, rsp, schema = None, query = None):
+        """
+        Build a TimeseriesResult from the response of a timeseries query
+
+        :param rsp: The timeseries query response (rsp)
+        :type rsp: object
+        :return: The decoded result
+        :rtype: TimeseriesResult
+        """
+        require_numpy()
+
+        series = (rsp or {}).get("series") or []
+        start  = int(rsp.get("start") or 0) if rsp else 0
+        step   = int(rsp.get("step") or 1) if rsp else 1
+        labels = []
+        cols   = []
+
+        for i, serie in enumerate(series):
+            data = serie.get("data") or []
+
+            if(isinstance(data, dict)):
+                # Extended format: { epoch: value }
+                data = [ data[k] for k in sorted(data.keys(), key = int) ]
+
+            labels.append(serie.get("label") or str(i))
+            cols.append(np.array(data, dtype = np.float64))
+
+        num_points = max([ len(c) for c in cols ] + [ 0 ])
+        values = np.full((num_points, len(cols)), np.nan)
+
+        for j, col in enumerate(cols):
+            values[:len(col), j] = col
+
+        timestamps = start + np.arange(num_points, dtype = np.int64) * step
+
+        return(cls(timestamps, values, labels, step, schema or (rsp or {}).get("schema"), query))
+
+    def __len__(self):
+        return(len(self.timestamps))
+
+    def column(self, label):
+        """
+        Return the values of a metric
+
+        :param label: The metric name (e.g. bytes_sent)
+        :type label: string
+        :return: The metric values
+        :rtype: numpy.ndarray
+        """
+        return(self.values[:, self.labels.index(label)])
+
+    def total(self):
+        """
+        Return the sum of all the metrics per point (NaN if all metrics are NaN)
+
+        :return: The total values
+        :rtype: numpy.ndarray
+        """
+        total = np.nansum(self.values, axis = 1)
+        total[np.all(np.isnan(self.values), axis = 1)] = np.nan
+
+        return(total)
+
+    def resample(self, step, how = "mean", start = None, end = None):
+        """
+        Resample the result on a grid of the specified step
+
+        :param step: The new step (seconds)
+        :type step: int
+        :param how: The reduction of the points in a bucket (mean, sum, max, min, last)
+        :type how: string
+        :param start: The grid start (default: the first timestamp, aligned to step)
+        :type start: int
+        :param end: The grid end (default: the last timestamp)
+        :type end: int
+        :return: The resampled result
+        :rtype: TimeseriesResult
+        """
+        step = int(step)
+
+        if(start is None):
+            start = (int(self.timestamps[0]) // step) * step if len(self) else 0
+
+        if(end is None):
+            end = int(self.timestamps[-1]) if len(self) else start
+
+        num_buckets = max(((int(end) - int(start)) // step) + 1, 0)
+        values = bucket_reduce(self.timestamps, self.values, int(start), step, num_buckets, how)
+        timestamps = int(start) + np.arange(num_buckets, dtype = np.int64) * step
+
+        return(TimeseriesResult(timestamps, values, self.labels, step, self.schema, self.query))
+
+    def downsample(self, max_points, metric = None):
+        """
+        Reduce the result to max_points points with the LTTB algorithm. Points are selected
+        on a single series (a metric or the total) and kept for all the metrics.
+
+        :param max_points: The max number of points
+        :type max_points: int
+        :param metric: The metric driving the point selection (default: the total of all metrics)
+        :type metric: string
+        :return: The downsampled result (unchanged if it has no more than max_points points)
+        :rtype: TimeseriesResult
+        """
+        if(len(self) <= max_points):
+            return(self)
+
+        series = self.column(metric) if (metric is not None) else self.total()
+        idx = lttb(self.timestamps, series, max_points)
+
+        return(TimeseriesResult(self.timestamps[idx], self.values[idx], self.labels, self.step, self.schema, self.query))
+
+    def rate(self):
+        """
+        Return the per-second rate of change of the metrics (one point less than the result)
+
+        :return: The rates
+        :rtype: TimeseriesResult
+        """
+        dt = np.diff(self.timestamps).astype(np.float64)
+
+        with np.errstate(invalid = "ignore", divide = "ignore"):
+            values = np.diff(self.values, axis = 0) / dt[:, None]
+
+        return(TimeseriesResult(self.timestamps[1:], values, self.labels, self.step, self.schema, self.query))
+
+    def sum(self):
+        """
+        Return the sum of each metric over time
+        """
+        return(dict(zip(self.labels, np.nansum(self.values, axis = 0).tolist())))
+
+    def mean(self):
+        """
+        Return the average of each metric over time
+        """
+        return(dict(zip(self.labels, np.nanmean(self.values, axis = 0).tolist())))
+
+    def max(self):
+        """
+        Return the max of each metric over time
+        """
+        return(dict(zip(self.labels, np.nanmax(self.values, axis = 0).tolist())))
+
+    def percentile(self, q):
+        """
+        Return the q-th percentile of each metric
+
+        :param q: The percentile (0-100)
+        :type q: float
+        :return: The percentile per metric
+        :rtype: object
+        """
+        return(dict(zip(self.labels, np.nanpercentile(self.values, q, axis = 0).tolist())))
+
+class TimeseriesMatrix:
+    """
+    TimeseriesMatrix stores many series aligned on a common time grid
+
+    :param timestamps: The grid timestamps (epoch, int64 vector)
+    :param values: The values (float64 matrix, one column per series)
+    :param names: The series names
+    """
+    def __init__(self, timestamps, values, names, step):
+        require_numpy()
+
+        self.timestamps = np.asarray(timestamps, dtype = np.int64)
+        self.values     = np.asarray(values, dtype = np.float64)
+        self.names      = list(names)
+        self.step       = int(step)
+
+    def column(self, name):
+        """
+        Return the values of a series
+        """
+        return(self.values[:, self.names.index(name)])
+
+    def rate(self):
+        """
+        Return the per-second rate of change of the series (one point less than the matrix)
+        """
+        dt = np.diff(self.timestamps).astype(np.float64)
+
+        with np.errstate(invalid = "ignore", divide = "ignore"):
+            values = np.diff(self.values, axis = 0) / dt[:, None]
+
+        return(TimeseriesMatrix(self.timestamps[1:], values, self.names, self.step))
+
+    def sum(self, axis = 0):
+        """
+        Sum the values over time (axis=0, one value per series) or across series (axis=1, one value per point)
+        """
+        return(np.nansum(self.values, axis = axis))
+
+    def mean(self, axis = 0):
+        """
+        Average the values over time (axis=0) or across series (axis=1)
+        """
+        return(np.nanmean(self.values, axis = axis))
+
+    def max(self, axis = 0):
+        """
+        Return the max over time (axis=0) or across series (axis=1)
+        """
+        return(np.nanmax(self.values, axis = axis))
+
+    def percentile(self, q, axis = 0):
+        """
+        Return the q-th percentile over time (axis=0, one value per series) or across series (axis=1, one value per point)
+
+        :param q: The percentile (0-100)
+        :type q: float
+        :param axis: The reduction axis
+        :type axis: int
+        :return: The percentiles
+        :rtype: numpy.ndarray
+        """
+        return(np.nanpercentile(self.values, q, axis = axis))
+
+    def to_dict(self, values):
+        """
+        Map a per-series reduction (e.g. percentile(95)) to the series names
+        """
+        return(dict(zip(self.names, np.asarray(values).tolist())))
+
+def align_series(results, names = None, metric = None, step = None, start = None, end = None, how = "mean"):
+    """
+    Align many timeseries results on a common time grid
+
+    :param results: The results to align
+    :type results: array
+    :param names: The series names (default: the result queries or their index)
+    :type names: array
+    :param metric: The metric to take from each result (default: the total of all metrics); results without it are left NaN
+    :type metric: string
+    :param step: The grid step (default: the coarsest step of the results)
+    :type step: int
+    :param start: The grid start (default: the earliest timestamp, aligned to step)
+    :type start: int
+    :param end: The grid end (default: the latest timestamp)
+    :type end: int
+    :param how: The reduction of the points falling in a grid bucket (mean, sum, max, min, last)
+    :type how: string
+    :return: The aligned series
+    :rtype: TimeseriesMatrix
+    """
+    require_numpy()
+
+    results = list(results)
+    nonempty = [ r for r in results if len(r) > 0 ]
+
+    if(names is None):
+        names = [ (r.query if (r.query is not None) else str(i)) for i, r in enumerate(results) ]
+
+    if(step is None):
+        step = max([ r.step for r in results ] + [ 1 ])
+
+    step = int(step)
+
+    if(start is None):
+        start = min([ int(r.timestamps[0]) for r in nonempty ]) if nonempty else 0
+        start = (start // step) * step
+
+    if(end is None):
+        end = max([ int(r.timestamps[-1]) for r in nonempty ] + [ start ])
+
+    num_buckets = max(((int(end) - int(start)) // step) + 1, 0)
+    matrix = np.full((num_buckets, len(results)), np.nan)
+
+    for j, r in enumerate(results):
+        if((len(r) == 0) or ((metric is not None) and (metric not in r.labels))):
+            # No data (e.g. ntopng drops the series whose points are all zero): leave NaN
+            continue
+
+        col = r.column(metric) if (metric is not None) else r.total()
+        matrix[:, j] = bucket_reduce(r.timestamps, col.reshape(-1, 1), int(start), step, num_buckets, how)[:, 0]
+
+    timestamps = int(start) + np.arange(num_buckets, dtype = np.int64) * step
+
+    return(TimeseriesMatrix(timestamps, matrix, names, step))
@@ -0,0 +1,143 @@
+"""
+TimeseriesBulk
+====================================
+The BulkTimeseriesFetcher class retrieves many timeseries (e.g. host:traffic for
+thousands of hosts) running the queries concurrently with bounded parallelism.
+Identical queries are issued once and failed queries are retried; failures are
+reported in the result instead of aborting the whole batch.
+
+The results can be assembled into a single TimeseriesMatrix aligned on a common
+time grid (requires numpy).
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .timeseries import TimeseriesResult, align_series
+
+class BulkTimeseriesResult:
+    """
+    BulkTimeseriesResult stores the results of a bulk timeseries query
+
+    :param results: The responses keyed by (schema, query)
+    :param failures: The errors keyed by (schema, query)
+    """
+    def __init__(self, keys, results, failures, elapsed):
+        self.keys     = keys
+        self.results  = results
+        self.failures = failures
+        self.elapsed  = elapsed
+
+    def get(self, ts_schema, ts_query):
+        """
+        Return the response of a query (None if it failed)
+
+        :param ts_schema: The timeseries schema
+        :type ts_schema: string
+        :param ts_query: The timeseries query
+        :type ts_query: string
+        :return: Timeseries data
+        :rtype: object
+        """
+        return(self.results.get((ts_schema, ts_query)))
+
+    def to_matrix(self, metric = None, step = None, how = "mean"):
+        """
+        Assemble the successful results into series aligned on a common time grid (requires numpy)
+
+        :param metric: The metric to take from each result (default: the total of all metrics); the results without it (e.g. all-zero series dropped by ntopng) are left NaN
+        :type metric: string
+        :param step: The grid step (default: the coarsest step of the results)
+        :type step: int
+        :param how: The reduction of the points falling in a grid bucket (mean, sum, max, min, last)
+        :type how: string
+        :return: The aligned series, named '<schema>|<query>'
+        :rtype: TimeseriesMatrix
+        """
+        keys    = [ k for k in self.keys if (k in self.results) ]
+        results = [ TimeseriesResult.from_rsp(self.results[k], k[0], k[1]) for k in keys ]
+
+        return(align_series(results, names = [ k[0] + "|" + k[1] for k in keys ], metric = metric, step = step, how = how))
+
+    def get_stats(self):
+        """
+        Return the number of queries, successes, failures and the elapsed time
+
+        :return: The bulk query statistics
+        :rtype: object
+        """
+        return({ "queries": len(self.keys), "succeeded": len(self.results),
+                 "failed": len(self.failures), "elapsed": self.elapsed })
+
+class BulkTimeseriesFetcher:
+    """
+    BulkTimeseriesFetcher runs many timeseries queries concurrently
+
+    :param historical: The Historical handle
+    """
+    def __init__(self, historical, max_workers = 8, retries = 2, retry_delay = 0.5):
+        """
+        Construct a new BulkTimeseriesFetcher object
+
+        :param historical: The Historical handle
+        :type historical: Historical
+        :param max_workers: The max number of queries in flight
+        :type max_workers: int
+        :param retries: The number of times a failed query is retried
+        :type retries: int
+        :param retry_delay: The delay (seconds) before the first retry, doubled at each retry
+        :type retry_delay: float
+        """
+        self.historical  = historical
+        self.max_workers = max_workers
+        self.retries     = retries
+        self.retry_delay = retry_delay
+
+    def fetch_one(self, ts_schema, ts_query, epoch_begin, epoch_end):
+        attempt = 0
+
+        while(True):
+            try:
+                return(self.historical.get_timeseries(ts_schema, ts_query, epoch_begin, epoch_end))
+            except Exception:
+                if(attempt >= self.retries):
+                    raise
+
+                time.sleep(self.retry_delay * (2 ** attempt))
+                attempt += 1
+
+    def fetch(self, queries, epoch_begin, epoch_end, progress = None):
+        """
+        Run the timeseries queries
+
+        :param queries: The list of (ts_schema, ts_query) pairs
+        :type queries: array
+        :param epoch_begin: Start of the time interval (epoch)
+        :type epoch_begin: int
+        :param epoch_end: End of the time interval (epoch)
+        :type epoch_end: int
+        :param progress: Function called as progress(done, total, failed) after each query
+        :type progress: function
+        :return: The results and failures
+        :rtype: BulkTimeseriesResult
+        """
+        keys     = list(dict.fromkeys((schema, query) for schema, query in queries))
+        results  = {}
+        failures = {}
+        start    = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers = self.max_workers) as executor:
+            futures = { executor.submit(self.fetch_one, schema, query, epoch_begin, epoch_end): (schema, query) for schema, query in keys }
+
+            for future in as_completed(futures):
+                key = futures[future]
+
+                try:
+                    results[key] = future.result()
+                except Exception as e:
+                    failures[key] = str(e)
+
+                if(progress is not None):
+                    progress(len(results) + len(failures), len(keys), len(failures))
+
+        return(BulkTimeseriesResult(keys, results, failures, time.perf_counter() - start))
@@ -0,0 +1,237 @@
+"""
+TimeseriesTail
+====================================
+The TimeseriesTail class follows timeseries over a sliding time window (e.g. the
+last hour of an interface traffic, refreshed every few seconds) without downloading
+the whole window at each refresh.
+
+The points of each (schema, query) are kept in a bounded in-memory buffer: the first
+call reads the whole window, the following calls only request the points after the
+last known epoch (the last point is read again as it may have been incomplete) and
+append them to the buffer, dropping the points that fall out of the window.
+
+All the queries use the same explicit number of points (at least the points of the
+window), otherwise ts.lua would downsample the window to its default number of points
+and the tail responses (at the native step) would not match the buffered resolution.
+Series are matched by label: a series missing from a response (e.g. ts.lua drops the
+series whose values are all zero) is a gap, not a different set of metrics.
+"""
+
+import math
+import time
+import threading
+from collections import OrderedDict
+
+class TailBuffer:
+    """
+    TailBuffer stores the points of a timeseries by epoch
+    """
+    def __init__(self, step, labels):
+        self.step   = step
+        self.labels = labels
+        self.points = OrderedDict() # epoch -> values (one per label), in epoch order
+
+    def get_last_epoch(self):
+        return(next(reversed(self.points)) if self.points else None)
+
+    def merge(self, rsp):
+        start  = int(rsp.get("start") or 0)
+        series = rsp.get("series") or []
+        count  = max([ len(s.get("data") or []) for s in series ] + [ 0 ])
+        last   = self.get_last_epoch()
+        added  = 0
+
+        # Series by buffer position, new series are added to the buffer
+        columns = []
+
+        for i, s in enumerate(series):
+            label = s.get("label") or str(i)
+
+            if(label not in self.labels):
+                self.labels.append(label)
+
+            columns.append((self.labels.index(label), s.get("data") or []))
+
+        for i in range(count):
+            epoch  = start + i * self.step
+            values = [ None ] * len(self.labels)
+
+            for j, data in columns:
+                if(i < len(data)):
+                    values[j] = data[i]
+
+            if((last is not None) and (epoch < last)):
+                continue
+
+            if(epoch not in self.points):
+                added += 1
+
+            self.points[epoch] = values
+
+        return(added)
+
+    def trim(self, begin, max_points):
+        while(self.points and ((next(iter(self.points)) < begin) or (len(self.points) > max_points))):
+            self.points.popitem(last = False)
+
+    def to_rsp(self, schema, query):
+        # Rebuild a regular series (missing points are None) in the format of get_timeseries
+        if(not self.points):
+            return({ "start": None, "step": self.step, "count": 0, "schema": schema, "query": query,
+                     "series": [ { "label": label, "data": [] } for label in self.labels ] })
+
+        first = next(iter(self.points))
+        count = (self.get_last_epoch() - first) // self.step + 1
+        data  = [ [ None ] * count for _ in self.labels ]
+
+        for epoch, values in self.points.items():
+            for j, value in enumerate(values):
+                data[j][(epoch - first) // self.step] = value
+
+        return({ "start": first, "step": self.step, "count": count, "schema": schema, "query": query,
+                 "series": [ { "label": label, "data": data[j] } for j, label in enumerate(self.labels) ] })
+
+class TimeseriesTail:
+    """
+    TimeseriesTail follows timeseries over a sliding window requesting only new points
+
+    :param historical: The Historical handle
+    """
+    def __init__(self, historical, window = 3600, max_points = 4096, limit = None):
+        """
+        Construct a new TimeseriesTail object
+
+        :param historical: The Historical handle
+        :type historical: Historical
+        :param window: The window duration (seconds)
+        :type window: int
+        :param max_points: The max number of points buffered per timeseries
+        :type max_points: int
+        :param limit: The number of points requested to the server (default: max_points, at least the points of the window)
+        :type limit: int
+        """
+        self.historical = historical
+        self.window     = int(window)
+        self.max_points = max_points
+        self.limit      = limit
+        self.buffers    = {}
+        self.lock       = threading.Lock()
+        self.stats      = { "full_queries": 0, "tail_queries": 0, "points_fetched": 0, "points_added": 0 }
+
+    def get(self, ts_schema, ts_query, now = None):
+        """
+        Return the timeseries of the last window, fetching only the points not yet buffered
+
+        :param ts_schema: The timeseries schema
+        :type ts_schema: string
+        :param ts_query: The timeseries query (e.g. 'ifid:0')
+        :type ts_query: string
+        :param now: The window end (epoch, default: now)
+        :type now: int
+        :return: Timeseries data (same format of Historical.get_timeseries)
+        :rtype: object
+        """
+        now   = int(now if (now is not None) else time.time())
+        begin = now - self.window
+        key   = (ts_schema, ts_query)
+
+        with self.lock:
+            buf  = self.buffers.get(key)
+            last = buf.get_last_epoch() if (buf is not None) else None
+
+        full  = (last is None) or (last < begin)
+        limit = self.get_limit(buf.step if (buf is not None) else None)
+        rsp   = self.historical.get_timeseries(ts_schema, ts_query, begin if full else last, now, limit = limit) or {}
+        step  = int(rsp.get("step") or 0)
+
+        with self.lock:
+            self.stats["full_queries" if full else "tail_queries"] += 1
+            self.stats["points_fetched"] += int(rsp.get("count") or 0)
+
+            if(step > 0):
+                buf = self.buffers.get(key)
+
+                if((buf is None) or full or (buf.step != step)):
+                    # The series changed resolution: restart from this response
+                    buf = TailBuffer(step, [])
+                    self.buffers[key] = buf
+
+                self.stats["points_added"] += buf.merge(rsp)
+
+            buf = self.buffers.get(key)
+
+            if(buf is None):
+                return(rsp)
+
+            buf.trim(begin, self.max_points)
+
+            return(buf.to_rsp(ts_schema, ts_query))
+
+    def get_limit(self, step):
+        # The same number of points for the window and the tail queries
+        limit = self.limit or self.max_points
+
+        if(step):
+            limit = max(limit, int(math.ceil(self.window / float(step))) + 1)
+
+        return(limit)
+
+    def get_host(self, ifid, host_ip, ts_schema, now = None):
+        """
+        Return the timeseries of the last window for a specified interface and host
+
+        :param ifid: The interface ID
+        :type ifid: int
+        :param host_ip: The host IP
+        :type host_ip: string
+        :param ts_schema: The timeseries schema
+        :type ts_schema: string
+        :param now: The window end (epoch, default: now)
+        :type now: int
+        :return: Timeseries data
+        :rtype: object
+        """
+        return(self.get(ts_schema, "ifid:"+str(ifid)+",host:"+host_ip, now))
+
+    def get_interface(self, ifid, ts_schema, now = None):
+        """
+        Return the timeseries of the last window for a specified interface
+
+        :param ifid: The interface ID
+        :type ifid: int
+        :param ts_schema: The timeseries schema
+        :type ts_schema: string
+        :param now: The window end (epoch, default: now)
+        :type now: int
+        :return: Timeseries data
+        :rtype: object
+        """
+        return(self.get(ts_schema, "ifid:"+str(ifid), now))
+
+    def reset(self, ts_schema = None, ts_query = None):
+        """
+        Drop the buffered points of a timeseries (all the timeseries if not specified)
+
+        :param ts_schema: The timeseries schema
+        :type ts_schema: string
+        :param ts_query: The timeseries query
+        :type ts_query: string
+        """
+        with self.lock:
+            if(ts_schema is None):
+                self.buffers.clear()
+            else:
+                self.buffers.pop((ts_schema, ts_query), None)
+
+    def get_stats(self):
+        """
+        Return statistics (full and tail queries, points fetched and added, buffered series)
+
+        :return: The tail statistics
+        :rtype: object
+        """
+        with self.lock:
+            stats = dict(self.stats)
+            stats["series"] = len(self.buffers)
+
+        return(stats)
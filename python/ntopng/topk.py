@@ -0,0 +1,198 @@
+"""
+TopK
+====================================
+The SlicedTopK class computes the Top-K of the historical flows over a long time range
+as a map-reduce: the range is split in slices aligned to the slice duration, a Top-K
+query is run for each slice concurrently and the partial lists are merged.
+
+Each slice returns more than K entries (K * overfetch): an entry missing from the list
+of a slice contributes at most the smallest value of that list, which gives an upper
+bound (and an error bound) for every merged entry. This requires the list of each
+slice to be its exact top K * overfetch, so slices are queried with the approximate
+search disabled. Slices are aligned so that, with the Historical cache enabled,
+extending the range only queries the new slices.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_TOPK_KEYS = "IPV4_SRC_ADDR,IPV4_DST_ADDR,L7_PROTO"
+
+def is_number(value):
+    try:
+        float(value)
+        return(not isinstance(value, bool))
+    except (TypeError, ValueError):
+        return(False)
+
+def get_value_column(rows, key_columns):
+    # The value is the (first) numeric column that is not a key
+    for row in rows:
+        for column, value in row.items():
+            if((column not in key_columns) and is_number(value)):
+                return(column)
+
+    return(None)
+
+def merge_topk(results, k, key_columns, value_column = None, how = "SUM"):
+    """
+    Merge partial Top-K lists computing for each entry a lower and upper bound of its value
+
+    :param results: The partial Top-K lists (one per slice) and the number of entries requested to each slice
+    :type results: array
+    :param k: The number of entries to return
+    :type k: int
+    :param key_columns: The key columns
+    :type key_columns: array
+    :param value_column: The value column (default: the first numeric column that is not a key)
+    :type value_column: string
+    :param how: How values are combined across slices (SUM, COUNT, MAX)
+    :type how: string
+    :return: The Top-K entries (with value lower bound and error), the other entries and the max value of an entry not returned by any slice
+    :rtype: tuple
+    """
+    how = how.upper()
+
+    if(how not in ("SUM", "COUNT", "MAX")):
+        raise ValueError("Top-K '" + how + "' cannot be merged across slices")
+
+    key_columns = list(key_columns)
+
+    if(value_column is None):
+        value_column = get_value_column([ row for rows, _ in results for row in rows ], key_columns)
+
+    entries    = {} # key -> [row, lower, set of slices]
+    thresholds = [] # per slice: max value of a missing entry
+
+    for i, (rows, requested) in enumerate(results):
+        values = [ float(row.get(value_column) or 0) for row in rows ]
+
+        # A slice returning fewer entries than requested is complete
+        thresholds.append(min(values) if ((len(rows) >= requested) and values) else 0.0)
+
+        for row, value in zip(rows, values):
+            key = tuple(row.get(c) for c in key_columns)
+            entry = entries.get(key)
+
+            if(entry is None):
+                entries[key] = [ row, value, { i } ]
+            else:
+                entry[1] = (entry[1] + value) if (how != "MAX") else max(entry[1], value)
+                entry[2].add(i)
+
+    merged = []
+
+    for row, lower, seen in entries.values():
+        missing = [ t for i, t in enumerate(thresholds) if (i not in seen) ]
+
+        if(how == "MAX"):
+            upper = max([ lower ] + missing)
+        else:
+            upper = lower + sum(missing)
+
+        out = { c: row.get(c) for c in key_columns }
+        out[value_column] = lower
+        out["error"] = upper - lower
+        merged.append(out)
+
+    merged.sort(key = lambda r: r[value_column], reverse = True)
+    unseen = max(thresholds + [ 0.0 ]) if (how == "MAX") else sum(thresholds)
+
+    return(merged[:k], merged[k:], unseen)
+
+class SlicedTopK:
+    """
+    SlicedTopK computes Top-K flows over long time ranges as concurrent per-slice queries
+
+    :param historical: The Historical handle
+    """
+    def __init__(self, historical, max_workers = 4, slice_duration = 3600, overfetch = 4):
+        """
+        Construct a new SlicedTopK object
+
+        :param historical: The Historical handle
+        :type historical: Historical
+        :param max_workers: The max number of slices queried concurrently
+        :type max_workers: int
+        :param slice_duration: The slice duration in seconds (slices are aligned to multiples of it)
+        :type slice_duration: int
+        :param overfetch: Each slice is asked for K * overfetch entries
+        :type overfetch: int
+        """
+        self.historical     = historical
+        self.max_workers    = max_workers
+        self.slice_duration = int(slice_duration)
+        self.overfetch      = overfetch
+        self.last_stats     = None
+
+    def get_slices(self, epoch_begin, epoch_end):
+        # Slices are aligned (so that they can be cached) and do not overlap
+        slices = []
+        begin  = int(epoch_begin)
+
+        while(begin <= epoch_end):
+            end = min(((begin // self.slice_duration) + 1) * self.slice_duration, int(epoch_end) + 1)
+            slices.append((begin, end - 1))
+            begin = end
+
+        return(slices)
+
+    def get_topk_flows(self, ifid, epoch_begin, epoch_end, max_hits, where_clause, select_keys = None, select_values = None, topk = None, value_column = None):
+        """
+        Retrieve Top-K from the historical flows database running a query per slice
+
+        :param ifid: The interface ID
+        :type ifid: int
+        :param epoch_begin: Start of the time interval (epoch)
+        :type epoch_begin: int
+        :param epoch_end: End of the time interval (epoch)
+        :type epoch_end: int
+        :param max_hits: The number of entries (K)
+        :type max_hits: int
+        :param where_clause: Where clause (SQL syntax)
+        :type where_clause: string
+        :param select_keys: Comma-separated keys (default: IPV4_SRC_ADDR,IPV4_DST_ADDR,L7_PROTO)
+        :type select_keys: string
+        :param select_values: Select value (server default: BYTES)
+        :type select_values: string
+        :param topk: Top-K function (SUM, COUNT, MAX; server default: SUM)
+        :type topk: string
+        :param value_column: The value column of the results (default: the first numeric column that is not a key)
+        :type value_column: string
+        :return: Top-K entries, each with the value lower bound and its max error (error)
+        :rtype: array
+        """
+        start       = time.perf_counter()
+        key_columns = [ c.strip() for c in (select_keys or DEFAULT_TOPK_KEYS).split(",") ]
+        requested   = int(max_hits) * self.overfetch
+        slices      = self.get_slices(epoch_begin, epoch_end)
+
+        with ThreadPoolExecutor(max_workers = self.max_workers) as executor:
+            futures = [ executor.submit(self.historical.get_topk_flows, ifid, begin, end, requested, where_clause,
+                                        select_keys, select_values, topk, approx_search = False) for begin, end in slices ]
+            results = [ ((f.result() or []), requested) for f in futures ]
+
+        if(value_column is None):
+            value_column = get_value_column([ row for rows, _ in results for row in rows ], key_columns)
+
+        top, rest, unseen = merge_topk(results, int(max_hits), key_columns, value_column, topk or "SUM")
+
+        # The Top-K set is exact when the K-th value is not lower than the upper
+        # bound of any other entry (returned by some slice or not)
+        kth   = top[-1][value_column] if (len(top) > 0) else 0
+        upper = [ r[value_column] + r["error"] for r in rest ] + [ unseen ]
+        self.last_stats = { "slices": len(slices), "requested_per_slice": requested,
+                            "max_error": max([ r["error"] for r in top ] + [ 0 ]),
+                            "exact_set": (len(top) > 0) and (kth >= max(upper)),
+                            "elapsed": time.perf_counter() - start }
+
+        return(top)
+
+    def get_stats(self):
+        """
+        Return statistics about the last query (slices, entries per slice, max error, whether the Top-K set is exact, elapsed time)
+
+        :return: The query statistics
+        :rtype: object
+        """
+        return(self.last_stats)
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+"""
+Offline checks for the alert follower
+"""
+
+import os
+import re
+import shutil
+import tempfile
+import unittest
+
+from ntopng.alert_follower import AlertFollower
+
+class FakeHistorical:
+    # Alerts with epoch tstamps (SQLite), filtered by epoch_begin and by the tstamp and keyset conditions of the where
+    # clause. An unordered server ignores the order by, returning the most recently stored alerts first.
+    def __init__(self, alerts, ordered = True):
+        self.alerts  = alerts
+        self.ordered = ordered
+        self.calls   = []
+
+    def get_alerts(self, alert_family, ifid, epoch_begin, epoch_end, select_clause, where_clause, maxhits, group_by, order_by):
+        self.calls.append({ "alert_family": alert_family, "ifid": ifid, "epoch_begin": epoch_begin, "select_clause": select_clause,
+                            "where_clause": where_clause, "maxhits": maxhits, "group_by": group_by, "order_by": order_by })
+        low  = max([ int(v) for v in re.findall(r"tstamp >= (\d+)", where_clause or "") ] + [ 0 ])
+        high = min([ int(v) for v in re.findall(r"tstamp < (\d+)", where_clause or "") ] + [ epoch_end + 1 ])
+        last = re.search(r"\(tstamp > (\d+)\) OR \(tstamp = \d+ AND rowid > '(\w+)'\)", where_clause or "")
+        last = (int(last.group(1)), last.group(2)) if (last is not None) else (0, "")
+        rows = [ row for row in self.alerts.get(alert_family, [])
+                 if ((row["tstamp"] >= epoch_begin) and (low <= row["tstamp"] < high) and ((row["tstamp"], row["rowid"]) > last)) ]
+
+        if(self.ordered):
+            rows = sorted(rows, key = lambda row: (row["tstamp"], row["rowid"]))
+        else:
+            rows = list(reversed(rows))
+
+        return(rows[:maxhits])
+
+class AlertFollowerTest(unittest.TestCase):
+    def setUp(self):
+        self.historical = FakeHistorical({ "flow": [ { "tstamp": 1000, "rowid": "a" }, { "tstamp": 1010, "rowid": "b" } ] })
+        self.tmp_dir    = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_first_poll(self):
+        follower = AlertFollower(self.historical, 0, families = [ "flow" ], start = 1000)
+        alerts   = follower.poll()
+
+        self.assertEqual([ (alert["rowid"], alert["alert_family"]) for alert in alerts ], [ ("a", "flow"), ("b", "flow") ])
+        self.assertEqual(self.historical.calls, [ { "alert_family": "flow", "ifid": 0, "epoch_begin": 1000, "select_clause": "*",
+                                                    "where_clause": None, "maxhits": 1000, "group_by": None,
+                                                    "order_by": "tstamp, rowid" } ])
+
+    def test_where_clause(self):
+        follower = AlertFollower(self.historical, 0, families = [ "flow" ], where_clause = "severity >= 5", start = 1000, overlap = 60)
+        follower.poll()
+        follower.poll()
+
+        self.assertEqual(self.historical.calls[0]["where_clause"], "severity >= 5")
+        self.assertEqual(self.historical.calls[1]["where_clause"], "(severity >= 5) AND tstamp >= 950")
+
+    def test_overlap(self):
+        follower = AlertFollower(self.historical, 0, families = [ "flow" ], start = 1000, overlap = 60, lookback = 100)
+        follower.poll()
+
+        # An alert stored late (older than the watermark) and a new one: the window is read again
+        self.historical.alerts["flow"] += [ { "tstamp": 1005, "rowid": "c" }, { "tstamp": 1020, "rowid": "d" } ]
+        alerts = follower.poll()
+
+        self.assertEqual([ alert["rowid"] for alert in alerts ], [ "c", "d" ])
+        self.assertEqual(self.historical.calls[1]["where_clause"], "tstamp >= 950")
+        self.assertEqual(self.historical.calls[1]["epoch_begin"], 850)
+        self.assertEqual(follower.get_watermarks(), { "flow": { "tstamp": 1020, "rowid": "d" } })
+        self.assertEqual(follower.poll(), [])
+
+    def test_restart(self):
+        state_file = os.path.join(self.tmp_dir, "follower.json")
+        follower   = AlertFollower(self.historical, 0, families = [ "flow" ], state_file = state_file, start = 1000)
+        follower.poll()
+
+        self.historical.alerts["flow"].append({ "tstamp": 1030, "rowid": "e" })
+        restarted = AlertFollower(self.historical, 0, families = [ "flow" ], state_file = state_file, start = 2000)
+
+        self.assertEqual(restarted.get_watermarks(), { "flow": { "tstamp": 1010, "rowid": "b" } })
+        self.assertEqual([ alert["rowid"] for alert in restarted.poll() ], [ "e" ])
+
+    def test_saturated(self):
+        follower = AlertFollower(self.historical, 0, families = [ "flow" ], start = 1000, page_size = 1)
+
+        self.assertEqual([ alert["rowid"] for alert in follower.poll() ], [ "a" ])
+        self.assertEqual(follower.interval, 0)
+        self.assertEqual([ alert["rowid"] for alert in follower.poll() ], [ "b" ])
+
+    def test_unordered_server(self):
+        # A server ignoring the order by returns an arbitrary page: no alert must be skipped
+        alerts     = [ { "tstamp": 1000 + i, "rowid": "r" + str(i) } for i in range(10) ]
+        historical = FakeHistorical({ "flow": alerts + [ { "tstamp": 1005, "rowid": "s" + str(i) } for i in range(5) ] }, ordered = False)
+        follower   = AlertFollower(historical, 0, families = [ "flow" ], start = 1000, page_size = 4)
+        read       = []
+
+        for i in range(10):
+            polled = follower.poll()
+            self.assertEqual(polled, sorted(polled, key = lambda alert: (alert["tstamp"], alert["rowid"])))
+            read += [ alert["rowid"] for alert in polled ]
+
+        self.assertEqual(sorted(read), sorted([ "r" + str(i) for i in range(10) ] + [ "s" + str(i) for i in range(5) ]))
+        self.assertEqual(follower.get_watermarks(), { "flow": { "tstamp": 1009, "rowid": "r9" } })
+
+    def test_update_interval(self):
+        follower  = AlertFollower(self.historical, 0, families = [ "flow" ], min_interval = 1, max_interval = 8)
+        intervals = [ follower.update_interval(0, False) for i in range(4) ]
+
+        self.assertEqual(intervals, [ 2, 4, 8, 8 ])
+        self.assertEqual(follower.update_interval(10, False), 4)
+        self.assertEqual(follower.update_interval(10, True), 0)
+        self.assertEqual(follower.update_interval(10, False), 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+
+"""
+Offline checks for the multi-family alert query
+"""
+
+import unittest
+
+from ntopng.historical import Historical
+
+class FakeNtopng:
+    # Each family returns its alerts sorted by tstamp as requested (unless ordered is False); 'snmp' is not available
+    def __init__(self, alerts, ordered = True):
+        self.alerts  = alerts
+        self.ordered = ordered
+
+    def request(self, url, params):
+        family = params["alert_family"]
+
+        if(family not in self.alerts):
+            raise Exception("Invalid response code 404")
+
+        rows = self.alerts[family]
+
+        if(self.ordered):
+            rows = sorted(rows, key = lambda row: row["tstamp"], reverse = params["order_by_clause"].endswith("DESC"))
+
+        return(rows[:params["maxhits_clause"]])
+
+class AllAlertsTest(unittest.TestCase):
+    def setUp(self):
+        self.historical = Historical(FakeNtopng({ "flow": [ { "tstamp": 50 }, { "tstamp": 20 }, { "tstamp": 10 } ],
+                                                  "host": [ { "tstamp": 40 }, { "tstamp": 30 } ],
+                                                  "system": [] }))
+
+    def test_merge(self):
+        rows = self.historical.get_all_alerts(0, 0, 100, "tstamp", "", 4, families = [ "flow", "host", "system" ])
+
+        self.assertEqual([ (row["tstamp"], row["alert_family"]) for row in rows ],
+                         [ (50, "flow"), (40, "host"), (30, "host"), (20, "flow") ])
+
+    def test_order_by(self):
+        rows = self.historical.get_all_alerts(0, 0, 100, "tstamp", "", 3, order_by = "tstamp", families = [ "flow", "host" ])
+
+        self.assertEqual([ row["tstamp"] for row in rows ], [ 10, 20, 30 ])
+
+    def test_unordered_server(self):
+        # A server ignoring the order by: the rows of each family are sorted before the merge
+        historical = Historical(FakeNtopng({ "flow": [ { "tstamp": 20 }, { "tstamp": 50 }, { "tstamp": 10 } ],
+                                             "host": [ { "tstamp": 30 }, { "tstamp": 40 } ] }, ordered = False))
+        rows = historical.get_all_alerts(0, 0, 100, "tstamp", "", 10, families = [ "flow", "host" ])
+
+        self.assertEqual([ row["tstamp"] for row in rows ], [ 50, 40, 30, 20, 10 ])
+
+    def test_skip_errors(self):
+        with self.assertRaises(Exception):
+            self.historical.get_all_alerts(0, 0, 100, "tstamp", "", 10, families = [ "flow", "snmp" ])
+
+        rows = self.historical.get_all_alerts(0, 0, 100, "tstamp", "", 10, families = [ "flow", "snmp" ], skip_errors = True)
+        self.assertEqual(len(rows), 3)
+
+    def test_missing_order_by_column(self):
+        with self.assertRaises(ValueError):
+            self.historical.get_all_alerts(0, 0, 100, "alert_id", "", 10, order_by = "severity DESC", families = [ "flow" ])
+
+if __name__ == "__main__":
+    unittest.main()
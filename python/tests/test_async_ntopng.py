@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+
+"""
+Offline checks for the asyncio client (against a local HTTP server)
+"""
+
+import json
+import time
+import asyncio
+import threading
+import unittest
+from urllib.parse import urlsplit, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from ntopng.interface import Interface
+from ntopng.metrics import Metrics
+from ntopng.flow_diff import FlowSnapshotDiffer
+from ntopng.async_ntopng import AsyncNtopng, AsyncInterface, AsyncHost, AsyncFlow, AsyncHistorical, RequestBuilder, get_query_params
+
+NUM_FLOWS = 12000
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    lock      = threading.Lock()
+    in_flight = 0
+    max_in_flight = 0
+
+    def reply(self, status, rsp):
+        body = json.dumps({ "rc": 0, "rc_str": "OK", "rsp": rsp }).encode("utf-8")
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_request(self, body):
+        url = urlsplit(self.path)
+
+        with Handler.lock:
+            Handler.in_flight += 1
+            Handler.max_in_flight = max(Handler.max_in_flight, Handler.in_flight)
+
+        try:
+            if(url.path.endswith("/slow.lua")):
+                time.sleep(0.05)
+
+            if(url.path.endswith("/flow/active.lua")):
+                # A page of active flows
+                query = parse_qs(url.query)
+                first = (int(query["currentPage"][0]) - 1) * int(query["perPage"][0])
+
+                last  = min(first + int(query["perPage"][0]), NUM_FLOWS)
+
+                self.reply(200, { "totalRows": NUM_FLOWS, "data": [ { "key": i, "client": { "ip": "10.0.0.1", "port": i }, "bytes": 100 * i }
+                                                                      for i in range(first, last) ] })
+                return
+
+            self.reply(404 if url.path.endswith("/missing.lua") else 200,
+                       { "method": self.command, "path": url.path, "query": parse_qs(url.query),
+                         "body": json.loads(body) if body else None, "auth": self.headers.get("Authorization") })
+        finally:
+            with Handler.lock:
+                Handler.in_flight -= 1
+
+    def do_GET(self):
+        self.handle_request(None)
+
+    def do_POST(self):
+        self.handle_request(self.rfile.read(int(self.headers["Content-Length"])))
+
+    def log_message(self, format, *args):
+        pass
+
+class FakeNtopng:
+    # The attributes of an Ntopng handle used by the asyncio client (no self test request)
+    def __init__(self, url):
+        self.url             = url
+        self.rest_v2_url     = "/lua/rest/v2"
+        self.rest_pro_v2_url = "/lua/pro/rest/v2"
+        self.auth_token      = "secret"
+        self.headers         = { "Authorization": "Token secret" }
+        self.post_headers    = dict(self.headers, **{ "Content-Type": "application/json" })
+        self.metrics         = Metrics()
+
+class RequestBuilderTest(unittest.TestCase):
+    def test_pending_request(self):
+        pending = Interface(RequestBuilder(FakeNtopng("http://localhost:3000"))).get_data(2)
+
+        self.assertEqual((pending.method, pending.url, pending.params), ("GET", "/lua/rest/v2/get/interface/data.lua", { "ifid": 2 }))
+
+    def test_query_params(self):
+        self.assertEqual(get_query_params({ "ifid": 1, "host": None, "l7": [ "TLS", "DNS" ] }),
+                         [ ("ifid", "1"), ("l7", "TLS"), ("l7", "DNS") ])
+        self.assertEqual(get_query_params(None), [])
+
+@unittest.skipIf(aiohttp is None, "aiohttp is not installed")
+class AsyncNtopngTest(unittest.TestCase):
+    def setUp(self):
+        Handler.max_in_flight = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.ntopng = FakeNtopng("http://127.0.0.1:" + str(self.server.server_address[1]))
+        threading.Thread(target = self.server.serve_forever, daemon = True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_get_and_post(self):
+        async def run():
+            async with AsyncNtopng(self.ntopng) as async_ntopng:
+                data  = await AsyncInterface(async_ntopng).get_data(1)
+                flows = await AsyncHistorical(async_ntopng).get_flows(0, 10, 20, "*", "", 5, "", "")
+
+            return(data, flows)
+
+        data, flows = asyncio.run(run())
+
+        self.assertEqual((data["method"], data["path"], data["query"], data["auth"]), ("GET", "/lua/rest/v2/get/interface/data.lua", { "ifid": [ "1" ] }, "Token secret"))
+        self.assertEqual((flows["method"], flows["body"]["epoch_begin"], flows["body"]["maxhits_clause"]), ("POST", 10, 5))
+
+        stats = self.ntopng.metrics.get_stats()
+        self.assertEqual(stats["GET /lua/rest/v2/get/interface/data.lua"]["requests"], 1)
+        self.assertEqual(stats["POST /lua/pro/rest/v2/get/db/flows.lua"]["status_codes"], { 200: 1 })
+
+    def test_filters(self):
+        async def run():
+            async with AsyncNtopng(self.ntopng) as async_ntopng:
+                return(await AsyncHost(async_ntopng).get_active_hosts_paginated(0, 1, 10, "traffic", "desc", mode = "local"))
+
+        self.assertEqual(asyncio.run(run())["query"], { "ifid": [ "0" ], "currentPage": [ "1" ], "perPage": [ "10" ], "mode": [ "local" ],
+                                                        "sortColumn": [ "traffic" ], "sortOrder": [ "desc" ] })
+
+    def test_stream(self):
+        async def run():
+            async with AsyncNtopng(self.ntopng) as async_ntopng:
+                flows = await AsyncFlow(async_ntopng).get_active_flows_paginated_stream(0, 2, 5000)
+
+                return([ flow["key"] async for flow in flows ])
+
+        self.assertEqual(asyncio.run(run()), list(range(5000, 10000)))
+
+        # The bytes of the streamed body are counted as they are read
+        stats = self.ntopng.metrics.get_stats()["GET /lua/rest/v2/get/flow/active.lua"]
+        self.assertGreater(stats["response_bytes"], 5000 * len('{"key": 0, "bytes": 0}'))
+
+    def test_active_flows_pages(self):
+        async def run():
+            async with AsyncNtopng(self.ntopng) as async_ntopng:
+                return([ flow["key"] async for flow in AsyncFlow(async_ntopng).iter_active_flows(0, per_page = 1000, prefetch = 3) ])
+
+        self.assertEqual(asyncio.run(run()), list(range(NUM_FLOWS)))
+
+    def test_active_flows_delta(self):
+        differ = FlowSnapshotDiffer()
+
+        async def run():
+            async with AsyncNtopng(self.ntopng) as async_ntopng:
+                return(await AsyncFlow(async_ntopng).get_active_flows_delta(0, differ, per_page = 4000))
+
+        self.assertEqual(len(asyncio.run(run())), NUM_FLOWS)
+        self.assertEqual(differ.get_stats()["flows"], NUM_FLOWS)
+
+    @unittest.skipIf(np is None, "numpy is not installed")
+    def test_active_flows_table(self):
+        async def run():
+            async with AsyncNtopng(self.ntopng) as async_ntopng:
+                return(await AsyncFlow(async_ntopng).get_active_flows_table(0, per_page = 4000))
+
+        table = asyncio.run(run())
+
+        self.assertEqual(len(table), NUM_FLOWS)
+        self.assertEqual(int(table.column("bytes").sum()), 100 * NUM_FLOWS * (NUM_FLOWS - 1) // 2)
+
+    def test_invalid_response_code(self):
+        async def run():
+            async with AsyncNtopng(self.ntopng) as async_ntopng:
+                await async_ntopng.request("/lua/rest/v2/missing.lua", None)
+
+        with self.assertRaises(Exception):
+            asyncio.run(run())
+
+    def test_request_methods_only(self):
+        async_ntopng = AsyncNtopng(self.ntopng)
+
+        with self.assertRaises(AttributeError):
+            AsyncInterface(async_ntopng).self_test
+
+    def test_bounded_concurrency(self):
+        async def run():
+            async with AsyncNtopng(self.ntopng, max_concurrency = 2) as async_ntopng:
+                return(await asyncio.gather(*[ async_ntopng.request("/lua/rest/v2/slow.lua", { "i": i }) for i in range(6) ]))
+
+        self.assertEqual(len(asyncio.run(run())), 6)
+        self.assertLessEqual(Handler.max_in_flight, 2)
+
+    def test_session_per_event_loop(self):
+        async_ntopng = AsyncNtopng(self.ntopng)
+        flow         = AsyncFlow(async_ntopng)
+        sessions     = []
+
+        async def run():
+            await flow.get_active_l4_proto_flow_counters(0)
+            sessions.append(async_ntopng.sessions[asyncio.get_running_loop()])
+            await async_ntopng.close()
+
+        # Successive asyncio.run calls: each loop has its own session
+        asyncio.run(run())
+        asyncio.run(run())
+
+        self.assertIsNot(sessions[0], sessions[1])
+        self.assertEqual(len(async_ntopng.sessions), 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+"""
+Offline checks for the REST response cache
+"""
+
+import threading
+import unittest
+
+from ntopng.cache import ResponseCache
+
+class Loader:
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return(self.value)
+
+class ResponseCacheTest(unittest.TestCase):
+    def test_hit_and_uncached_endpoint(self):
+        cache  = ResponseCache()
+        loader = Loader([ 1, 2, 3 ])
+
+        for i in range(3):
+            self.assertEqual(cache.get("GET", "/lua/rest/v2/get/alert/type/consts.lua", {}, loader), [ 1, 2, 3 ])
+
+        self.assertEqual(loader.calls, 1)
+
+        for i in range(2):
+            cache.get("GET", "/lua/rest/v2/get/host/data.lua", {}, loader)
+
+        self.assertEqual(loader.calls, 3)
+        self.assertEqual(cache.get_stats()["hits"], 2)
+
+    def test_params_in_key(self):
+        cache = ResponseCache()
+        a = cache.get("GET", "/lua/rest/v2/get/ntopng/interfaces.lua", { "ifid": 0 }, Loader("a"))
+        b = cache.get("GET", "/lua/rest/v2/get/ntopng/interfaces.lua", { "ifid": 1 }, Loader("b"))
+
+        self.assertEqual((a, b), ("a", "b"))
+
+    def test_identity_in_key(self):
+        # A cache shared by handles of different instances or users
+        cache = ResponseCache()
+        a = cache.get("GET", "/lua/rest/v2/get/ntopng/interfaces.lua", {}, Loader("a"), "http://a:3000 user:admin")
+        b = cache.get("GET", "/lua/rest/v2/get/ntopng/interfaces.lua", {}, Loader("b"), "http://b:3000 user:admin")
+        c = cache.get("GET", "/lua/rest/v2/get/ntopng/interfaces.lua", {}, Loader("c"), "http://a:3000 user:guest")
+        d = cache.get("GET", "/lua/rest/v2/get/ntopng/interfaces.lua", {}, Loader("d"), "http://a:3000 user:admin")
+
+        self.assertEqual((a, b, c, d), ("a", "b", "c", "a"))
+
+    def test_lru_eviction(self):
+        cache = ResponseCache(default_ttl = 60, max_entries = 2)
+
+        for i in range(3):
+            cache.get("GET", "/lua/rest/v2/get/" + str(i), {}, Loader(i))
+
+        self.assertEqual(cache.get_stats()["entries"], 2)
+        self.assertEqual(cache.get_stats()["evictions"], 1)
+
+    def test_invalidate(self):
+        cache  = ResponseCache()
+        loader = Loader("x")
+
+        cache.get("GET", "/lua/rest/v2/get/ntopng/interfaces.lua", {}, loader)
+        cache.invalidate("/get/ntopng/interfaces.lua")
+        cache.get("GET", "/lua/rest/v2/get/ntopng/interfaces.lua", {}, loader)
+
+        self.assertEqual(loader.calls, 2)
+
+    def test_concurrent_set_ttl(self):
+        # TTLs added while other threads look them up
+        cache  = ResponseCache(default_ttl = 60)
+        done   = threading.Event()
+        errors = []
+
+        def lookup():
+            try:
+                while(not done.is_set()):
+                    cache.get_ttl("/lua/rest/v2/get/host/data.lua")
+            except Exception as e:
+                errors.append(e)
+
+        threads = [ threading.Thread(target = lookup) for i in range(2) ]
+
+        for thread in threads:
+            thread.start()
+
+        for i in range(2000):
+            cache.set_ttl("/get/endpoint/" + str(i) + ".lua", 10)
+
+        done.set()
+
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(cache.get_ttl("/lua/rest/v2/get/endpoint/7.lua"), 10)
+
+    def test_refresh_after_invalidate(self):
+        # A background refresh started before invalidate() must not store its response
+        cache = ResponseCache()
+        url   = "/lua/rest/v2/get/ntopng/interfaces.lua"
+
+        cache.get("GET", url, {}, Loader("old"))
+        key, entry = next(iter(cache.entries.items()))
+        cache.refresh(key, url, 300, Loader("new"), entry)
+
+        self.assertEqual(cache.get("GET", url, {}, Loader("x")), "new")
+
+        key, entry = next(iter(cache.entries.items()))
+        cache.invalidate()
+        cache.refresh(key, url, 300, Loader("stale"), entry)
+
+        self.assertEqual(cache.get_stats()["entries"], 0)
+        self.assertEqual(cache.get("GET", url, {}, Loader("fresh")), "fresh")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+
+"""
+Offline checks for the server-side filters and sorting of the active listings
+"""
+
+import unittest
+
+from ntopng.ntopng import get_filter_params
+from ntopng.flow import Flow, FLOW_FILTERS
+from ntopng.host import Host, HOST_FILTERS
+
+class FakeNtopng:
+    # Records the parameters of the requests
+    def __init__(self):
+        self.params = []
+
+    def request(self, url, params):
+        self.params.append(params)
+        return({ "data": [] })
+
+class FilterParamsTest(unittest.TestCase):
+    def test_filter_params(self):
+        params = get_filter_params({ "application": "TLS", "l4proto": 6, "vlan": None, "talking_with": True }, FLOW_FILTERS)
+
+        self.assertEqual(params, { "application": "TLS", "l4proto": 6, "talking_with": "true" })
+        self.assertEqual(get_filter_params(None, FLOW_FILTERS), {})
+
+    def test_unknown_filter(self):
+        with self.assertRaises(ValueError) as ctx:
+            get_filter_params({ "applicaton": "TLS" }, FLOW_FILTERS)
+
+        self.assertIn("applicaton", str(ctx.exception))
+
+        with self.assertRaises(ValueError):
+            Host(FakeNtopng()).get_active_hosts_paginated(0, 1, 10, application = "TLS")
+
+    def test_flows_request(self):
+        ntopng_obj = FakeNtopng()
+        flow = Flow(ntopng_obj)
+
+        flow.get_active_flows_paginated(0, 2, 100, "bytes", "desc", application = "TLS", port = 443)
+        flow.get_active_host_flows_paginated(0, "10.0.0.1", 0, 1, 10, verbose = True)
+
+        self.assertEqual(ntopng_obj.params[0], { "ifid": 0, "currentPage": 2, "perPage": 100, "sortColumn": "bytes", "sortOrder": "desc",
+                                                 "application": "TLS", "port": 443 })
+        self.assertEqual(ntopng_obj.params[1], { "ifid": 0, "currentPage": 1, "perPage": 10, "host": "10.0.0.1", "vlan": 0, "verbose": "true" })
+
+    def test_hosts_request(self):
+        ntopng_obj = FakeNtopng()
+
+        Host(ntopng_obj).get_active_hosts_paginated(0, 1, 50, "traffic", "desc", mode = "local", country = "IT", os = None)
+
+        self.assertEqual(ntopng_obj.params[0], { "ifid": 0, "currentPage": 1, "perPage": 50, "sortColumn": "traffic", "sortOrder": "desc",
+                                                 "mode": "local", "country": "IT" })
+        self.assertIn("mac", HOST_FILTERS)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+
+"""
+Offline checks for the active flow page walk
+"""
+
+import threading
+import unittest
+
+from ntopng.flow import Flow
+
+class FakeNtopng:
+    # Serves the pages of num_flows active flows
+    def __init__(self, num_flows):
+        self.num_flows = num_flows
+        self.requests  = []
+        self.lock      = threading.Lock()
+
+    def request(self, url, params):
+        with self.lock:
+            self.requests.append(params)
+
+        first = (params["currentPage"] - 1) * params["perPage"]
+        last  = min(first + params["perPage"], self.num_flows)
+
+        return({ "totalRows": self.num_flows, "currentPage": params["currentPage"], "perPage": params["perPage"],
+                 "data": [ { "key": i } for i in range(first, last) ] })
+
+class ActiveFlowsPagesTest(unittest.TestCase):
+    def test_fixed_page_size(self):
+        ntopng_obj = FakeNtopng(2500)
+        pages = list(Flow(ntopng_obj).iter_active_flows_pages(0, per_page = 1000, prefetch = 2, adaptive = False))
+
+        self.assertEqual([ len(page) for page in pages ], [ 1000, 1000, 500 ])
+        self.assertEqual([ flow["key"] for page in pages for flow in page ], list(range(2500)))
+        # No page is requested past totalRows
+        self.assertEqual(sorted([ p["currentPage"] for p in ntopng_obj.requests ]), [ 1, 2, 3 ])
+
+    def test_adaptive_page_size(self):
+        # Fast responses: the page size grows up to max_per_page, pages stay aligned
+        ntopng_obj = FakeNtopng(20000)
+        flows = [ flow for page in Flow(ntopng_obj).iter_active_flows_pages(0, per_page = 500, prefetch = 3, max_per_page = 4000) for flow in page ]
+
+        self.assertEqual([ flow["key"] for flow in flows ], list(range(20000)))
+        self.assertEqual(max([ p["perPage"] for p in ntopng_obj.requests ]), 4000)
+
+        for p in ntopng_obj.requests:
+            self.assertEqual(p["perPage"] % 500, 0)
+
+    def test_host_flows(self):
+        ntopng_obj = FakeNtopng(10)
+        flows = list(Flow(ntopng_obj).iter_active_flows(0, host = "10.0.0.1", vlan = 0, per_page = 100))
+
+        self.assertEqual(len(flows), 10)
+        self.assertEqual((ntopng_obj.requests[0]["host"], ntopng_obj.requests[0]["vlan"]), ("10.0.0.1", 0))
+
+    def test_empty(self):
+        self.assertEqual(list(Flow(FakeNtopng(0)).iter_active_flows_pages(0)), [ [] ])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+
+"""
+Offline checks for the active flows snapshot differ
+"""
+
+import unittest
+
+from ntopng.flow_diff import FlowSnapshotDiffer, FLOW_ADDED, FLOW_CHANGED, FLOW_REMOVED
+
+def make_flow(cli_port, bytes, packets = None, first_seen = 100, last_seen = 110):
+    flow = { "client": { "ip": "10.0.0.1", "port": cli_port }, "server": { "ip": "10.0.0.2", "port": 443 },
+             "protocol": { "l4": "TCP", "l7": "TLS" }, "vlan": 0, "bytes": bytes,
+             "first_seen": first_seen, "last_seen": last_seen }
+
+    if(packets is not None):
+        flow["packets"] = packets
+
+    return(flow)
+
+class FlowSnapshotDifferTest(unittest.TestCase):
+    def test_added_changed_removed(self):
+        differ = FlowSnapshotDiffer()
+        differ.update([ make_flow(1, 100, 1), make_flow(2, 200, 2) ])
+        events = differ.update([ make_flow(1, 150, 3, last_seen = 120), make_flow(3, 10, 1) ])
+
+        self.assertEqual(sorted([ (e.type, e.key[1], e.bytes_delta) for e in events ]),
+                         [ (FLOW_ADDED, 3, 10), (FLOW_CHANGED, 1, 50), (FLOW_REMOVED, 2, 0) ])
+
+    def test_duplicate_key_across_pages(self):
+        differ = FlowSnapshotDiffer()
+        differ.update([ make_flow(1, 100, 1) ])
+
+        # The flow moved to the second page during the walk and was returned twice
+        pages  = [ [ make_flow(1, 150, 2, last_seen = 120) ], [ make_flow(1, 180, 3, last_seen = 125) ] ]
+        events = differ.update(flow for page in pages for flow in page)
+
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0].type, FLOW_CHANGED)
+        self.assertEqual((events[0].bytes_delta, events[0].packets_delta), (80, 2))
+        self.assertEqual(differ.get_stats()["flows"], 1)
+
+        # The older record returned last must not move the counters back
+        events = differ.update([ make_flow(1, 200, 4, last_seen = 130), make_flow(1, 180, 3, last_seen = 125) ])
+        self.assertEqual([ (e.type, e.bytes_delta) for e in events ], [ (FLOW_CHANGED, 20) ])
+
+    def test_duplicate_key_first_snapshot(self):
+        differ = FlowSnapshotDiffer()
+        events = differ.update([ make_flow(1, 100), make_flow(1, 120, last_seen = 115) ])
+
+        self.assertEqual([ (e.type, e.bytes_delta) for e in events ], [ (FLOW_ADDED, 120) ])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+"""
+Offline checks for the planner of the active flows of many hosts
+"""
+
+import unittest
+
+from ntopng.flow import Flow
+from ntopng.flow_planner import HostFlowsPlanner
+
+def make_flow(cli_ip, srv_ip, vlan = 0):
+    return({ "client": { "ip": cli_ip, "port": 1234 }, "server": { "ip": srv_ip, "port": 443 }, "vlan": vlan, "bytes": 100 })
+
+FLOWS = [ make_flow("10.0.0.1", "10.0.0.2"), make_flow("10.0.0.3", "10.0.0.1"), make_flow("10.0.0.2", "10.0.0.4", 10),
+          make_flow("10.0.0.4", "10.0.0.5") ]
+
+class FakeNtopng:
+    # Serves the interface counters and the (host filtered) active flows
+    def __init__(self, data):
+        self.data     = data
+        self.requests = []
+
+    def request(self, url, params):
+        self.requests.append(url)
+
+        if(url.endswith("/get/interface/data.lua")):
+            return(self.data)
+
+        flows = [ f for f in FLOWS if (params.get("host") is None) or ((params["host"] in (f["client"]["ip"], f["server"]["ip"]))
+                                                                       and ((params.get("vlan") is None) or (params["vlan"] == f["vlan"]))) ]
+        first = (params["currentPage"] - 1) * params["perPage"]
+
+        return({ "totalRows": len(flows), "data": flows[first:first + params["perPage"]] })
+
+class HostFlowsPlannerTest(unittest.TestCase):
+    def test_cost_choice(self):
+        planner = HostFlowsPlanner(Flow(FakeNtopng({})))
+
+        # A few hosts out of many: one request per host
+        plan = planner.plan(0, [ "10.0.0.1", "10.0.0.2" ], num_flows = 100000, num_hosts = 10000)
+        self.assertEqual((plan["strategy"], plan["requests"]), ("fanout", 2))
+        self.assertLess(plan["estimated_cost"]["fanout"], plan["estimated_cost"]["scan"])
+
+        # Many hosts of a large interface: every request would walk all the flows
+        plan = planner.plan(0, [ "10.0.%d.%d" % (i // 250, i % 250) for i in range(500) ], num_flows = 1000000, num_hosts = 1000)
+        self.assertEqual((plan["strategy"], plan["requests"]), ("scan", 200))
+        self.assertTrue(plan["reason"].startswith("scan: "))
+
+    def test_interface_counters(self):
+        ntopng_obj = FakeNtopng({ "num_flows": 1000, "num_hosts": 500 })
+        planner    = HostFlowsPlanner(Flow(ntopng_obj))
+
+        self.assertEqual(planner.plan(0, [ "10.0.0.1" ])["num_flows"], 1000)
+        self.assertEqual(len(ntopng_obj.requests), 1)
+
+        # Without the flow count: one request per host
+        plan = HostFlowsPlanner(Flow(FakeNtopng({}))).plan(0, [ "10.0.0.1" ])
+        self.assertEqual((plan["strategy"], plan["estimated_cost"]), ("fanout", None))
+
+    def test_same_flows(self):
+        flow  = Flow(FakeNtopng({ "num_flows": len(FLOWS), "num_hosts": 5 }))
+        hosts = [ "10.0.0.1", ("10.0.0.2", 10), "10.0.0.9" ]
+
+        scan   = flow.get_hosts_active_flows(0, hosts, "scan")
+        fanout = flow.get_hosts_active_flows(0, hosts, "fanout")
+
+        self.assertEqual(scan["flows"], fanout["flows"])
+        self.assertEqual(scan["flows"]["10.0.0.1"], FLOWS[:2])
+        self.assertEqual(scan["flows"][("10.0.0.2", 10)], [ FLOWS[2] ])
+        self.assertEqual(scan["flows"]["10.0.0.9"], [])
+        self.assertEqual((scan["plan"]["strategy"], fanout["plan"]["strategy"]), ("scan", "fanout"))
+
+    def test_invalid_arguments(self):
+        flow = Flow(FakeNtopng({}))
+
+        with self.assertRaises(ValueError):
+            flow.get_hosts_active_flows(0, [ "10.0.0.1" ], "index")
+
+        with self.assertRaises(ValueError):
+            flow.get_hosts_active_flows(0, [ "10.0.0.1" ], host = "10.0.0.2")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+
+"""
+Offline checks for the columnar flow table
+"""
+
+import unittest
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from ntopng.flow_table import FlowTable
+
+def make_flow(cli_ip, srv_ip, l7, bytes, packets = 1):
+    return({ "client": { "ip": cli_ip, "port": 1234 }, "server": { "ip": srv_ip, "port": 443 },
+             "protocol": { "l4": "TCP", "l7": l7 }, "vlan": 0, "bytes": bytes, "packets": packets,
+             "first_seen": 100, "last_seen": 110, "duration": 10, "thpt": { "bps": 8.0 } })
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class FlowTableTest(unittest.TestCase):
+    def test_group_by(self):
+        table = FlowTable.from_flows([ make_flow("10.0.0.1", "10.0.0.2", "TLS", 100),
+                                       make_flow("10.0.0.1", "10.0.0.3", "DNS", 10),
+                                       make_flow("10.0.0.4", "10.0.0.2", "TLS", 50) ])
+        rows = table.group_by([ "l7_proto" ]).to_dicts()
+
+        self.assertEqual(sorted([ (r["l7_proto"], r["bytes"], r["count"]) for r in rows ]),
+                         [ ("DNS", 10, 1), ("TLS", 150, 2) ])
+
+    def test_group_by_empty(self):
+        table = FlowTable.from_flows([])
+
+        self.assertEqual(len(table.group_by([ "cli_ip", "srv_ip" ])), 0)
+
+    def test_top_and_ipv6(self):
+        table = FlowTable.from_flows([ make_flow("10.0.0.1", "10.0.0.2", "TLS", 100),
+                                       make_flow("2001:db8::1", "10.0.0.2", "TLS", 300) ])
+        rows = table.top(1).to_dicts()
+
+        self.assertEqual([ (r["cli_ip"], r["bytes"]) for r in rows ], [ ("2001:db8::1", 300) ])
+
+    def test_string_counters(self):
+        table = FlowTable.from_flows([ make_flow("10.0.0.1", "10.0.0.2", "TLS", str(2**63 + 1)) ])
+
+        self.assertEqual(int(table.column("bytes")[0]), 2**63 + 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+
+"""
+Offline checks for the historical query cache
+"""
+
+import time
+import shutil
+import tempfile
+import unittest
+
+from ntopng.historical import Historical
+from ntopng.historical_cache import HistoricalCache, get_fingerprint, get_identity
+
+class FakeNtopng:
+    def __init__(self, url = "http://localhost:3000", auth_token = "secret"):
+        self.url        = url
+        self.auth_token = auth_token
+        self.calls      = 0
+
+    def post_request(self, url, params):
+        self.calls += 1
+        return([ { "FLOW_ID": self.calls } ])
+
+class HistoricalCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_fingerprint(self):
+        # Clauses differing only in whitespace, and empty parameters, give the same query
+        a = get_fingerprint("/get/db/flows.lua", { "ifid": 0, "where_clause": "L7_PROTO = 7  AND VLAN_ID = 0", "group_by_clause": "" })
+        b = get_fingerprint("/get/db/flows.lua", { "ifid": 0, "where_clause": "L7_PROTO = 7 AND\nVLAN_ID = 0" })
+
+        self.assertEqual(a, b)
+        self.assertNotEqual(a, get_fingerprint("/get/db/flows.lua", { "ifid": 1, "where_clause": "L7_PROTO = 7 AND VLAN_ID = 0" }))
+
+    def test_fingerprint_literals(self):
+        # Whitespace inside quoted literals is part of the value
+        a = get_fingerprint("/get/db/flows.lua", { "ifid": 0, "where_clause": "INFO = 'a  b'" })
+        b = get_fingerprint("/get/db/flows.lua", { "ifid": 0, "where_clause": "INFO = 'a b'" })
+        c = get_fingerprint("/get/db/flows.lua", { "ifid": 0, "where_clause": " INFO  =\t'a  b' " })
+        d = get_fingerprint("/get/db/flows.lua", { "ifid": 0, "where_clause": "INFO = 'it\\'s  ' AND  L7_PROTO = 7" })
+        e = get_fingerprint("/get/db/flows.lua", { "ifid": 0, "where_clause": "INFO = 'it\\'s  ' AND L7_PROTO = 7" })
+
+        self.assertNotEqual(a, b)
+        self.assertEqual(a, c)
+        self.assertEqual(d, e)
+
+    def test_closed_window_on_disk(self):
+        epoch_end = int(time.time()) - 3600
+        cache = HistoricalCache(self.cache_dir)
+        calls = []
+
+        def loader():
+            calls.append(1)
+            return([ 1, 2, 3 ])
+
+        self.assertEqual(cache.get("/get/db/flows.lua", { "ifid": 0 }, epoch_end, loader), [ 1, 2, 3 ])
+        self.assertEqual(cache.get("/get/db/flows.lua", { "ifid": 0 }, epoch_end, loader), [ 1, 2, 3 ])
+        self.assertEqual(cache.get_stats()["disk_entries"], 1)
+
+        # The results of closed windows survive a restart
+        cache = HistoricalCache(self.cache_dir)
+        self.assertEqual(cache.get("/get/db/flows.lua", { "ifid": 0 }, epoch_end, loader), [ 1, 2, 3 ])
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(cache.get_stats()["disk_hits"], 1)
+
+    def test_open_window_in_memory(self):
+        cache = HistoricalCache(self.cache_dir, open_ttl = 60)
+        calls = []
+
+        def loader():
+            calls.append(1)
+            return(len(calls))
+
+        epoch_end = int(time.time())
+
+        self.assertEqual(cache.get("/get/db/flows.lua", { "ifid": 0 }, epoch_end, loader), 1)
+        self.assertEqual(cache.get("/get/db/flows.lua", { "ifid": 0 }, epoch_end, loader), 1)
+
+        stats = cache.get_stats()
+        self.assertEqual((stats["memory_hits"], stats["open_entries"], stats["disk_entries"]), (1, 1, 0))
+
+        # Expired
+        cache.open_ttl = -1
+        cache.clear()
+        self.assertEqual(cache.get("/get/db/flows.lua", { "ifid": 0 }, epoch_end, loader), 2)
+        self.assertEqual(cache.get("/get/db/flows.lua", { "ifid": 0 }, epoch_end, loader), 3)
+
+    def test_disk_eviction(self):
+        cache = HistoricalCache(self.cache_dir, max_disk_bytes = 300)
+        epoch_end = int(time.time()) - 3600
+
+        for i in range(5):
+            cache.get("/get/db/flows.lua", { "ifid": i }, epoch_end, lambda: [ "x" * 50 ])
+
+        stats = cache.get_stats()
+        self.assertLessEqual(stats["disk_bytes"], 300)
+        self.assertGreater(stats["evictions"], 0)
+
+    def test_historical_queries(self):
+        ntopng_obj = FakeNtopng()
+        historical = Historical(ntopng_obj)
+        historical.enable_cache(HistoricalCache(self.cache_dir))
+        epoch_end  = int(time.time()) - 3600
+
+        for i in range(2):
+            rows = historical.get_flows(0, epoch_end - 600, epoch_end, "*", "", 10, "", "")
+
+        self.assertEqual((rows, ntopng_obj.calls), ([ { "FLOW_ID": 1 } ], 1))
+
+        historical.get_flows(0, epoch_end - 600, epoch_end, "*", "L7_PROTO = 7", 10, "", "")
+        self.assertEqual(ntopng_obj.calls, 2)
+
+    def test_instance_and_user(self):
+        # Handles of different instances or users sharing the cache do not share results
+        cache     = HistoricalCache(self.cache_dir)
+        epoch_end = int(time.time()) - 3600
+        handles   = [ FakeNtopng(), FakeNtopng(), FakeNtopng("http://10.0.0.1:3000"), FakeNtopng(auth_token = "other") ]
+
+        for ntopng_obj in handles:
+            historical = Historical(ntopng_obj)
+            historical.enable_cache(cache)
+            historical.get_flows(0, epoch_end - 600, epoch_end, "*", "", 10, "", "")
+
+        self.assertEqual([ h.calls for h in handles ], [ 1, 0, 1, 1 ])
+        self.assertNotIn("secret", get_identity(handles[0]))
+
+if __name__ == "__main__":
+    unittest.main()
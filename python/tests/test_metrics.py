@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+
+"""
+Offline checks for the REST call metrics
+"""
+
+import unittest
+
+from ntopng.metrics import Metrics
+
+class MetricsTest(unittest.TestCase):
+    def setUp(self):
+        self.metrics = Metrics(buckets = (0.1, 1.0))
+        self.metrics.observe_request("GET", "http://localhost:3000/lua/rest/v2/get/interface/data.lua?ifid=0", 0.05, 6, 1000, 200)
+        self.metrics.observe_request("GET", "http://localhost:3000/lua/rest/v2/get/interface/data.lua?ifid=1", 0.5, 6, 2000, 200)
+        self.metrics.observe_request("POST", "http://localhost:3000/lua/pro/rest/v2/get/db/flows.lua", 2.0, 100, 10, 500)
+        self.metrics.observe_decode("GET", "http://localhost:3000/lua/rest/v2/get/interface/data.lua", 0.01)
+        self.metrics.observe_error("POST", "http://localhost:3000/lua/pro/rest/v2/get/db/flows.lua", "ConnectionError")
+
+    def test_stats_per_endpoint(self):
+        stats = self.metrics.get_stats()
+        data  = stats["GET /lua/rest/v2/get/interface/data.lua"]
+        flows = stats["POST /lua/pro/rest/v2/get/db/flows.lua"]
+
+        self.assertEqual((data["requests"], data["request_bytes"], data["response_bytes"]), (2, 12, 3000))
+        self.assertEqual(data["latency"]["buckets"], [ (0.1, 1), (1.0, 2), (float("inf"), 2) ])
+        self.assertEqual(data["decode"]["count"], 1)
+        self.assertEqual(flows["status_codes"], { 500: 1 })
+        self.assertEqual(flows["errors"], { "http_status": 1, "ConnectionError": 1 })
+
+    def test_streamed_response_bytes(self):
+        # The call is recorded at the headers, the body bytes when they have been read
+        self.metrics.observe_request("GET", "http://localhost:3000/lua/rest/v2/get/flow/active.lua", 0.01, 10, 0, 200)
+        self.metrics.observe_response_bytes("GET", "http://localhost:3000/lua/rest/v2/get/flow/active.lua", 4096)
+
+        stats = self.metrics.get_stats()["GET /lua/rest/v2/get/flow/active.lua"]
+        self.assertEqual((stats["requests"], stats["response_bytes"]), (1, 4096))
+
+    def test_top_endpoints(self):
+        top = self.metrics.get_top_endpoints(1)
+
+        self.assertEqual(top, [ ("POST /lua/pro/rest/v2/get/db/flows.lua", 2.0, 1) ])
+
+    def test_openmetrics(self):
+        lines  = self.metrics.to_openmetrics().splitlines()
+        labels = 'method="GET",endpoint="/lua/rest/v2/get/interface/data.lua"'
+
+        self.assertEqual(lines[-1], "# EOF")
+        self.assertIn("# TYPE ntopng_rest_request_duration_seconds histogram", lines)
+        self.assertIn("ntopng_rest_request_duration_seconds_bucket{" + labels + ',le="0.1"} 1', lines)
+        self.assertIn("ntopng_rest_request_duration_seconds_bucket{" + labels + ',le="+Inf"} 2', lines)
+        self.assertIn("ntopng_rest_request_duration_seconds_count{" + labels + "} 2", lines)
+        self.assertIn("ntopng_rest_response_bytes_total{" + labels + "} 3000", lines)
+        self.assertIn('ntopng_rest_errors_total{method="POST",endpoint="/lua/pro/rest/v2/get/db/flows.lua",type="ConnectionError"} 1', lines)
+
+    def test_reset(self):
+        self.metrics.reset()
+
+        self.assertEqual(self.metrics.get_stats(), {})
+
+if __name__ == "__main__":
+    unittest.main()
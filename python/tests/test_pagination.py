@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+
+"""
+Offline checks for the keyset pagination
+"""
+
+import asyncio
+import unittest
+
+from ntopng.historical import Historical
+from ntopng.pagination import format_sql_value, split_select_clause, check_select_clause, build_keyset_clause, iter_keyset_pages, async_iter_keyset_pages
+
+class FakeNtopng:
+    def __init__(self, calls):
+        self.calls = calls
+
+    def post_request(self, url, params):
+        self.calls.append(params)
+        return([])
+
+ROWS = [ { "FIRST_SEEN": t // 3, "FLOW_ID": t } for t in range(10) ]
+
+def fetch_rows(calls):
+    # Emulates the server: the rows matching a where clause built by build_keyset_clause
+    def fetch(where_clause, maxhits, order_by):
+        calls.append(where_clause)
+
+        if(not where_clause):
+            rows = ROWS
+        else:
+            first_seen = int(where_clause.split("FIRST_SEEN > ")[1].split(")")[0])
+            flow_id    = int(where_clause.split("FLOW_ID > ")[1].split(")")[0])
+            rows = [ r for r in ROWS if ((r["FIRST_SEEN"] > first_seen) or ((r["FIRST_SEEN"] == first_seen) and (r["FLOW_ID"] > flow_id))) ]
+
+        return(rows[:maxhits])
+
+    return(fetch)
+
+class KeysetClauseTest(unittest.TestCase):
+    def test_format_sql_value(self):
+        self.assertEqual(format_sql_value("O'Reilly"), "'O''Reilly'")
+        self.assertEqual(format_sql_value("10.0.0.1"), "'10.0.0.1'")
+        self.assertEqual(format_sql_value(None), "NULL")
+        self.assertEqual(format_sql_value(True), "1")
+        self.assertEqual(format_sql_value(42), "42")
+        self.assertEqual(format_sql_value(1.5), "1.5")
+
+    def test_multi_column_keyset(self):
+        clause = build_keyset_clause("FIRST_SEEN, FLOW_ID", { "FIRST_SEEN": 100, "FLOW_ID": 7 })
+
+        self.assertEqual(clause, "((FIRST_SEEN > 100) OR (FIRST_SEEN = 100 AND FLOW_ID > 7))")
+
+    def test_descending_keyset(self):
+        clause = build_keyset_clause("tstamp DESC, rowid ASC", { "tstamp": 100, "rowid": "a'b" })
+
+        self.assertEqual(clause, "((tstamp < 100) OR (tstamp = 100 AND rowid > 'a''b'))")
+
+    def test_missing_column(self):
+        with self.assertRaises(ValueError):
+            build_keyset_clause("FIRST_SEEN, FLOW_ID", { "FIRST_SEEN": 100 })
+
+    def test_split_select_clause(self):
+        self.assertEqual(split_select_clause("FLOW_ID, toUnixTimestamp(FIRST_SEEN) AS FIRST_SEEN, IF(A, B, C)"),
+                         [ "FLOW_ID", "toUnixTimestamp(FIRST_SEEN) AS FIRST_SEEN", "IF(A, B, C)" ])
+
+    def test_check_select_clause(self):
+        check_select_clause("*", "FIRST_SEEN, FLOW_ID")
+        check_select_clause("FLOW_ID, toUnixTimestamp(FIRST_SEEN) AS FIRST_SEEN", "FIRST_SEEN DESC, FLOW_ID")
+
+        with self.assertRaises(ValueError) as ctx:
+            check_select_clause("IPV4_SRC_ADDR, FIRST_SEEN", "FIRST_SEEN, FLOW_ID")
+
+        self.assertIn("FLOW_ID", str(ctx.exception))
+
+    def test_select_clause_checked_up_front(self):
+        # No query is sent (and no output written) before the error
+        calls = []
+
+        with self.assertRaises(ValueError):
+            Historical(FakeNtopng(calls)).iter_flows_pages(0, 10, 20, "IPV4_SRC_ADDR", "", 10)
+
+        self.assertEqual(calls, [])
+
+class KeysetPagesTest(unittest.TestCase):
+    def test_pages(self):
+        calls = []
+        pages = list(iter_keyset_pages(fetch_rows(calls), "", "FIRST_SEEN, FLOW_ID", 4))
+
+        self.assertEqual([ [ r["FLOW_ID"] for r in page ] for page in pages ], [ [ 0, 1, 2, 3 ], [ 4, 5, 6, 7 ], [ 8, 9 ] ])
+        # The last page is shorter than the page size: no further query
+        self.assertEqual(len(calls), 3)
+
+    def test_full_last_page(self):
+        calls = []
+        pages = list(iter_keyset_pages(fetch_rows(calls), "", "FIRST_SEEN, FLOW_ID", 5))
+
+        # A full last page needs one more (empty) query to detect the end
+        self.assertEqual([ len(page) for page in pages ], [ 5, 5 ])
+        self.assertEqual(len(calls), 3)
+
+    def test_where_clause_and_resume(self):
+        calls = []
+        pages = list(iter_keyset_pages(lambda clause, maxhits, order: calls.append(clause) or [], "L7_PROTO = 7", "FIRST_SEEN, FLOW_ID", 4,
+                                       after = { "FIRST_SEEN": 1, "FLOW_ID": 4 }))
+
+        self.assertEqual(pages, [])
+        self.assertEqual(calls, [ "(L7_PROTO = 7) AND ((FIRST_SEEN > 1) OR (FIRST_SEEN = 1 AND FLOW_ID > 4))" ])
+
+    def test_order_by_required(self):
+        with self.assertRaises(ValueError):
+            list(iter_keyset_pages(fetch_rows([]), "", "", 4))
+
+    def test_async_pages(self):
+        calls = []
+        fetch = fetch_rows(calls)
+
+        async def async_fetch(clause, maxhits, order):
+            return(fetch(clause, maxhits, order))
+
+        async def run():
+            return([ page async for page in async_iter_keyset_pages(async_fetch, "", "FIRST_SEEN, FLOW_ID", 4) ])
+
+        self.assertEqual([ len(page) for page in asyncio.run(run()) ], [ 4, 4, 2 ])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+"""
+Offline checks for the historical query profiler
+"""
+
+import json
+import unittest
+
+from ntopng.historical import Historical
+from ntopng.metrics import Metrics
+from ntopng.profiler import get_query_shape, count_rows
+
+class FakeResponse:
+    def __init__(self, status_code, rsp):
+        self.status_code = status_code
+        self.content     = json.dumps({ "rc": 0, "rsp": rsp }).encode("utf-8")
+
+    def json(self):
+        return(json.loads(self.content))
+
+    def close(self):
+        pass
+
+class FakeNtopng:
+    # The attributes of an Ntopng handle used by the profiler
+    def __init__(self, status_code = 200):
+        self.url         = "http://localhost:3000"
+        self.metrics     = Metrics()
+        self.status_code = status_code
+
+    def issue_post_request(self, url, params, stream = False):
+        return(FakeResponse(self.status_code, [ { "FLOW_ID": i } for i in range(params["maxhits_clause"]) ]))
+
+    def issue_request(self, url, params, stream = False):
+        return(FakeResponse(self.status_code, { "data": [ 1, 2 ] }))
+
+    def decode_response(self, method, url, response):
+        return(response.json())
+
+class QueryShapeTest(unittest.TestCase):
+    def test_literals(self):
+        a = get_query_shape("/get/db/flows.lua", { "ifid": 0, "where_clause": "IPV4_SRC_ADDR = '10.0.0.1' AND  L7_PROTO = 7", "group_by_clause": "" })
+        b = get_query_shape("/get/db/flows.lua", { "ifid": 2, "where_clause": "IPV4_SRC_ADDR = 'it''s'\nAND L7_PROTO = 91" })
+
+        self.assertEqual(a, "/get/db/flows.lua ifid=? where_clause=IPV4_SRC_ADDR = ? AND L7_PROTO = ?")
+        self.assertEqual(a, b)
+        self.assertNotEqual(a, get_query_shape("/get/db/flows.lua", { "ifid": 0, "where_clause": "L7_PROTO = 7" }))
+
+    def test_count_rows(self):
+        self.assertEqual(count_rows([ 1, 2, 3 ]), 3)
+        self.assertEqual(count_rows({ "series": [ 1 ] }), 1)
+        self.assertIsNone(count_rows({ "count": 3 }))
+
+class QueryProfilerTest(unittest.TestCase):
+    def test_slowest_shapes(self):
+        historical = Historical(FakeNtopng())
+        profiler   = historical.enable_profiling()
+
+        historical.get_flows(0, 10, 20, "*", "L7_PROTO = 7", 5, "", "")
+        historical.get_flows(0, 10, 20, "*", "L7_PROTO = 91", 3, "", "")
+        historical.get_alerts("host", 0, 10, 20, "*", "", 10, "", "")
+
+        records = profiler.get_records()
+        self.assertEqual([ (r["method"], r["rows"], r["status"]) for r in records ], [ ("POST", 5, 200), ("POST", 3, 200), ("GET", 2, 200) ])
+        self.assertEqual(records[1]["params"]["where_clause"], "L7_PROTO = 91")
+
+        shapes = profiler.get_slowest_shapes(by = "max")
+        self.assertEqual(len(shapes), 2)
+        self.assertEqual(sorted(s["count"] for s in shapes), [ 1, 2 ])
+
+        flows = [ s for s in shapes if (s["count"] == 2) ][0]
+        self.assertEqual(flows["rows"], 8)
+        self.assertGreaterEqual(flows["total"], flows["max"])
+
+        profiler.reset()
+        self.assertEqual(profiler.get_records(), [])
+
+    def test_failed_query(self):
+        historical = Historical(FakeNtopng(status_code = 500))
+        profiler   = historical.enable_profiling()
+
+        with self.assertRaises(Exception):
+            historical.get_flows(0, 10, 20, "*", "", 5, "", "")
+
+        self.assertEqual([ (r["status"], r["rows"]) for r in profiler.get_records() ], [ (500, None) ])
+
+if __name__ == "__main__":
+    unittest.main()
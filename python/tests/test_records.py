@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+
+"""
+Offline checks for the compact record types
+"""
+
+import json
+import unittest
+
+from ntopng.records import ActiveFlowRecord, ActiveHostRecord, get_historical_flow_records
+
+def make_flow(cli_port, l7):
+    return({ "key": cli_port, "hash_id": 7, "first_seen": 100, "last_seen": 110,
+             "client": { "name": "pc", "ip": "10.0.0.1", "port": cli_port }, "server": { "ip": "10.0.0.2", "port": 443 },
+             "protocol": { "l4": "TCP", "l7": l7 }, "vlan": 0, "duration": 10, "bytes": 1000, "packets": 10,
+             "thpt": { "bps": 8.0, "pps": 1.0 }, "breakdown": { "cli2srv": 40, "srv2cli": 60 }, "score": 0,
+             "tcp_flags": "SA" })
+
+class RecordsTest(unittest.TestCase):
+    def test_active_flows(self):
+        # Decoded strings are distinct objects, as in a REST response
+        records = ActiveFlowRecord.from_rsp(json.loads(json.dumps({ "data": [ make_flow(1234, "TLS"), make_flow(1235, "TLS") ] })))
+
+        self.assertEqual([ (r.cli_port, r.srv_ip, r.l7_proto, r.bps, r.cli2srv) for r in records ],
+                         [ (1234, "10.0.0.2", "TLS", 8.0, 40), (1235, "10.0.0.2", "TLS", 8.0, 40) ])
+
+        # Repeated strings are shared, fields not in the record are dropped
+        self.assertIs(records[0].cli_ip, records[1].cli_ip)
+        self.assertIs(records[0].l7_proto, records[1].l7_proto)
+        self.assertNotIn("tcp_flags", records[0].to_dict())
+
+        with self.assertRaises(AttributeError):
+            records[0].tcp_flags = "SA"
+
+    def test_active_hosts(self):
+        records = ActiveHostRecord.from_rsp([ { "ip": "10.0.0.1", "vlan": 0, "country": "IT", "bytes": { "sent": 10, "recvd": 5 },
+                                                "num_flows": { "as_client": 3 } }, { "ip": "10.0.0.2" } ])
+
+        self.assertEqual([ (r.ip, r.country, r.bytes_total, r.num_flows) for r in records ],
+                         [ ("10.0.0.1", "IT", 15, 3), ("10.0.0.2", None, 0, 0) ])
+        self.assertEqual(ActiveHostRecord.from_rsp(None), [])
+
+    def test_historical_rows(self):
+        records = get_historical_flow_records([ { "IPV4_SRC_ADDR": "10.0.0.1", "L7_PROTO": "TLS", "BYTES": 10 },
+                                                { "IPV4_SRC_ADDR": "10.0.0.2", "L7_PROTO": "DNS", "BYTES": 20 },
+                                                { "L7_PROTO": "TLS", "FLOWS": 2 } ])
+
+        self.assertEqual((records[0]["IPV4_SRC_ADDR"], records[0].L7_PROTO, records[0][2], records[1].get("BYTES")), ("10.0.0.1", "TLS", 10, 20))
+        self.assertEqual(records[1].to_dict(), { "IPV4_SRC_ADDR": "10.0.0.2", "L7_PROTO": "DNS", "BYTES": 20 })
+        self.assertIs(type(records[0]), type(records[1]))
+
+        # Rows with different columns get their own field index
+        self.assertEqual((records[2].keys(), records[2]["FLOWS"], records[2].get("BYTES", 0)), (("L7_PROTO", "FLOWS"), 2, 0))
+
+        with self.assertRaises(AttributeError):
+            records[0].FLOWS
+
+if __name__ == "__main__":
+    unittest.main()
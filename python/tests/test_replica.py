@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+"""
+Offline checks for the SQLite replica of the historical flows
+"""
+
+import unittest
+
+from ntopng.replica import FlowReplica
+
+COLUMNS = [ "FLOW_ID", "FIRST_SEEN", "LAST_SEEN", "TOTAL_BYTES" ]
+
+def make_flow(i):
+    return({ "FLOW_ID": i, "FIRST_SEEN": 1000 + 10 * i, "LAST_SEEN": 1005 + 10 * i, "TOTAL_BYTES": 100 * i })
+
+class FakeHistorical:
+    # Serves keyset pages of flows ordered by (FIRST_SEEN, FLOW_ID), optionally failing after some pages
+    def __init__(self, flows):
+        self.flows      = flows
+        self.fail_after = None
+        self.calls      = []
+        self.remote     = 0
+
+    def iter_flows_pages(self, ifid, epoch_begin, epoch_end, select_clause, where_clause, page_size, order_by, after):
+        self.calls.append((epoch_begin, epoch_end, after))
+        key  = lambda f: (f["FIRST_SEEN"], f["FLOW_ID"])
+        rows = [ f for f in self.flows if (epoch_begin <= f["FIRST_SEEN"] <= epoch_end) and ((after is None) or (key(f) > key(after))) ]
+
+        for i in range(0, len(rows), page_size):
+            if((self.fail_after is not None) and (i // page_size >= self.fail_after)):
+                raise ConnectionError("connection lost")
+
+            yield(rows[i:i + page_size])
+
+    def get_flows(self, ifid, epoch_begin, epoch_end, select_clause, where_clause, maxhits, group_by, order_by):
+        self.remote += 1
+        return([])
+
+class FlowReplicaTest(unittest.TestCase):
+    def setUp(self):
+        self.historical = FakeHistorical([ make_flow(i) for i in range(10) ])
+        self.replica    = FlowReplica(self.historical, ":memory:", COLUMNS, page_size = 3)
+
+    def tearDown(self):
+        self.replica.close()
+
+    def test_resume(self):
+        # The sync is interrupted after two pages: the pages copied are kept
+        self.historical.fail_after = 2
+
+        with self.assertRaises(ConnectionError):
+            self.replica.sync(0, 1000, 1100)
+
+        state = self.replica.get_state(0)
+        self.assertEqual((state["covered_end"], state["last_row"]["FLOW_ID"]), (None, 5))
+        self.assertEqual(self.replica.get_stats()["flows"], 6)
+        self.assertFalse(self.replica.is_covered(0, 1000, 1100))
+
+        # The next sync continues after the last flow copied
+        self.historical.fail_after = None
+        self.assertEqual(self.replica.sync(0, epoch_end = 1100), 4)
+        self.assertEqual(self.historical.calls[-1][2]["FLOW_ID"], 5)
+
+        state = self.replica.get_state(0)
+        self.assertEqual((state["covered_begin"], state["covered_end"], state["sync_end"]), (1000, 1100, None))
+        self.assertEqual(self.replica.get_stats()["flows"], 10)
+
+    def test_incremental_sync(self):
+        self.replica.sync(0, 1000, 1100)
+        self.historical.flows += [ make_flow(10), make_flow(11) ]
+
+        # Nothing new before the watermark
+        self.assertEqual(self.replica.sync(0, epoch_end = 1100), 0)
+
+        # The overlap is read again, the duplicates are discarded
+        self.replica.sync(0, epoch_end = 1200)
+        self.assertLess(self.historical.calls[-1][0], 1100)
+        self.assertEqual(self.replica.get_stats()["flows"], 12)
+        self.assertTrue(self.replica.is_covered(0, 1000, 1200))
+
+    def test_local_and_remote_queries(self):
+        self.replica.sync(0, 1000, 1100)
+
+        rows = self.replica.get_flows(0, 1000, 1100, "FLOW_ID, TOTAL_BYTES", "TOTAL_BYTES >= 700", 10, None, "TOTAL_BYTES DESC")
+        self.assertEqual([ row["FLOW_ID"] for row in rows ], [ 9, 8, 7 ])
+
+        rows = self.replica.get_flows(0, 1000, 1100, "COUNT(*) AS flows", "", None, None, None)
+        self.assertEqual(rows, [ { "flows": 10 } ])
+
+        # Not covered, or not valid SQLite syntax: sent to ntopng
+        self.replica.get_flows(0, 900, 1100, "FLOW_ID", "", 10, None, None)
+        self.replica.get_flows(0, 1000, 1100, "FLOW_ID", "arrayExists(x -> x = 1, [ 1 ])", 10, None, None)
+
+        stats = self.replica.get_stats()
+        self.assertEqual((stats["local_queries"], stats["remote_queries"], self.historical.remote), (2, 2, 2))
+
+    def test_time_columns(self):
+        self.replica.sync(0, 1000, 1100)
+
+        # Datetime literals are compared as epoch, time columns are returned as ntopng does
+        rows = self.replica.get_flows(0, 1000, 1100, "FLOW_ID, FIRST_SEEN, MAX(LAST_SEEN) AS last", "FIRST_SEEN >= '1970-01-01 00:18:00'",
+                                      None, "FLOW_ID, FIRST_SEEN", "FLOW_ID")
+        self.assertEqual([ (row["FLOW_ID"], row["FIRST_SEEN"], row["last"]) for row in rows ],
+                         [ (8, "1970-01-01 00:18:00", "1970-01-01 00:18:05"), (9, "1970-01-01 00:18:10", "1970-01-01 00:18:15") ])
+        self.assertEqual(self.replica.get_flows(0, 1000, 1100, "FLOW_ID", "FIRST_SEEN < toDateTime(1010)", None, None, None), [ { "FLOW_ID": 0 } ])
+
+    def test_long_flows(self):
+        # Each sync reads again max_flow_duration seconds before the watermark
+        replica = FlowReplica(self.historical, ":memory:", COLUMNS, overlap = 0, max_flow_duration = 50)
+        replica.sync(0, 1000, 1100)
+        replica.sync(0, epoch_end = 1200)
+
+        self.assertEqual(self.historical.calls[-1][:2], (1050, 1200))
+        replica.close()
+
+if __name__ == "__main__":
+    unittest.main()
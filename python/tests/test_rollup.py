@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+
+"""
+Offline checks for the flow rollups
+"""
+
+import unittest
+
+from ntopng.rollup import FlowRollups, HOUR
+
+class FakeHistorical:
+    # Grouped rows as returned by ntopng, with the hour column when grouping by hour
+    def __init__(self, rows):
+        self.rows  = rows
+        self.calls = []
+
+    def get_flows(self, ifid, epoch_begin, epoch_end, select_clause, where_clause, maxhits, group_by, order_by):
+        self.calls.append(group_by)
+
+        return([ dict(row, hour = 0) if group_by.startswith("hour") else dict(row) for row in self.rows ])
+
+class RollupTest(unittest.TestCase):
+    def setUp(self):
+        self.rows = [ { "host": "10.0.0.1", "L7_PROTO": 7, "bytes": 100, "packets": 2, "flows": 1 },
+                      { "host": "10.0.0.2", "L7_PROTO": "7", "bytes": 100, "packets": 2, "flows": 1 } ]
+
+    def test_fanout_requires_host(self):
+        rollups = FlowRollups(FakeHistorical(self.rows), ":memory:")
+
+        with self.assertRaises(ValueError):
+            rollups.get_flows(0, 0, HOUR, group_by = [ "L7_PROTO" ])
+
+        rows = rollups.get_flows(0, 0, HOUR, group_by = [ "host", "L7_PROTO" ])
+        self.assertEqual(sorted([ (row["host"], row["L7_PROTO"], row["bytes"]) for row in rows ]),
+                         [ ("10.0.0.1", 7, 100), ("10.0.0.2", 7, 100) ])
+
+    def test_group_by_l7(self):
+        rollups = FlowRollups(FakeHistorical(self.rows), ":memory:", host_column = "IPv4NumToString(IPV4_SRC_ADDR)")
+        rows    = rollups.get_flows(0, 0, HOUR, group_by = [ "L7_PROTO" ])
+
+        self.assertEqual(rows, [ { "L7_PROTO": 7, "bytes": 200, "packets": 4, "flows": 2 } ])
+
+    def test_rolled_up_hours(self):
+        historical = FakeHistorical(self.rows)
+        rollups    = FlowRollups(historical, ":memory:", closed_after = 0)
+        rollups.update(0, epoch_begin = 0, now = HOUR)
+        rows = rollups.get_flows(0, 0, HOUR, group_by = [ "host" ])
+
+        self.assertEqual(sorted([ (row["host"], row["flows"]) for row in rows ]), [ ("10.0.0.1", 1), ("10.0.0.2", 1) ])
+        self.assertEqual(rollups.get_stats()["local_queries"], 1)
+        self.assertEqual(len(historical.calls), 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+"""
+Offline checks for the pooled HTTP sessions (against a local keep-alive HTTP server)
+"""
+
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from ntopng.session import SessionPool, get_session_pool, close_session_pools
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = b'{"rc": 0, "rsp": []}'
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class SessionPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url    = "http://127.0.0.1:" + str(self.server.server_address[1])
+        threading.Thread(target = self.server.serve_forever, daemon = True).start()
+
+    def tearDown(self):
+        close_session_pools()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_connection_reuse(self):
+        pool = SessionPool(self.url, pool_size = 2)
+
+        for i in range(3):
+            self.assertEqual(pool.get(self.url + "/lua/rest/v2/get/ntopng/interfaces.lua").status_code, 200)
+
+        stats = pool.get_stats()
+        pool.close()
+
+        self.assertEqual((stats["requests"], stats["new_connections"], stats["reused_connections"]), (3, 1, 2))
+        self.assertEqual(stats["sessions"], 1)
+
+    def test_session_per_thread(self):
+        pool     = SessionPool(self.url)
+        sessions = []
+
+        def run():
+            sessions.append(pool.get_session())
+            pool.get(self.url + "/")
+
+        threads = [ threading.Thread(target = run) for i in range(3) ]
+
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        stats = pool.get_stats()
+        pool.close()
+
+        self.assertEqual(len(set(map(id, sessions))), 3)
+        self.assertEqual((stats["sessions"], stats["requests"]), (3, 3))
+
+    def test_shared_pool_per_url(self):
+        a = get_session_pool(self.url, pool_size = 4)
+        b = get_session_pool(self.url)
+
+        self.assertIs(a, b)
+        self.assertIsNot(a, get_session_pool(self.url + "/other"))
+
+    def test_resize(self):
+        pool = get_session_pool(self.url, pool_size = 2)
+
+        for i in range(3):
+            pool.get(self.url + "/")
+
+        # A larger size grows the shared pool, a smaller one is ignored
+        self.assertIs(get_session_pool(self.url, pool_size = 8), pool)
+        get_session_pool(self.url, pool_size = 4)
+
+        stats = pool.get_stats()
+        self.assertEqual((stats["pool_size"], stats["requests"], stats["new_connections"]), (8, 3, 1))
+
+        # The counters of the replaced connection pool are kept
+        pool.get(self.url + "/")
+        stats = pool.get_stats()
+        self.assertEqual((stats["requests"], stats["new_connections"], stats["reused_connections"]), (4, 2, 2))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+"""
+Offline checks for the incremental JSON decoder
+"""
+
+import json
+import unittest
+
+from ntopng.stream import JSONStreamParser, NEED_DATA, iter_json_items
+
+DOCUMENT = { "rc": 0, "rc_str": "OK", "rsp": { "totalRows": 3, "data": [ { "bytes": 12345, "l7": "TLS" }, { "bytes": 1.5e3, "name": "café" }, [ 1, [ 2 ], {} ] ] } }
+
+def split(data, size):
+    return([ data[i:i + size] for i in range(0, len(data), size) ])
+
+class JSONStreamParserTest(unittest.TestCase):
+    def test_chunk_boundaries(self):
+        data = json.dumps(DOCUMENT).encode("utf-8")
+
+        for size in range(1, 16):
+            self.assertEqual(list(iter_json_items(split(data, size), ("rsp", "data"))), DOCUMENT["rsp"]["data"])
+
+    def test_split_numbers(self):
+        # Numbers split at '.', 'e' or the exponent sign
+        self.assertEqual(list(iter_json_items(iter([ b'{"rsp": [1.', b'5, 2]}' ]))), [ 1.5, 2 ])
+        self.assertEqual(list(iter_json_items(iter([ b'{"rsp": [1e', b'5]}' ]))), [ 1e5 ])
+        self.assertEqual(list(iter_json_items(iter([ b'{"rsp": [-2.5E', b'-', b'3, 1]}' ]))), [ -2.5e-3, 1 ])
+
+        data = b'{"rsp": [12.75e+2, -0.5, 3E2]}'
+
+        for size in range(1, 8):
+            self.assertEqual(list(iter_json_items(split(data, size))), [ 1275.0, -0.5, 300.0 ])
+
+    def test_scalar_and_missing_path(self):
+        data = json.dumps(DOCUMENT).encode("utf-8")
+
+        self.assertEqual(list(iter_json_items(split(data, 7), ("rc_str",))), [ "OK" ])
+        self.assertEqual(list(iter_json_items(split(data, 7), ("missing",))), [])
+        self.assertEqual(list(iter_json_items([ b'{"rsp": []}' ])), [])
+
+    def test_feed(self):
+        # Push mode, as used by the asyncio client
+        parser = JSONStreamParser()
+        chunks = split(json.dumps(DOCUMENT).encode("utf-8"), 5)
+        items  = []
+
+        for event in parser.events(("rsp", "data")):
+            if(event is NEED_DATA):
+                if(chunks):
+                    parser.feed(chunks.pop(0))
+                else:
+                    parser.feed_eof()
+            else:
+                items.append(event)
+
+        self.assertEqual(items, DOCUMENT["rsp"]["data"])
+
+    def test_truncated(self):
+        data = json.dumps(DOCUMENT).encode("utf-8")
+
+        with self.assertRaises(ValueError):
+            list(iter_json_items(split(data[:60], 8), ("rsp", "data")))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+
+"""
+Offline checks for the merge of time sliced query results
+"""
+
+import unittest
+
+from ntopng.time_slicer import merge_sorted, parse_order_by
+
+class MergeSortedTest(unittest.TestCase):
+    def test_parse_order_by(self):
+        self.assertEqual(parse_order_by("TOTAL_BYTES DESC, FIRST_SEEN"), [ ("TOTAL_BYTES", True), ("FIRST_SEEN", False) ])
+
+    def test_merge_descending(self):
+        a = [ { "TOTAL_BYTES": "900" }, { "TOTAL_BYTES": "80" } ]
+        b = [ { "TOTAL_BYTES": "1000" }, { "TOTAL_BYTES": "100" } ]
+
+        rows = merge_sorted([ a, b ], "TOTAL_BYTES DESC", maxhits = 3)
+        self.assertEqual([ r["TOTAL_BYTES"] for r in rows ], [ "1000", "900", "100" ])
+
+    def test_merge_without_order(self):
+        rows = merge_sorted([ [ { "A": 1 } ], [ { "A": 0 } ] ], "", maxhits = None)
+        self.assertEqual([ r["A"] for r in rows ], [ 1, 0 ])
+
+    def test_order_column_not_selected(self):
+        with self.assertRaises(ValueError):
+            merge_sorted([ [ { "A": 1 } ] ], "TOTAL_BYTES DESC")
+
+if __name__ == "__main__":
+    unittest.main()
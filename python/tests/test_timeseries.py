@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+"""
+Offline checks for the timeseries alignment
+"""
+
+import unittest
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from ntopng.historical import Historical
+from ntopng.timeseries import TimeseriesResult, align_series, lttb
+
+def make_rsp(start, step, series):
+    return({ "start": start, "step": step, "series": [ { "label": label, "data": data } for label, data in series ] })
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class AlignSeriesTest(unittest.TestCase):
+    def test_align_steps(self):
+        a = TimeseriesResult.from_rsp(make_rsp(0, 60, [ ("bytes_sent", [ 1, 2, 3, 4 ]) ]), query = "a")
+        b = TimeseriesResult.from_rsp(make_rsp(0, 120, [ ("bytes_sent", [ 10, 20 ]) ]), query = "b")
+        m = align_series([ a, b ], metric = "bytes_sent", how = "sum")
+
+        self.assertEqual(m.step, 120)
+        self.assertEqual(m.names, [ "a", "b" ])
+        self.assertEqual(m.column("a").tolist(), [ 3, 7 ])
+        self.assertEqual(m.column("b").tolist(), [ 10, 20 ])
+
+    def test_empty_result(self):
+        a = TimeseriesResult.from_rsp(make_rsp(0, 60, [ ("bytes_sent", [ 1, 2 ]) ]), query = "a")
+        b = TimeseriesResult.from_rsp(make_rsp(0, 60, []), query = "b")
+        m = align_series([ a, b ])
+
+        self.assertEqual(m.column("a").tolist(), [ 1, 2 ])
+        self.assertTrue(np.all(np.isnan(m.column("b"))))
+
+    def test_missing_metric(self):
+        # ntopng does not return the series whose points are all zero
+        a = TimeseriesResult.from_rsp(make_rsp(0, 60, [ ("bytes_sent", [ 1, 2 ]), ("bytes_rcvd", [ 3, 4 ]) ]), query = "a")
+        b = TimeseriesResult.from_rsp(make_rsp(0, 60, [ ("bytes_sent", [ 5, 6 ]) ]), query = "b")
+        m = align_series([ a, b ], metric = "bytes_rcvd")
+
+        self.assertEqual(m.column("a").tolist(), [ 3, 4 ])
+        self.assertTrue(np.all(np.isnan(m.column("b"))))
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class LTTBTest(unittest.TestCase):
+    def test_keeps_spike_and_ends(self):
+        values = [ 1.0 ] * 100
+        values[37] = 50.0
+        idx = lttb(np.arange(100) * 60, values, 10)
+
+        self.assertEqual(len(idx), 10)
+        self.assertEqual((idx[0], idx[-1]), (0, 99))
+        self.assertIn(37, idx.tolist())
+        self.assertTrue(np.all(np.diff(idx) > 0))
+
+    def test_small_series(self):
+        self.assertEqual(lttb([ 0, 60, 120 ], [ 1, 2, 3 ], 5).tolist(), [ 0, 1, 2 ])
+
+        with self.assertRaises(ValueError):
+            lttb(np.arange(10), np.arange(10), 2)
+
+    def test_downsample(self):
+        rsp = make_rsp(0, 60, [ ("bytes_sent", [ float(i % 7) for i in range(500) ]), ("bytes_rcvd", [ 1.0 ] * 500) ])
+        r   = TimeseriesResult.from_rsp(rsp).downsample(50, metric = "bytes_sent")
+
+        self.assertEqual(len(r), 50)
+        self.assertEqual(r.labels, [ "bytes_sent", "bytes_rcvd" ])
+        self.assertEqual(r.timestamps[0], 0)
+        self.assertEqual(r.timestamps[-1], 499 * 60)
+
+class TimeseriesParamsTest(unittest.TestCase):
+    def test_optional_params(self):
+        calls = []
+
+        class FakeNtopng:
+            def post_request(self, url, params):
+                calls.append(params)
+                return(make_rsp(0, 60, []))
+
+        historical = Historical(FakeNtopng())
+        historical.get_timeseries("host:traffic", "ifid:0,host:10.0.0.1", 0, 3600)
+        historical.get_timeseries("host:traffic", "ifid:0,host:10.0.0.1", 0, 3600, limit = 100, ts_aggregation = "max", no_fill = True)
+
+        self.assertEqual(sorted(calls[0].keys()), [ "epoch_begin", "epoch_end", "ts_query", "ts_schema" ])
+        self.assertEqual((calls[1]["limit"], calls[1]["ts_aggregation"], calls[1]["no_fill"]), (100, "max", 1))
+        self.assertNotIn("initial_point", calls[1])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+
+"""
+Offline checks for the bulk timeseries fetcher
+"""
+
+import threading
+import unittest
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from ntopng.timeseries_bulk import BulkTimeseriesFetcher, BulkTimeseriesResult
+
+def make_rsp(series):
+    return({ "start": 0, "step": 60, "series": [ { "label": label, "data": data } for label, data in series ] })
+
+class FakeHistorical:
+    # Queries listed in errors fail the given number of times (None: always)
+    def __init__(self, errors = None):
+        self.errors = dict(errors or {})
+        self.calls  = []
+        self.lock   = threading.Lock()
+
+    def get_timeseries(self, ts_schema, ts_query, epoch_begin, epoch_end):
+        with self.lock:
+            self.calls.append((ts_schema, ts_query))
+
+            if(ts_query in self.errors):
+                if(self.errors[ts_query] is None):
+                    raise Exception("Invalid response code 500")
+                elif(self.errors[ts_query] > 0):
+                    self.errors[ts_query] -= 1
+                    raise Exception("Invalid response code 503")
+
+        return(make_rsp([ ("bytes_sent", [ 1, 1 ]) ]))
+
+class BulkTimeseriesFetcherTest(unittest.TestCase):
+    def test_duplicates_and_progress(self):
+        historical = FakeHistorical()
+        fetcher    = BulkTimeseriesFetcher(historical, max_workers = 4)
+        queries    = [ ("host:traffic", "ifid:0,host:10.0.0." + str(i % 3)) for i in range(6) ]
+        progress   = []
+        result     = fetcher.fetch(queries, 0, 120, lambda done, total, failed: progress.append((done, total, failed)))
+
+        self.assertEqual(len(historical.calls), 3)
+        self.assertEqual(progress[-1], (3, 3, 0))
+        self.assertEqual(result.get("host:traffic", "ifid:0,host:10.0.0.1"), make_rsp([ ("bytes_sent", [ 1, 1 ]) ]))
+        self.assertEqual(result.get_stats()["succeeded"], 3)
+
+    def test_retries_and_failures(self):
+        historical = FakeHistorical({ "ifid:0,host:a": 1, "ifid:0,host:b": None })
+        fetcher    = BulkTimeseriesFetcher(historical, retries = 2, retry_delay = 0)
+        result     = fetcher.fetch([ ("host:traffic", "ifid:0,host:a"), ("host:traffic", "ifid:0,host:b") ], 0, 120)
+
+        self.assertIsNotNone(result.get("host:traffic", "ifid:0,host:a"))
+        self.assertEqual(result.failures, { ("host:traffic", "ifid:0,host:b"): "Invalid response code 500" })
+        self.assertEqual(historical.calls.count(("host:traffic", "ifid:0,host:b")), 3)
+        self.assertEqual((result.get_stats()["succeeded"], result.get_stats()["failed"]), (1, 1))
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class BulkTimeseriesResultTest(unittest.TestCase):
+    def test_to_matrix_missing_metric(self):
+        keys    = [ ("host:traffic", "ifid:0,host:10.0.0." + str(i)) for i in range(3) ]
+        results = { keys[0]: make_rsp([ ("bytes_sent", [ 1, 1 ]), ("bytes_rcvd", [ 2, 2 ]) ]),
+                    keys[1]: make_rsp([ ("bytes_sent", [ 1, 1 ]) ]), # bytes_rcvd all zero: dropped by ntopng
+                    keys[2]: make_rsp([ ("bytes_sent", [ 1, 1 ]), ("bytes_rcvd", [ 4, 4 ]) ]) }
+        m = BulkTimeseriesResult(keys, results, {}, 0).to_matrix(metric = "bytes_rcvd")
+
+        self.assertEqual(m.column("host:traffic|ifid:0,host:10.0.0.0").tolist(), [ 2, 2 ])
+        self.assertTrue(np.all(np.isnan(m.column("host:traffic|ifid:0,host:10.0.0.1"))))
+        self.assertEqual(m.column("host:traffic|ifid:0,host:10.0.0.2").tolist(), [ 4, 4 ])
+
+    def test_to_matrix_failures(self):
+        keys = [ ("host:traffic", "ifid:0,host:a"), ("host:traffic", "ifid:0,host:b") ]
+        m = BulkTimeseriesResult(keys, { keys[0]: make_rsp([ ("bytes_sent", [ 1 ]) ]) }, { keys[1]: "timeout" }, 0).to_matrix()
+
+        self.assertEqual(m.names, [ "host:traffic|ifid:0,host:a" ])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+
+"""
+Offline checks for the incremental timeseries tail
+"""
+
+import unittest
+
+from ntopng.timeseries_tail import TailBuffer, TimeseriesTail
+
+STEP = 60
+
+def make_rsp(start, values):
+    return({ "start": start, "step": STEP, "count": len(values),
+             "series": [ { "label": "bytes_sent", "data": values }, { "label": "bytes_rcvd", "data": [ 2 * v for v in values ] } ] })
+
+class FakeHistorical:
+    # Serves a series whose value at epoch t is t // STEP (the last point may be incomplete: -1)
+    def __init__(self):
+        self.calls     = []
+        self.limits    = []
+        self.drop_rcvd = False
+
+    def get_timeseries(self, ts_schema, ts_query, epoch_begin, epoch_end, limit = None):
+        self.calls.append((epoch_begin, epoch_end))
+        self.limits.append(limit)
+        start  = epoch_begin - (epoch_begin % STEP)
+        epochs = range(start, epoch_end + 1, STEP)
+        values = [ (t // STEP) if (t + STEP <= epoch_end) else -1 for t in epochs ]
+        rsp    = make_rsp(start, values)
+
+        if(self.drop_rcvd):
+            # ts.lua drops the series whose values are all zero
+            rsp["series"] = rsp["series"][:1]
+
+        return(rsp)
+
+class TailBufferTest(unittest.TestCase):
+    def test_merge_overwrites_last_point(self):
+        buf = TailBuffer(STEP, [ "bytes_sent", "bytes_rcvd" ])
+
+        self.assertEqual(buf.merge(make_rsp(0, [ 1, 2, 3 ])), 3)
+        # The last point is read again (it may have been incomplete), older points are ignored
+        self.assertEqual(buf.merge(make_rsp(60, [ 0, 30, 4 ])), 1)
+
+        rsp = buf.to_rsp("iface:traffic", "ifid:0")
+        self.assertEqual((rsp["start"], rsp["count"]), (0, 4))
+        self.assertEqual(rsp["series"][0]["data"], [ 1, 2, 30, 4 ])
+        self.assertEqual(rsp["series"][1]["data"], [ 2, 4, 60, 8 ])
+
+    def test_gap(self):
+        buf = TailBuffer(STEP, [ "bytes_sent", "bytes_rcvd" ])
+        buf.merge(make_rsp(0, [ 1 ]))
+        buf.merge(make_rsp(180, [ 4 ]))
+
+        self.assertEqual(buf.to_rsp(None, None)["series"][0]["data"], [ 1, None, None, 4 ])
+
+    def test_trim(self):
+        buf = TailBuffer(STEP, [ "bytes_sent", "bytes_rcvd" ])
+        buf.merge(make_rsp(0, list(range(10))))
+
+        buf.trim(120, 100)
+        self.assertEqual(next(iter(buf.points)), 120)
+
+        buf.trim(0, 3)
+        self.assertEqual(list(buf.points.keys()), [ 420, 480, 540 ])
+
+class TimeseriesTailTest(unittest.TestCase):
+    def test_tail_queries(self):
+        historical = FakeHistorical()
+        tail = TimeseriesTail(historical, window = 600)
+
+        first  = tail.get_interface(0, "iface:traffic", now = 6000)
+        second = tail.get_interface(0, "iface:traffic", now = 6120)
+
+        # The second query starts from the last buffered point
+        self.assertEqual(historical.calls, [ (5400, 6000), (6000, 6120) ])
+        self.assertEqual(first["series"][0]["data"][-2:], [ 99, -1 ])
+        self.assertEqual((second["start"], second["series"][0]["data"][-4:]), (5520, [ 99, 100, 101, -1 ]))
+
+        stats = tail.get_stats()
+        self.assertEqual((stats["full_queries"], stats["tail_queries"], stats["series"]), (1, 1, 1))
+
+    def test_same_limit(self):
+        # Window and tail queries request the same number of points (not the ts.lua default)
+        historical = FakeHistorical()
+        tail = TimeseriesTail(historical, window = 3600, max_points = 100)
+
+        tail.get("iface:traffic", "ifid:0", now = 100000)
+        tail.get("iface:traffic", "ifid:0", now = 100060)
+
+        self.assertEqual(historical.limits, [ 100, 100 ])
+        self.assertEqual(tail.get_limit(10), 361)
+
+    def test_missing_series(self):
+        historical = FakeHistorical()
+        tail = TimeseriesTail(historical, window = 600)
+
+        tail.get("iface:traffic", "ifid:0", now = 6000)
+        historical.drop_rcvd = True
+        rsp = tail.get("iface:traffic", "ifid:0", now = 6060)
+
+        # The missing series is a gap, the buffer is kept
+        self.assertEqual([ s["label"] for s in rsp["series"] ], [ "bytes_sent", "bytes_rcvd" ])
+        self.assertEqual(rsp["series"][1]["data"][-3:], [ 198, None, None ])
+        self.assertEqual(tail.get_stats()["full_queries"], 1)
+
+    def test_window_elapsed(self):
+        # The buffer is older than the window: the whole window is read again
+        historical = FakeHistorical()
+        tail = TimeseriesTail(historical, window = 600)
+
+        tail.get("iface:traffic", "ifid:0", now = 6000)
+        tail.get("iface:traffic", "ifid:0", now = 9000)
+
+        self.assertEqual(historical.calls[1], (8400, 9000))
+        self.assertEqual(tail.get_stats()["full_queries"], 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+"""
+Offline checks for the sliced Top-K
+"""
+
+import unittest
+
+from ntopng.topk import SlicedTopK, merge_topk
+
+KEYS = [ "IPV4_SRC_ADDR" ]
+
+def rows(*entries):
+    return([ { "IPV4_SRC_ADDR": key, "BYTES": value } for key, value in entries ])
+
+class FakeHistorical:
+    # Returns the Top-K of each slice from a table keyed by the slice begin
+    def __init__(self, slices):
+        self.slices = slices
+        self.calls  = []
+
+    def get_topk_flows(self, ifid, epoch_begin, epoch_end, max_hits, where_clause, *args, **kwargs):
+        self.calls.append((epoch_begin, epoch_end, max_hits))
+        return(self.slices.get(epoch_begin, [])[:max_hits])
+
+class MergeTopKTest(unittest.TestCase):
+    def test_sum(self):
+        # Slice 0 is full (requested 2): an entry it did not return has at most 5 bytes
+        results = [ (rows(("a", 10), ("b", 5)), 2), (rows(("b", 7), ("c", 1)), 3) ]
+        top, rest, unseen = merge_topk(results, 2, KEYS)
+
+        self.assertEqual([ (r["IPV4_SRC_ADDR"], r["BYTES"], r["error"]) for r in top ], [ ("b", 12, 0), ("a", 10, 0) ])
+        self.assertEqual([ (r["IPV4_SRC_ADDR"], r["BYTES"], r["error"]) for r in rest ], [ ("c", 1, 5) ])
+        self.assertEqual(unseen, 5)
+
+    def test_max(self):
+        results = [ (rows(("a", 10), ("b", 5)), 2), (rows(("b", 7)), 1) ]
+        top, rest, unseen = merge_topk(results, 3, KEYS, "BYTES", "max")
+
+        self.assertEqual([ (r["IPV4_SRC_ADDR"], r["BYTES"], r["error"]) for r in top ], [ ("a", 10, 0), ("b", 7, 0) ])
+        self.assertEqual(unseen, 7)
+
+    def test_short_slice_is_complete(self):
+        # Both slices returned fewer rows than requested: the results are exact
+        results = [ (rows(("a", 10)), 4), (rows(("b", 3)), 4) ]
+        top, rest, unseen = merge_topk(results, 1, KEYS)
+
+        self.assertEqual(([ r["error"] for r in top + rest ], unseen), ([ 0, 0 ], 0))
+
+    def test_invalid_function(self):
+        with self.assertRaises(ValueError):
+            merge_topk([], 10, KEYS, "BYTES", "AVG")
+
+class SlicedTopKTest(unittest.TestCase):
+    def test_slices_alignment(self):
+        topk = SlicedTopK(FakeHistorical({}), slice_duration = 100)
+
+        self.assertEqual(topk.get_slices(150, 420), [ (150, 199), (200, 299), (300, 399), (400, 420) ])
+        self.assertEqual(topk.get_slices(200, 299), [ (200, 299) ])
+
+    def test_exact_set(self):
+        historical = FakeHistorical({ 0: rows(("a", 100), ("b", 50), ("c", 1)), 100: rows(("a", 90), ("b", 60)) })
+        topk = SlicedTopK(historical, slice_duration = 100, overfetch = 2)
+
+        top = topk.get_topk_flows(0, 0, 199, 1, "", select_keys = "IPV4_SRC_ADDR")
+        stats = topk.get_stats()
+
+        self.assertEqual(sorted(historical.calls), [ (0, 99, 2), (100, 199, 2) ])
+        self.assertEqual([ (r["IPV4_SRC_ADDR"], r["BYTES"]) for r in top ], [ ("a", 190) ])
+        self.assertEqual((stats["slices"], stats["requested_per_slice"]), (2, 2))
+        self.assertTrue(stats["exact_set"])
+
+    def test_not_exact_set(self):
+        # 'a' may have up to 50 + 40 bytes (40 in the second slice, which did not return it)
+        historical = FakeHistorical({ 0: rows(("a", 50), ("b", 40), ("c", 30)), 100: rows(("b", 45), ("c", 40), ("a", 1)) })
+        topk = SlicedTopK(historical, slice_duration = 100, overfetch = 2)
+
+        top = topk.get_topk_flows(0, 0, 199, 1, "", select_keys = "IPV4_SRC_ADDR")
+
+        self.assertEqual([ (r["IPV4_SRC_ADDR"], r["BYTES"]) for r in top ], [ ("b", 85) ])
+        self.assertFalse(topk.get_stats()["exact_set"])
+
+if __name__ == "__main__":
+    unittest.main()
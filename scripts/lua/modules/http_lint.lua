@@ -1472,6 +1472,8 @@ local known_parameters = {
    ["approx_search"]           = validateBool,
    ["group_by_clause"]         = validateUnquoted,
    ["order_by_clause"]         = validateUnquoted,
+   ["group_by"]                = validateUnquoted,              -- Alert queries (rest/v2/get/alert/list/alerts.lua)
+   ["order_by"]                = validateUnquoted,              -- Alert queries, known so that it is not linted as the order_ datatables parameter
    ["alert_family"]            = validateAlertFamily,           -- Alert family validation
    ["where_clause"]            = { whereCleanup, validateUnquoted },
    ["where_clause_unck"]       = { whereCleanup, validateUnchecked },